@@ -0,0 +1,109 @@
+"""
+Compare the columnar OPW flattening stage against the per-item Python loop it
+replaced on a synthetic 90-day catalog, and check both produce the same rows.
+Both start from the raw JSON payload of each day.
+
+    python benchmarks/flatten_records.py --days 90 --items 4000
+"""
+import argparse
+import json
+import random
+import time
+
+import polars as pl
+
+from superpricewatchdog.routes.pipeline import OpwDownloader
+
+
+SUPERMARKETS = ["WELLCOME", "PARKNSHOP", "AEON", "JASONS", "WATSONS"]
+
+
+def generate_catalog(n_items: int, seed: int=0) -> list[dict]:
+    rng = random.Random(seed)
+
+    data = []
+    for idx in range(n_items):
+        smkts = rng.sample(SUPERMARKETS, rng.randint(1, len(SUPERMARKETS)))
+        data.append({
+            "code": f"p{idx:09d}",
+            **{
+                field: {"en": f"{field} {idx % 50}", "zh-Hant": f"{field}{idx % 50}"}
+                for field in ["brand", "name", "cat1Name", "cat2Name", "cat3Name"]
+            },
+            "prices": [
+                {"supermarketCode": smkt, "price": f"${rng.uniform(5, 80):.1f}"}
+                for smkt in smkts
+            ],
+            "offers": [
+                {"supermarketCode": smkt, "en": "Buy 2 Save $5", "zh-Hant": "買2件慳$5"}
+                for smkt in smkts if rng.random() < 0.3
+            ],
+        })
+
+    return data
+
+
+def flatten_legacy(payload: bytes, date: str) -> tuple[pl.DataFrame, pl.DataFrame]:
+    prices, items = [], []
+    for item in json.loads(payload):
+        item["code"] = str(item["code"]).upper()
+        code = item["code"]
+
+        price = item.pop("prices", [])
+        offer = item.pop("offers", [])
+
+        smkt_price = {p["supermarketCode"]: p for p in price}
+        smkt_offer = {o["supermarketCode"]: o for o in offer}
+
+        prices += [
+            {
+                "code": code, "date": date,
+                **smkt_price.get(smkt, {}),
+                **smkt_offer.get(smkt, {}),
+            }
+            for smkt in set(smkt_price) | set(smkt_offer)
+        ]
+        items.append(item)
+
+    return pl.json_normalize(items), pl.from_records(prices)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--items", type=int, default=4_000)
+    args = parser.parse_args()
+
+    payload = json.dumps(generate_catalog(args.items), ensure_ascii=False).encode()
+    dates = [f"2025{idx // 28 + 1:02d}{idx % 28 + 1:02d}" for idx in range(args.days)]
+    downloader = OpwDownloader()
+
+    timings = {}
+    for name, flatten in [
+        ("legacy", flatten_legacy),
+        ("columnar", downloader._flatten_records),
+    ]:
+        start = time.perf_counter()
+        results = [flatten(payload, date) for date in dates]
+        timings[name] = time.perf_counter() - start
+
+        df_item = pl.concat([df for df, _ in results], how="diagonal_relaxed")
+        df_price = pl.concat([df for _, df in results], how="diagonal_relaxed")
+
+        if name == "legacy":
+            expected = df_item, df_price.sort(pl.all())
+        else:
+            assert df_item.equals(expected[0].select(df_item.columns))
+            assert df_price.sort(pl.all()).equals(
+                expected[1].select(df_price.columns)
+            )
+
+    print(
+        f"{args.days} day(s) x {args.items:,} item(s): "
+        f"legacy {timings['legacy']:.2f}s, columnar {timings['columnar']:.2f}s "
+        f"({timings['legacy'] / timings['columnar']:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
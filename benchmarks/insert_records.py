@@ -0,0 +1,111 @@
+"""
+Compare the parallel, payload-sized PostgREST inserts against the sequential
+10,000-row batches they replaced, on a local HTTP stub that charges a fixed
+latency per request plus a per-byte cost, and check both deliver every row.
+
+    python benchmarks/insert_records.py --rows 200000 --latency 0.05
+"""
+import argparse
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import polars as pl
+import pytz
+from flask import Flask, current_app
+from supabase import create_client
+
+from superpricewatchdog.config import Config
+from superpricewatchdog.routes.pipeline import DatabaseRecords
+
+
+class PostgrestStub(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency, throughput = 0.05, 20e6
+    lock, rows = threading.Lock(), 0
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(self.latency + len(body) / self.throughput)
+
+        with self.lock:
+            PostgrestStub.rows += len(json.loads(body))
+
+        self.send_response(201)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def generate_prices(n_rows: int) -> pl.DataFrame:
+    return pl.DataFrame({
+        "sku": [f"P{idx % 20_000:09d}" for idx in range(n_rows)],
+        "effective_date": "20250101",
+        "supermarket": "WELLCOME",
+        "promotion_en": "Buy 2 Save $5",
+        "promotion_zh": "買2件慳$5",
+        "original_price": [float(idx % 80) + 0.5 for idx in range(n_rows)],
+        "unit_price": [float(idx % 80) for idx in range(n_rows)],
+    }, schema_overrides={"original_price": pl.Float32, "unit_price": pl.Float32})
+
+
+def insert_legacy(table: str, df: pl.DataFrame, batch: int=10_000) -> None:
+    client = create_client(current_app.config["SUPABASE_URL"], "stub.stub.stub")
+    data = json.loads(df.write_json())
+
+    for i in range(0, len(data), batch):
+        client.table(table).insert(data[i:i+batch]).execute()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200_000)
+    parser.add_argument("--latency", type=float, default=0.05)
+    args = parser.parse_args()
+
+    PostgrestStub.latency = args.latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PostgrestStub)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update(
+        SUPABASE_URL=f"http://127.0.0.1:{server.server_port}",
+        SUPABASE_KEY="stub",
+        SUPABASE_SCHEMA="watchdog",
+        LOADER="postgrest",
+    )
+    app.hkt = pytz.timezone(app.config["TIMEZONE"])
+
+    df = generate_prices(args.rows)
+    n_byte = len(df.write_json())
+
+    timings = {}
+    with app.app_context():
+        for name, insert in [
+            ("legacy", insert_legacy),
+            ("parallel", DatabaseRecords()._insert_record),
+        ]:
+            PostgrestStub.rows = 0
+
+            start = time.perf_counter()
+            insert("prices", df)
+            timings[name] = time.perf_counter() - start
+
+            assert PostgrestStub.rows == len(df)
+
+    for name, duration in timings.items():
+        print(
+            f"{name}: {duration:.2f}s, {len(df)/duration:,.0f} rows/s, "
+            f"{n_byte/1e6/duration:.2f} MB/s"
+        )
+    print(f"speed-up: {timings['legacy'] / timings['parallel']:.1f}x")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
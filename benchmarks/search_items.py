@@ -0,0 +1,107 @@
+"""
+Time `/search` queries against the inverted index of a synthetic bilingual item
+catalog, memory-mapped as the bot loads it, and check every query finds the
+item it was drawn from.
+
+    python benchmarks/search_items.py --items 4000 --queries 2000
+"""
+import argparse
+import random
+import statistics
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import polars as pl
+
+from superpricewatchdog.models.search import SearchIndex
+
+
+WORDS = [
+    ("Original", "原味"), ("Chocolate", "朱古力"), ("Lemon", "檸檬"), ("Milk", "牛奶"),
+    ("Green Tea", "綠茶"), ("Potato Chips", "薯片"), ("Noodles", "麵"), ("Rice", "米"),
+    ("Soy Sauce", "豉油"), ("Biscuits", "餅乾"), ("Orange Juice", "橙汁"), ("Coffee", "咖啡"),
+    ("Shampoo", "洗頭水"), ("Toothpaste", "牙膏"), ("Tissue", "紙巾"), ("Detergent", "洗衣液"),
+    ("Sparkling Water", "有汽水"), ("Low Sugar", "低糖"), ("Seaweed", "紫菜"), ("Cookies", "曲奇"),
+]
+
+CHARS = "大中小金銀紅白黑香滑脆甜鮮純真好味美家寶樂康健日月山水田光明星天海"
+
+SYLLABLES = ["ka", "lo", "mi", "su", "ne", "ta", "ri", "po", "za", "ve", "do", "bu", "chi", "wen", "hoi"]
+
+
+def generate_items(n_items: int, seed: int=0) -> pl.DataFrame:
+    rng = random.Random(seed)
+    brands = [
+        ("".join(rng.choices(SYLLABLES, k=rng.randint(2, 3))).upper(), "".join(rng.sample(CHARS, 3)))
+        for _ in range(n_items // 20)
+    ]
+
+    rows = []
+    for idx in range(n_items):
+        brand = rng.choice(brands)
+        words = rng.sample(WORDS, 2)
+        size = f"{rng.choice([100, 250, 330, 500, 1000])}{rng.choice(['ml', 'g'])}"
+        rows.append((
+            f"P{idx:09d}",
+            brand[0],
+            f"{words[0][0]} {words[1][0]} {size}",
+            brand[1],
+            f"{words[0][1]}{words[1][1]} {size}",
+        ))
+
+    return pl.DataFrame(
+        rows,
+        schema=["sku", *SearchIndex.FIELDS],
+        orient="row",
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=4_000)
+    parser.add_argument("--queries", type=int, default=2_000)
+    args = parser.parse_args()
+
+    df_item = generate_items(args.items)
+    rng = random.Random(1)
+
+    queries = []
+    for sku, brand_en, name_en, brand_zh, name_zh in rng.sample(df_item.rows(), args.queries):
+        queries.append((sku, rng.choice([
+            f"{brand_en.lower()} {name_en.split()[0].lower()}",
+            f"{brand_zh} {name_zh.split()[0][:2]}",
+            brand_en[:5].lower(),  # a prefix while typing
+            name_zh.split()[0],
+        ])))
+
+    with TemporaryDirectory() as tmp:
+        index = SearchIndex(Path(tmp) / "search.arrow")
+
+        start = time.perf_counter()
+        stats = index.publish(df_item)
+        t_build = time.perf_counter() - start
+
+        index.search("warm up")
+
+        durations = []
+        for _, query in queries:
+            start = time.perf_counter()
+            index.search(query)  # the ten results of /search
+            durations.append(time.perf_counter() - start)
+
+        for sku, query in queries:
+            assert sku in index.search(query, limit=args.items)
+
+    durations = sorted(durations)
+
+    print(
+        f"{stats['items']:,} item(s), {stats['terms']:,} term(s), built in {t_build:.2f}s: "
+        f"median {statistics.median(durations) * 1e3:.2f}ms, "
+        f"p99 {durations[int(len(durations) * 0.99)] * 1e3:.2f}ms, "
+        f"max {durations[-1] * 1e3:.2f}ms per query"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Compare one daily roll of the incremental per-SKU moments against the full
+90-day statistics recompute that `update_deals` used to run, on a seeded
+local Postgres, and check both give the same statistics.
+
+    python benchmarks/update_moments.py postgresql://postgres@127.0.0.1:5432/postgres
+"""
+import argparse
+import time
+from datetime import date, timedelta
+
+import psycopg
+
+from superpricewatchdog.config import PTH
+
+
+RECOMPUTE = """
+    SELECT
+        sku
+        , COUNT(DISTINCT effective_date) AS frequency
+        , AVG(unit_price) AS average_price
+        , STDDEV(unit_price) AS std_price
+        , MIN(unit_price) AS q0_price
+        , MAX(unit_price) AS q4_price
+    FROM watchdog.prices
+    GROUP BY sku
+"""
+
+SEED = """
+    INSERT INTO watchdog.prices (sku, effective_date, supermarket, unit_price)
+    SELECT
+        'P' || LPAD(s::TEXT, 9, '0')
+        , TO_CHAR(DATE '2025-01-01' + d, 'YYYYMMDD')
+        , (ARRAY['WELLCOME', 'AEON', 'PARKNSHOP'])[m]
+        , ROUND((1 + RANDOM() * 50)::NUMERIC, 1)
+    FROM GENERATE_SERIES(0, %(skus)s::INT - 1) s
+    CROSS JOIN GENERATE_SERIES(%(start)s::INT, %(end)s::INT) d
+    CROSS JOIN GENERATE_SERIES(1, 3) m
+"""
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("url")
+    parser.add_argument("--days", type=int, default=90)
+    parser.add_argument("--skus", type=int, default=20_000)
+    args = parser.parse_args()
+
+    with psycopg.connect(args.url, autocommit=True) as conn:
+        conn.execute("DROP SCHEMA IF EXISTS watchdog CASCADE")
+        conn.execute("CREATE SCHEMA watchdog")
+        conn.execute((PTH / "database" / "setup.sql").read_text())
+        conn.execute("SELECT watchdog.create_tables()")
+        conn.execute((PTH / "database" / "pipeline_functions.sql").read_text())
+
+        conn.execute(
+            "INSERT INTO watchdog.items (sku) "
+            "SELECT 'P' || LPAD(s::TEXT, 9, '0') FROM GENERATE_SERIES(0, %s::INT - 1) s",
+            (args.skus,),
+        )
+        conn.execute(SEED, {"skus": args.skus, "start": 0, "end": args.days - 1})
+        conn.execute("SELECT watchdog.update_moments(%s, %s)", ([], []))  # bootstrap
+
+        expired = ["20250101"]
+        added = [(date(2025, 1, 1) + timedelta(days=args.days)).strftime("%Y%m%d")]
+        conn.execute("DELETE FROM watchdog.prices WHERE effective_date = ANY(%s)", (expired,))
+        conn.execute(SEED, {"skus": args.skus, "start": args.days, "end": args.days})
+        conn.execute("ANALYZE")
+
+        start = time.perf_counter()
+        conn.execute(f"CREATE TEMP TABLE t_recompute AS {RECOMPUTE}")
+        t_recompute = time.perf_counter() - start
+
+        start = time.perf_counter()
+        conn.execute("SELECT watchdog.update_moments(%s, %s)", (added, expired))
+        t_incremental = time.perf_counter() - start
+
+        conn.execute("SELECT watchdog.update_deals()")
+        n_mismatch = conn.execute("""
+            SELECT COUNT(*)
+            FROM watchdog.deals d
+            INNER JOIN t_recompute r ON d.sku = r.sku
+            WHERE d.frequency <> r.frequency
+                OR ROUND(d.average_price, 6) <> ROUND(r.average_price, 6)
+                OR ROUND(d.std_price, 6) <> ROUND(r.std_price, 6)
+                OR d.q0_price <> r.q0_price
+                OR d.q4_price <> r.q4_price
+        """).fetchone()[0]
+
+        assert n_mismatch == 0
+
+        conn.execute("DROP SCHEMA watchdog CASCADE")
+
+    print(
+        f"{args.days} day(s) x {args.skus:,} SKU(s) x 3 supermarket(s): "
+        f"recompute {t_recompute:.2f}s, incremental {t_incremental:.2f}s "
+        f"({t_recompute / t_incremental:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
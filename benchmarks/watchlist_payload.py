@@ -0,0 +1,123 @@
+"""
+Compare the /list watchlist payload and latency of `get_watchlist`, which joins
+the item names server-side, against `get_watchlist_skus` with the names looked
+up in the memory-mapped item catalog, on a seeded local Postgres, and check
+both render the same list. Payloads are the JSON bodies PostgREST would send.
+
+    python benchmarks/watchlist_payload.py postgresql://postgres@127.0.0.1:5432/postgres
+"""
+import argparse
+import json
+import statistics
+import time
+from pathlib import Path
+from tempfile import TemporaryDirectory
+
+import polars as pl
+import psycopg
+
+from superpricewatchdog.config import PTH
+from superpricewatchdog.models.catalog import ItemLookup
+
+
+SEED = """
+    INSERT INTO watchdog.items (
+        sku, department_en, department_zh, category_en, category_zh, subcategory_en,
+        subcategory_zh, brand_en, brand_zh, name_en, name_zh
+    )
+    SELECT
+        'P' || LPAD(s::TEXT, 9, '0')
+        , 'Department ' || MOD(s, 10)
+        , '部門' || MOD(s, 10)
+        , 'Category ' || MOD(s, 50)
+        , '類別' || MOD(s, 50)
+        , 'Subcategory ' || MOD(s, 200)
+        , '子類別' || MOD(s, 200)
+        , 'BRAND ' || MOD(s, 500)
+        , '品牌' || MOD(s, 500)
+        , 'Product ' || s || ' Original Flavour 330ml x 6'
+        , '產品' || s || ' 原味 330毫升 x 6'
+    FROM GENERATE_SERIES(0, %(skus)s::INT - 1) s
+"""
+
+
+def fetch(conn: psycopg.Connection, query: str, user: str) -> tuple[list[dict], int]:
+    body = conn.execute(  # the JSON array PostgREST answers with
+        f"SELECT COALESCE(json_agg(t), '[]')::TEXT FROM (SELECT * FROM {query}(%s)) t", (user,),
+    ).fetchone()[0]
+
+    return json.loads(body), len(body.encode())
+
+
+def render(watchlist: list[dict]) -> list[str]:
+    return [f"/{data['_sku']} | {data['_brand']} - {data['_name']}" for data in watchlist]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("url")
+    parser.add_argument("--skus", type=int, default=20_000)
+    parser.add_argument("--watchlist", type=int, default=500)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    with psycopg.connect(args.url, autocommit=True) as conn, TemporaryDirectory() as tmp:
+        conn.execute("DROP SCHEMA IF EXISTS watchdog CASCADE")
+        conn.execute("CREATE SCHEMA watchdog")
+        conn.execute((PTH / "database" / "setup.sql").read_text())
+        conn.execute("SELECT watchdog.create_tables()")
+        conn.execute((PTH / "database" / "bot_functions.sql").read_text())
+
+        conn.execute(SEED, {"skus": args.skus})
+        conn.execute("INSERT INTO watchdog.users VALUES ('1', 'zh', 'y')")
+        conn.execute(
+            "INSERT INTO watchdog.watchlists (user_id, sku) "
+            "SELECT '1', sku FROM watchdog.items ORDER BY RANDOM() LIMIT %s",
+            (args.watchlist,),
+        )
+        conn.execute("ANALYZE")
+
+        cursor = conn.execute(
+            "SELECT sku, department_en, category_en, subcategory_en, brand_zh, name_zh "
+            "FROM watchdog.items ORDER BY sku"
+        )
+        pl.DataFrame(  # as ItemCatalog.update exports it
+            cursor.fetchall(),
+            schema=[col.name for col in cursor.description],
+            orient="row",
+        ).write_ipc(Path(tmp) / "catalog.arrow", compression="uncompressed")
+        lookup = ItemLookup(Path(tmp) / "catalog.arrow")
+
+        t_join, t_lookup = [], []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            watchlist, b_join = fetch(conn, "watchdog.get_watchlist", "1")
+            items_join = render(watchlist)
+            t_join.append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            rows, b_lookup = fetch(conn, "watchdog.get_watchlist_skus", "1")
+            skus = [data["_sku"] for data in rows]
+            names = lookup.get(skus, "zh")  # from the profile cache
+            items_lookup = render(sorted(
+                ({"_sku": sku, **names[sku]} for sku in skus),
+                key=lambda data: (data["_order"], data["_sku"]),
+            ))
+            t_lookup.append(time.perf_counter() - start)
+
+        assert items_lookup == items_join
+
+        conn.execute("DROP SCHEMA watchdog CASCADE")
+
+    t_join, t_lookup = statistics.median(t_join), statistics.median(t_lookup)
+
+    print(
+        f"/list of {args.watchlist:,} item(s) over {args.skus:,} SKU(s): "
+        f"join {b_join / 1e3:.1f} kB in {t_join * 1e3:.2f}ms, "
+        f"lookup {b_lookup / 1e3:.1f} kB in {t_lookup * 1e3:.2f}ms "
+        f"({1 - b_lookup / b_join:.0%} smaller, {t_join / t_lookup:.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main()
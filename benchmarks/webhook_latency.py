@@ -0,0 +1,131 @@
+"""
+Time the cold startup of the bot, and the webhook response of a text command
+answered inline, with sendMessage, or queued for the handler threads, against
+a local Telegram stub that answers after `--latency` seconds.
+
+    python benchmarks/webhook_latency.py --latency 0.2 --repeat 20
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from types import SimpleNamespace
+
+import pytz
+from flask import Flask
+from matplotlib.font_manager import FontProperties
+
+from superpricewatchdog.config import Config
+from superpricewatchdog.models.profiles import ProfileCache
+from superpricewatchdog.models.updates import UpdateQueue
+from superpricewatchdog.routes import response
+
+
+STARTUP = (
+    "import time\n"
+    "start = time.perf_counter()\n"
+    "from superpricewatchdog import create_app\n"
+    "create_app()\n"
+    "print(time.perf_counter() - start)\n"
+)
+
+
+class TelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency = 0.2
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers["Content-Length"]))
+        time.sleep(self.latency)
+
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+def time_startup(repeat: int) -> float:
+    env = {"FORWARDING_URL": "http://127.0.0.1:9", "TELEGRAM_TOKEN": "x"}  # unreachable
+
+    return statistics.median(
+        float(subprocess.run(
+            [sys.executable, "-c", STARTUP],
+            capture_output=True, check=True, text=True, timeout=60, env=env,
+        ).stdout)
+        for _ in range(repeat)
+    )
+
+
+def create_bot(url: str) -> Flask:
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config.update({"API_MSG": url, "HANDLERS": 0})
+    app.font = FontProperties()
+    app.hkt = pytz.timezone(app.config["TIMEZONE"])
+    app.supabase_client = SimpleNamespace(rpc=lambda name, params: SimpleNamespace(
+        execute=lambda: SimpleNamespace(data=[{"_language": "en"}]),
+    ))
+    app.register_blueprint(response.bp)
+
+    return app
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.2)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    TelegramHandler.latency = args.latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TelegramHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    with TemporaryDirectory() as tmp:
+        response.PROFILE_CACHE = ProfileCache(Path(tmp) / "profiles.sqlite3")
+        response.UPDATE_QUEUE = UpdateQueue(Path(tmp) / "updates.sqlite3", handlers=2)
+
+        app = create_bot(f"http://127.0.0.1:{server.server_port}/sendMessage")
+
+        timings = {}
+        with app.test_client() as test_client:
+            for mode, config in [
+                ("inline", {"INLINE": True}),
+                ("sendMessage", {"INLINE": False}),
+                ("queued", {"HANDLERS": 2}),
+            ]:
+                app.config.update(config)
+                if mode == "queued":
+                    response.start_handlers(app)
+
+                latencies = []
+                for idx in range(args.repeat):
+                    update = {
+                        "update_id": idx,
+                        "message": {"from": {"id": 42}, "text": "/help"},
+                    }
+
+                    start = time.perf_counter()
+                    assert test_client.post("/api/v1/reply", json=update).status_code == 200
+                    latencies.append(time.perf_counter() - start)
+
+                timings[mode] = statistics.median(latencies)
+
+        response.UPDATE_QUEUE.stop()
+
+    server.shutdown()
+
+    print(
+        f"startup {time_startup(5):.2f}s; /help with a {args.latency:.2f}s Telegram: "
+        + ", ".join(f"{mode} {latency * 1e3:.1f}ms" for mode, latency in timings.items())
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -123,6 +123,20 @@ END;
 $$ LANGUAGE plpgsql;
 
 
+/* GET SKUS OF WATCHLIST ITEMS */
+CREATE OR REPLACE FUNCTION watchdog.get_watchlist_skus(usr_id TEXT)
+    RETURNS TABLE(_sku VARCHAR)
+    SET search_path = 'watchdog'
+AS $$
+BEGIN
+    RETURN QUERY
+    SELECT w.sku
+    FROM watchlists w
+    WHERE w.user_id = usr_id;
+END;
+$$ LANGUAGE plpgsql;
+
+
 /* GET N RANDOM DEAL ITEMS */
 CREATE OR REPLACE FUNCTION watchdog.draw_deals(usr_id TEXT, n INT DEFAULT 5)
     RETURNS TABLE(
@@ -223,6 +237,22 @@ END;
 $$ LANGUAGE plpgsql;
 
 
+/* GET TARGET PRICE OF AN ITEM */
+CREATE OR REPLACE FUNCTION watchdog.get_bid(code VARCHAR)
+    RETURNS TABLE(_frequency INT, _bid NUMERIC)
+    SET search_path = 'watchdog'
+AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        d.frequency
+        , d.bid_price
+    FROM deals d
+    WHERE d.sku = code;
+END;
+$$ LANGUAGE plpgsql;
+
+
 /* CHANGE SUBSCRIPTION STATUS */
 CREATE OR REPLACE FUNCTION watchdog.change_subscription(usr_id TEXT)
     RETURNS TABLE(_language VARCHAR, _status VARCHAR)
@@ -303,6 +333,43 @@ END;
 $$ LANGUAGE plpgsql;
 
 
+/* GET ALERT PRICES */
+CREATE OR REPLACE FUNCTION watchdog.get_alert_prices(usr_id TEXT)
+    RETURNS TABLE(
+        _sku VARCHAR
+        , _supermarket VARCHAR
+        , _promotion TEXT
+        , _fix NUMERIC
+        , _price NUMERIC
+        , _language VARCHAR
+    )
+    SET search_path = 'watchdog'
+AS $$
+BEGIN
+    RETURN QUERY
+    WITH
+        t_language AS (
+            SELECT display_language
+            FROM users
+            WHERE user_id = usr_id
+        )
+    SELECT
+        d.sku
+        , d.supermarket
+        , CASE WHEN l.display_language = 'en' THEN d.promotion_en ELSE d.promotion_zh END
+        , d.original_price
+        , d.unit_price
+        , l.display_language
+    FROM deals d
+    CROSS JOIN t_language l
+    WHERE 1 = 1
+        AND d.is_deal = 'y'
+        AND EXISTS (SELECT 1 FROM watchlists w WHERE d.sku = w.sku AND w.user_id = usr_id)
+    ORDER BY d.supermarket;
+END;
+$$ LANGUAGE plpgsql;
+
+
 /* REMOVE AN USER */
 CREATE OR REPLACE FUNCTION watchdog.remove_user(usr_id TEXT)
     RETURNS TABLE(_language VARCHAR)
@@ -38,6 +38,118 @@ END;
 $$ LANGUAGE plpgsql;
 
 
+/* MAINTAIN PER-SKU PRICE MOMENTS */
+CREATE OR REPLACE FUNCTION watchdog.update_moments(added VARCHAR[], expired VARCHAR[])
+    RETURNS VOID
+    SET search_path = 'watchdog'
+AS $$
+DECLARE
+    stale_skus VARCHAR[];
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM daily_moments) THEN  -- bootstrap from the price history
+        TRUNCATE TABLE moments;
+
+        SELECT ARRAY_AGG(DISTINCT effective_date)
+        INTO added
+        FROM prices;
+
+        expired := '{}';
+    END IF;
+
+    WITH
+        t_expired AS (
+            DELETE FROM daily_moments
+            WHERE effective_date = ANY(expired)
+            RETURNING *
+        )
+        , t_retired AS (
+            SELECT
+                sku
+                , COUNT(*) AS frequency
+                , SUM(n_price) AS n_price
+                , SUM(sum_price) AS sum_price
+                , SUM(sum_sq_price) AS sum_sq_price
+                , MIN(q0_price) AS q0_price
+                , MAX(q4_price) AS q4_price
+            FROM t_expired
+            GROUP BY sku
+        )
+        , t_moment AS (
+            UPDATE moments m
+            SET
+                frequency = m.frequency - r.frequency
+                , n_price = m.n_price - r.n_price
+                , sum_price = m.sum_price - r.sum_price
+                , sum_sq_price = m.sum_sq_price - r.sum_sq_price
+            FROM t_retired r
+            WHERE m.sku = r.sku
+            RETURNING
+                m.sku
+                , r.q0_price <= m.q0_price OR r.q4_price >= m.q4_price AS is_stale  -- an extreme expired
+        )
+    SELECT ARRAY_AGG(sku)
+    INTO stale_skus
+    FROM t_moment
+    WHERE is_stale;
+
+    WITH
+        t_added AS (
+            INSERT INTO daily_moments (sku, effective_date, n_price, sum_price, sum_sq_price, q0_price, q4_price)
+            SELECT
+                sku
+                , effective_date
+                , COUNT(unit_price)
+                , COALESCE(SUM(unit_price), 0)
+                , COALESCE(SUM(unit_price * unit_price), 0)
+                , MIN(unit_price)
+                , MAX(unit_price)
+            FROM prices
+            WHERE effective_date = ANY(added)
+            GROUP BY sku, effective_date
+            ON CONFLICT (sku, effective_date) DO NOTHING  -- dates are only counted once
+            RETURNING *
+        )
+    INSERT INTO moments (sku, frequency, n_price, sum_price, sum_sq_price, q0_price, q4_price)
+    SELECT
+        sku
+        , COUNT(*)
+        , SUM(n_price)
+        , SUM(sum_price)
+        , SUM(sum_sq_price)
+        , MIN(q0_price)
+        , MAX(q4_price)
+    FROM t_added
+    GROUP BY sku
+    ON CONFLICT (sku) DO UPDATE
+    SET
+        frequency = moments.frequency + EXCLUDED.frequency
+        , n_price = moments.n_price + EXCLUDED.n_price
+        , sum_price = moments.sum_price + EXCLUDED.sum_price
+        , sum_sq_price = moments.sum_sq_price + EXCLUDED.sum_sq_price
+        , q0_price = LEAST(moments.q0_price, EXCLUDED.q0_price)
+        , q4_price = GREATEST(moments.q4_price, EXCLUDED.q4_price);
+
+    UPDATE moments m
+    SET
+        q0_price = d.q0_price
+        , q4_price = d.q4_price
+    FROM (
+        SELECT
+            sku
+            , MIN(q0_price) AS q0_price
+            , MAX(q4_price) AS q4_price
+        FROM daily_moments
+        WHERE sku = ANY(stale_skus)
+        GROUP BY sku
+    ) d
+    WHERE m.sku = d.sku;
+
+    DELETE FROM moments
+    WHERE frequency = 0;
+END;
+$$ LANGUAGE plpgsql;
+
+
 /* ETL OF BEST DEALS */
 CREATE OR REPLACE FUNCTION watchdog.update_deals()
     RETURNS VOID
@@ -56,13 +168,15 @@ BEGIN
         t_summary_statistic AS (
             SELECT
                 sku
-                , COUNT(DISTINCT effective_date) AS frequency
-                , AVG(unit_price) AS average_price
-                , STDDEV(unit_price) AS std_price
-                , MIN(unit_price) AS q0_price
-                , MAX(unit_price) AS q4_price
-            FROM prices
-            GROUP BY sku
+                , frequency
+                , sum_price / NULLIF(n_price, 0) AS average_price
+                , SQRT(
+                    GREATEST(sum_sq_price - sum_price * sum_price / NULLIF(n_price, 0), 0)
+                    / NULLIF(n_price - 1, 0)
+                ) AS std_price
+                , q0_price
+                , q4_price
+            FROM moments
         )
         , t_latest_deal AS (
             SELECT
@@ -122,7 +236,21 @@ BEGIN
                 , q4_price
             FROM t_price_summary
         )
-    INSERT INTO deals
+    INSERT INTO deals (
+        sku
+        , supermarket
+        , promotion_en
+        , promotion_zh
+        , original_price
+        , unit_price
+        , frequency
+        , average_price
+        , std_price
+        , q0_price
+        , bid_price
+        , q4_price
+        , is_deal
+    )
     SELECT
         sku
         , supermarket
@@ -164,6 +292,76 @@ END;
 $$ LANGUAGE plpgsql;
 
 
+/* GET ITEMS ON ANY WATCHLIST */
+CREATE OR REPLACE FUNCTION watchdog.get_watched_items()
+    RETURNS TABLE(_sku VARCHAR, _frequency INT, _bid NUMERIC, _brand_en TEXT, _brand_zh TEXT, _name_en TEXT, _name_zh TEXT)
+    SET search_path = 'watchdog'
+AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        d.sku
+        , d.frequency
+        , d.bid_price
+        , i.brand_en
+        , i.brand_zh
+        , i.name_en
+        , i.name_zh
+    FROM deals d
+    INNER JOIN items i ON d.sku = i.sku
+    WHERE EXISTS (SELECT 1 FROM watchlists w WHERE d.sku = w.sku)
+    ORDER BY d.sku;
+END;
+$$ LANGUAGE plpgsql;
+
+
+/* GET DEALS OF THE DAY IN BOTH LANGUAGES */
+CREATE OR REPLACE FUNCTION watchdog.get_deals()
+    RETURNS TABLE(
+        _sku VARCHAR
+        , _supermarket VARCHAR
+        , _promotion_en TEXT
+        , _promotion_zh TEXT
+        , _fix NUMERIC
+        , _price NUMERIC
+        , _frequency INT
+        , _average NUMERIC
+        , _std NUMERIC
+        , _q0 NUMERIC
+        , _q4 NUMERIC
+        , _brand_en TEXT
+        , _brand_zh TEXT
+        , _name_en TEXT
+        , _name_zh TEXT
+    )
+    SET search_path = 'watchdog'
+AS $$
+BEGIN
+    RETURN QUERY
+    SELECT
+        d.sku
+        , d.supermarket
+        , d.promotion_en
+        , d.promotion_zh
+        , d.original_price
+        , d.unit_price
+        , d.frequency
+        , d.average_price
+        , d.std_price
+        , d.q0_price
+        , d.q4_price
+        , i.brand_en
+        , i.brand_zh
+        , i.name_en
+        , i.name_zh
+    FROM deals d
+    INNER JOIN items i ON d.sku = i.sku
+    WHERE d.is_deal = 'y'
+    ORDER BY d.sku;
+END;
+$$ LANGUAGE plpgsql;
+
+
 /* LOG OMISSION DATE */
 CREATE OR REPLACE FUNCTION watchdog.log_omission()
     RETURNS VOID
@@ -69,6 +69,9 @@ BEGIN
         , average_price NUMERIC
         , std_price NUMERIC
         , q0_price NUMERIC
+        , q1_price NUMERIC
+        , q2_price NUMERIC
+        , q3_price NUMERIC
         , bid_price NUMERIC
         , q4_price NUMERIC
         , is_deal VARCHAR(1)
@@ -91,6 +94,30 @@ BEGIN
         , CONSTRAINT price_supermarket_fk FOREIGN KEY(supermarket) REFERENCES supermarkets(supermarket)
     );
 
+    CREATE TABLE IF NOT EXISTS watchdog.daily_moments (
+        sku VARCHAR(20)
+        , effective_date VARCHAR(8)
+        , n_price INT
+        , sum_price NUMERIC
+        , sum_sq_price NUMERIC
+        , q0_price NUMERIC
+        , q4_price NUMERIC
+        , created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        , CONSTRAINT daily_moment_pk PRIMARY KEY(sku, effective_date)
+    );
+
+    CREATE TABLE IF NOT EXISTS watchdog.moments (
+        sku VARCHAR(20)
+        , frequency INT
+        , n_price INT
+        , sum_price NUMERIC
+        , sum_sq_price NUMERIC
+        , q0_price NUMERIC
+        , q4_price NUMERIC
+        , created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+        , CONSTRAINT moment_pk PRIMARY KEY(sku)
+    );
+
     CREATE TABLE IF NOT EXISTS watchdog.watchlists (
         user_id TEXT
         , sku VARCHAR(20)
@@ -104,7 +131,13 @@ BEGIN
         , created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
     );
 
+    ALTER TABLE deals ADD COLUMN IF NOT EXISTS q1_price NUMERIC;
+    ALTER TABLE deals ADD COLUMN IF NOT EXISTS q2_price NUMERIC;
+    ALTER TABLE deals ADD COLUMN IF NOT EXISTS q3_price NUMERIC;
+
     CREATE INDEX IF NOT EXISTS price_sku_date_idx ON prices(sku, effective_date);
+    CREATE INDEX IF NOT EXISTS price_date_idx ON prices(effective_date);
+    CREATE INDEX IF NOT EXISTS daily_moment_date_idx ON daily_moments(effective_date);
 
     INSERT INTO supermarkets (supermarket, preference)
         SELECT * FROM (VALUES
@@ -124,6 +157,8 @@ BEGIN
     ALTER TABLE users ENABLE ROW LEVEL SECURITY;
     ALTER TABLE deals ENABLE ROW LEVEL SECURITY;
     ALTER TABLE watchlists ENABLE ROW LEVEL SECURITY;
+    ALTER TABLE daily_moments ENABLE ROW LEVEL SECURITY;
+    ALTER TABLE moments ENABLE ROW LEVEL SECURITY;
     ALTER TABLE omissions ENABLE ROW LEVEL SECURITY;
 END;
 $$ LANGUAGE plpgsql;
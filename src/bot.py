@@ -13,7 +13,7 @@ import logging
 from superpricewatchdog import create_app
 
 
-app = create_app()
+app = create_app(handlers=True)
 
 logging.getLogger().handlers.clear()
 logging.basicConfig(
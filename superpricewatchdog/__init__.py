@@ -1,45 +1,67 @@
+from functools import cached_property
 from pathlib import Path
 
+import click
 import pytz
 import requests
 from flask import Flask
-from matplotlib.font_manager import FontProperties
-from supabase import create_client
-from supabase.client import ClientOptions
 
 from .config import Config
 from .routes.error import bp as bp_errors
 from .routes.index import bp as bp_index
-from .routes.pipeline import bp as bp_pipeline
-from .routes.response import bp as bp_response
+from .routes.jobs import bp as bp_jobs
+from .routes.response import bp as bp_response, start_handlers
 from .routes.repository import bp as bp_repository
 from .routes.robots import bp as bp_robots
 
 
-def create_app():
-    app = Flask(__name__)
-    app.config.from_object(Config)
+class Watchdog(Flask):
+    """Flask application that loads its heavy clients on first use."""
+    @cached_property
+    def font(self):
+        from matplotlib.font_manager import FontProperties
 
-    app.font = FontProperties(
-        fname=Path(__file__).parent.parent \
-            / "config" / "NotoSansCJK-Bold.ttc"
-    )
+        return FontProperties(
+            fname=Path(__file__).parent.parent \
+                / "config" / "NotoSansCJK-Bold.ttc"
+        )
 
-    app.hkt = pytz.timezone(app.config["TIMEZONE"])
+    @cached_property
+    def supabase_client(self):
+        from supabase import create_client
+        from supabase.client import ClientOptions
+
+        return create_client(
+            self.config["SUPABASE_URL"],
+            self.config["SUPABASE_KEY"],
+            ClientOptions(schema=self.config["SUPABASE_SCHEMA"]),
+        )
+
+
+def create_app(handlers: bool=False):
+    app = Watchdog(__name__)
+    app.config.from_object(Config)
 
-    app.supabase_client = create_client(
-        app.config["SUPABASE_URL"],
-        app.config["SUPABASE_KEY"],
-        ClientOptions(schema=app.config["SUPABASE_SCHEMA"]),
-    )
+    app.hkt = pytz.timezone(app.config["TIMEZONE"])
 
     app.register_blueprint(bp_errors)
     app.register_blueprint(bp_index)
-    app.register_blueprint(bp_pipeline)
+    app.register_blueprint(bp_jobs)
     app.register_blueprint(bp_repository)
     app.register_blueprint(bp_response)
     app.register_blueprint(bp_robots)
 
-    requests.get(app.config["API_WEBHOOK"], timeout=30)
+    if handlers:  # the served application answers updates queued before a restart at once
+        start_handlers(app)
+
+    @app.cli.command("register-webhook")
+    def register_webhook() -> None:
+        """Point the Telegram webhook at this application."""
+        response = requests.get(app.config["API_WEBHOOK"], timeout=30)
+
+        if not response.ok:
+            raise click.ClickException(response.text)
+
+        click.echo(response.json().get("description"))
 
     return app
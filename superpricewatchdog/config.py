@@ -3,7 +3,6 @@ import logging
 import os
 from pathlib import Path
 
-import luigi
 from dotenv import load_dotenv
 
 
@@ -14,14 +13,6 @@ load_dotenv(PTH / "config" / ".env")
 CONFIG = configparser.ConfigParser()
 CONFIG.read(PTH / "config" / "config.ini")
 
-for config in [
-    ("worker", "keep-alive", "True"),
-    ("worker", "no_install_shutdown_handler", "True"),
-    ("scheduler", "retry_delay", CONFIG.get("SCHEDULER", "RETRY_DELAY")),
-    ("scheduler", "retry_count", CONFIG.get("SCHEDULER", "RETRY_COUNT")),
-]:
-    luigi.configuration.get_config().set(*config)
-
 LOGGER = logging.getLogger("luigi-interface")
 
 
@@ -33,6 +24,8 @@ class Config:
     SUPABASE_URL = os.getenv("SUPABASE_URL")
     SUPABASE_SCHEMA = os.getenv("SUPABASE_SCHEMA")
 
+    DATABASE_URL = os.getenv("DATABASE_URL")
+
     _fw_url = os.getenv("FORWARDING_URL")
     _tg_token = os.getenv("TELEGRAM_TOKEN")
 
@@ -40,12 +33,33 @@ class Config:
     API_FILE = CONFIG.get("API", "FILE")
     API_VERSION = CONFIG.get("API", "VERSION")
 
+    BACKOFF = CONFIG.getfloat("TASK", "BACKOFF")
+    BATCH = CONFIG.getint("TASK", "BATCH")
+    DEALS = CONFIG.get("TASK", "DEALS")
     DELTA = CONFIG.getint("TASK", "DELTA")
+    FUSED = CONFIG.getboolean("TASK", "FUSED")
+    LOADER = CONFIG.get("TASK", "LOADER")
+    MEMORY = CONFIG.getint("TASK", "MEMORY")
+    PAYLOAD = CONFIG.getint("TASK", "PAYLOAD")
+    RENDERERS = CONFIG.getint("TASK", "RENDERERS")
+    RETRIES = CONFIG.getint("TASK", "RETRIES")
     THRESHOLD = CONFIG.getfloat("TASK", "THRESHOLD")
+    WORKERS = CONFIG.getint("TASK", "WORKERS")
 
     API_IMG = CONFIG.get("TELEGRAM", "IMG").format(_tg_token)
     API_MSG = CONFIG.get("TELEGRAM", "MSG").format(_tg_token)
     API_WEBHOOK = CONFIG.get("TELEGRAM", "WEBHOOK").format(_tg_token, _fw_url)
 
+    CHAT_RATE = CONFIG.getfloat("TELEGRAM", "CHAT_RATE")
+    HANDLERS = CONFIG.getint("TELEGRAM", "HANDLERS")
+    INLINE = CONFIG.getboolean("TELEGRAM", "INLINE")
+    LEASE = CONFIG.getfloat("TELEGRAM", "LEASE")
+    LUCKY = CONFIG.get("TELEGRAM", "LUCKY")
+    PLOTS = CONFIG.getint("TELEGRAM", "PLOTS")
+    PROFILES = CONFIG.getint("TELEGRAM", "PROFILES")
+    PROFILE_TTL = CONFIG.getfloat("TELEGRAM", "PROFILE_TTL")
+    RATE = CONFIG.getfloat("TELEGRAM", "RATE")
+    SENDERS = CONFIG.getint("TELEGRAM", "SENDERS")
+
     HOUR = CONFIG.getint("TIME", "HOUR")
     TIMEZONE = CONFIG.get("TIME", "TIMEZONE")
@@ -0,0 +1,45 @@
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .files import reload_if_replaced
+
+if TYPE_CHECKING:
+    import polars as pl
+
+
+class ItemLookup:
+    """Display strings of the items in the memory-mapped catalog exported by the pipeline."""
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    @property
+    def items(self) -> "pl.DataFrame | None":
+        import polars as pl  # loaded by the first lookup, not at startup
+
+        return reload_if_replaced(self.path, lambda path: pl.read_ipc(path, memory_map=True))
+
+    def get(self, skus: list[str], language: str) -> dict[str, dict] | None:
+        import polars as pl
+
+        df = self.items
+        if df is None or df.is_empty():
+            return None
+
+        if not skus:
+            return {}
+
+        idx = df["sku"].search_sorted(pl.Series(skus, dtype=pl.String))
+        suffix = "en" if language == "en" else "zh"
+
+        df = df[idx.clip(0, len(df)-1)]
+        if df["sku"].to_list() != list(skus):  # not exported yet, e.g. a discontinued item
+            return None
+
+        cols = ["sku", f"brand_{suffix}", f"name_{suffix}", "department_en", "category_en", "subcategory_en"]
+        df = df.select(cols).fill_null("")
+
+        return {  # columns to lists, as rows of dicts are slower to build
+            sku: {"_brand": brand, "_name": name, "_order": (department, category, subcategory)}
+            for sku, brand, name, department, category, subcategory
+            in zip(*(df[col].to_list() for col in cols))
+        }
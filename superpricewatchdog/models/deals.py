@@ -0,0 +1,100 @@
+import json
+import os
+import random
+from pathlib import Path
+
+from .files import reload_if_replaced
+
+
+def build_alias(weights: list[float]) -> tuple[list[float], list[int]]:
+    n = len(weights)
+    total = sum(weights)
+    scaled = [w * n / total for w in weights] if total else [1.0] * n
+
+    prob, alias = [1.0] * n, list(range(n))
+    small = [i for i, p in enumerate(scaled) if p < 1]
+    large = [i for i, p in enumerate(scaled) if p >= 1]
+
+    while small and large:
+        s, l = small.pop(), large.pop()
+        prob[s], alias[s] = scaled[s], l
+
+        scaled[l] -= 1 - scaled[s]
+        (small if scaled[l] < 1 else large).append(l)
+
+    return prob, alias  # leftovers keep a probability of 1 against rounding errors
+
+
+class DealSnapshot:
+    """Deals of the day published by the pipeline for the bot to draw from."""
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    @property
+    def snapshot(self) -> dict | None:
+        return reload_if_replaced(self.path, lambda path: json.loads(path.read_text()))
+
+    def publish(self, version: str, deals: list[dict]) -> dict[str, int | float]:
+        depths = [
+            max(1 - deal["_price"] / deal["_average"], 0.0) if deal["_average"] else 0.0
+            for deal in deals
+        ]
+        prob, alias = build_alias([depth + 0.01 for depth in depths])  # shallow deals stay drawable
+
+        stats = {
+            "deals": len(deals),
+            "supermarkets": len({deal["_supermarket"] for deal in deals}),
+            "mean_discount": round(sum(depths) / len(depths), 4) if depths else 0.0,
+            "max_discount": round(max(depths), 4) if depths else 0.0,
+        }
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.with_suffix(".tmp").write_text(json.dumps({
+            "version": version,
+            "stats": stats,
+            "deals": deals,
+            "prob": prob,
+            "alias": alias,
+        }, ensure_ascii=False, separators=(",", ":")))
+        os.replace(self.path.with_suffix(".tmp"), self.path)
+
+        return stats
+
+    def draw(
+        self,
+        language: str,
+        n: int=5,
+        weighted: bool=True,
+        rng: random.Random | None=None,
+    ) -> list[dict] | None:
+        snapshot = self.snapshot
+        if snapshot is None:
+            return None
+
+        rng = rng or random
+        deals, prob, alias = snapshot["deals"], snapshot["prob"], snapshot["alias"]
+
+        if len(deals) <= n:
+            picks = rng.sample(range(len(deals)), len(deals))
+        elif weighted:
+            picks = {}
+            while len(picks) < n:  # redraw repeats, cheap as n is far below the deals
+                i = rng.randrange(len(deals))
+                picks[i if rng.random() < prob[i] else alias[i]] = None
+        else:
+            picks = rng.sample(range(len(deals)), n)
+
+        suffix = "_en" if language == "en" else "_zh"
+
+        return [  # in the shape of draw_deals
+            {
+                key.removesuffix(suffix): value for key, value in deals[i].items()
+                if key.endswith(suffix) or key[-3:] not in ["_en", "_zh"]
+            }
+            for i in picks
+        ]
+
+    def summary(self) -> dict[str, int | float | str | None]:
+        snapshot = self.snapshot or {"version": None, "stats": {}}
+
+        return {"version": snapshot["version"], **snapshot["stats"]}
@@ -0,0 +1,42 @@
+import sqlite3
+import threading
+from collections.abc import Callable
+from pathlib import Path
+from typing import TypeVar
+
+
+T = TypeVar("T")
+
+_LOADED = {}  # path: (version, content) of the files loaded by this process
+
+
+def reload_if_replaced(path: Path, loader: Callable[[Path], T]) -> T | None:
+    try:
+        stat = path.stat()
+        version = stat.st_ino, stat.st_mtime_ns, stat.st_size  # replaced, not rewritten
+
+        loaded = _LOADED.get(path)
+        if loaded is None or loaded[0] != version:
+            loaded = _LOADED[path] = version, loader(path)
+    except FileNotFoundError:  # the pipeline has not run yet
+        _LOADED.pop(path, None)
+        return None
+
+    return loaded[1]
+
+
+def connect_sqlite(local: threading.local, path: Path, *schema: str) -> sqlite3.Connection:
+    conn = getattr(local, "conn", None)
+
+    if conn is None:  # connections are opened on first use, one per thread
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        conn = sqlite3.connect(path, timeout=5, isolation_level=None)
+        conn.execute("PRAGMA journal_mode = WAL")  # readers never wait for the writer
+        conn.execute("PRAGMA synchronous = NORMAL")
+        for statement in schema:
+            conn.execute(statement)
+
+        local.conn = conn
+
+    return conn
@@ -25,7 +25,7 @@ class BotMessages:
                 "🔰 Helping you, helping you\n\n"
                 "Go to this <a href='https://online-price-watch.consumer.org.hk/opw/category'>website</a> to find an item you're interested in, then copy the link and send it to me. I'll help you keep track of the price trends for that item.\n\n"
                 "Easy peasy! Suppose you want to buy a specific type of soft drink, just send me the link. Try sending me this link:\nhttps://online-price-watch.consumer.org.hk/opw/product/P000000002\n"
-                "If you want to stop monitoring it, just send me the link again.\n\n"
+                "If you want to stop monitoring it, just send me the link again. You can also /search an item by its brand or name and tap its code to see its price trend.\n\n"
                 "I'll add the product you want to track to this /list, and you can view and modify the items in it anytime. Remember to /sub for daily price alerts, so when the item is at a good price, I'll remind you to buy it.\n\n"
                 "If you feel a bit lost, you can try feeling /lucky and randomly see what's on sale today. Also, you can 更改 your /lang to 中文 if you 唔識睇.\n\n"
                 "If you want to give feedback or find any bugs, you can leave a message for us to improve at this <a href='https://github.com/Jack-cky/SuperPriceWatchdog/issues'>link</a>."
@@ -34,13 +34,22 @@ class BotMessages:
                 "🔰 幫緊你，幫緊你\n\n"
                 "去依個<a href='https://online-price-watch.consumer.org.hk/opw/category'>網站</a>到搵你想關注嘅產品，然後copy條link俾我，我就會幫你留意件貨嘅價錢趨勢㗎喇。\n\n"
                 "好簡單！譬如你想飲某牌子嘅汽水，咁你只需要搵條到link俾我就得㗎喇。試下copy依條link俾我：\nhttps://online-price-watch.consumer.org.hk/opw/product/P000000002\n"
-                "如果唔想我再留意件貨，send多次條link俾我就得㗎喇。\n\n"
+                "如果唔想我再留意件貨，send多次條link俾我就得㗎喇。你亦可以用 /search 搵品牌或者貨名，再撳個編號睇價錢趨勢。\n\n"
                 "我會將你想關注嘅產品放入依條 /list 裏面，你隨時都可以睇返同修改入面嘅嘢。記住 /sub 每日嘅價格通知，咁到時件貨抵買嘅時間我就會提你入手㗎喇。\n\n"
                 "如果你覺得迷惘，你可以試下 feeling /lucky 咁隨機睇吓今日有啲乜嘢抵買。仲有you可以讕喺嘢咁change你個 /lang 去English。\n\n"
                 "如果你想發表意見或者發現有bugs，你可以去<a href='https://github.com/Jack-cky/SuperPriceWatchdog/issues'>依到</a>留個言俾我地去改善㗎。"
             ),
         }.get(language, msg)
 
+    @classmethod
+    def search(cls, language: str, status: str, msg: str) -> str:
+        return {
+            ("en", "usage"): "🔍 Tell me what to sniff for, e.g. <code>/search coke zero</code>",
+            ("en", "empty"): "🔍 Sniffed everywhere but found nothing. Try other words.",
+            ("zh", "usage"): "🔍 話俾我知要嗅啲乜，例如 <code>/search 可樂</code>",
+            ("zh", "empty"): "🔍 嗅勻晒都搵唔到，試下第啲字啦。",
+        }.get((language, status), msg)
+
     @classmethod
     def sub(cls, language: str, status: str, msg: str) -> str:
         return {
@@ -89,6 +98,7 @@ class BotMessages:
                 "[Error 500] Internal Error. It has been recorded in the system log.\n\n"
                 "If the problem if the problem persists, please create an issue <a href='https://github.com/Jack-cky/SuperPriceWatchdog/issues'>here</a>."
             ),
+            "timeout": "[Error 504] Timeout. Your command was interrupted and may not have taken effect.",
         }.get(status, msg)
 
     @classmethod
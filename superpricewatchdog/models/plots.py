@@ -0,0 +1,239 @@
+import logging
+import os
+import re
+import shutil
+import sqlite3
+import string
+import threading
+import time
+from collections import Counter, OrderedDict
+from io import BytesIO
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .files import connect_sqlite, reload_if_replaced
+
+if TYPE_CHECKING:
+    from matplotlib.font_manager import FontProperties
+
+
+FONT = None  # font of the renderer process
+
+
+class PlotCache:
+    """Rendered price plots of the current pipeline generation, in memory and as PNGs."""
+    def __init__(self, directory: Path, size: int=128, flush: float=5) -> None:
+        self.directory = directory
+        self.size = size
+        self.flush = flush
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._plots = OrderedDict()
+        self._stats = Counter()
+        self._flushed = time.monotonic()
+
+    def _connect(self) -> sqlite3.Connection:
+        return connect_sqlite(
+            self._local,
+            self.directory / "stats.sqlite3",  # kept next to the generations it outlives
+            """
+            CREATE TABLE IF NOT EXISTS stats (
+                name TEXT PRIMARY KEY
+                , value INTEGER
+            )
+            """,
+            "INSERT OR IGNORE INTO stats VALUES ('memory_hits', 0), ('disk_hits', 0), ('misses', 0)",
+        )
+
+    @property
+    def generation(self) -> str | None:
+        return reload_if_replaced(self.directory / "GENERATION", lambda path: path.read_text().strip())
+
+    def _get_path(self, generation: str, sku: str, language: str) -> Path | None:
+        if not re.fullmatch(r"\w+", f"{sku}{language}"):  # only cache valid codes
+            return None
+
+        return self.directory / generation / f"{sku}-{language}.png"
+
+    def get(self, sku: str, language: str) -> bytes | None:
+        generation = self.generation
+        pth = self._get_path(generation, sku, language) if generation else None
+
+        if pth is None:
+            self._count("misses")
+            return None
+
+        with self._lock:
+            img = self._plots.get(pth)
+            if img is not None:
+                self._plots.move_to_end(pth)
+
+        if img is not None:
+            self._count("memory_hits")
+            return img
+
+        try:
+            img = pth.read_bytes()
+        except OSError:
+            self._count("misses")
+            return None
+
+        self._count("disk_hits")
+        self._remember(pth, img)
+
+        return img
+
+    def put(self, sku: str, language: str, img: bytes) -> None:
+        generation = self.generation
+        pth = self._get_path(generation, sku, language) if generation else None
+
+        if pth is None:
+            return
+
+        try:
+            pth.with_suffix(".tmp").write_bytes(img)
+            os.replace(pth.with_suffix(".tmp"), pth)
+        except OSError:  # the generation was invalidated meanwhile
+            return
+
+        self._remember(pth, img)
+
+    def _remember(self, pth: Path, img: bytes) -> None:
+        with self._lock:
+            for key in [key for key in self._plots if key.parent != pth.parent]:
+                del self._plots[key]  # plots of an older generation
+
+            self._plots[pth] = img
+            self._plots.move_to_end(pth)
+
+            while len(self._plots) > self.size:
+                self._plots.popitem(last=False)
+
+    def invalidate(self, date: str) -> str:
+        generation = f"{date}-{time.time_ns()}"
+
+        self.directory.mkdir(parents=True, exist_ok=True)
+        (self.directory / generation).mkdir()
+
+        marker = self.directory / "GENERATION"
+        marker.with_suffix(".tmp").write_text(generation)
+        os.replace(marker.with_suffix(".tmp"), marker)
+
+        for pth in self.directory.iterdir():
+            if pth.is_dir() and pth.name != generation:
+                shutil.rmtree(pth, ignore_errors=True)
+
+        return generation
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
+
+            if time.monotonic() - self._flushed < self.flush:
+                return
+
+        self._flush()
+
+    def _flush(self) -> None:
+        with self._lock:
+            stats, self._stats = self._stats, Counter()
+            self._flushed = time.monotonic()
+
+        try:
+            self._connect().executemany(
+                "UPDATE stats SET value = value + ? WHERE name = ?",
+                [(value, name) for name, value in stats.items()],
+            )
+        except sqlite3.OperationalError:  # kept for the next flush
+            logging.warning("Failed to flush the plot cache counters:", exc_info=True)
+
+            with self._lock:
+                self._stats.update(stats)
+
+    def summary(self) -> dict[str, int | float | str | None]:
+        self._flush()  # counters of the other workers may lag by `flush` seconds
+
+        stats = dict(self._connect().execute("SELECT name, value FROM stats"))
+        n_hit = stats["memory_hits"] + stats["disk_hits"]
+        n_request = n_hit + stats["misses"]
+
+        return {
+            "generation": self.generation,
+            "entries": len(self._plots),
+            "memory_hits": stats["memory_hits"],
+            "disk_hits": stats["disk_hits"],
+            "misses": stats["misses"],
+            "hit_rate": round(n_hit / n_request, 4) if n_request else 0.0,
+        }
+
+
+def render_plot(
+    dates: list[str],
+    prices: list[float],
+    bid: float,
+    n_day: float,
+    brand: str,
+    name: str,
+    as_of: str,
+    font: "FontProperties | None"=None,
+) -> bytes:
+    """Render a price trend with its own figure, free of pyplot's global state."""
+    import matplotlib.dates as mdates  # loaded by the first render, not at startup
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(11, 4))
+    ax = fig.subplots()
+
+    ax.plot(mdates.datestr2num(dates), prices, label="Price")
+    ax.axhline(y=bid, color="r", linestyle="--", label="Target")
+
+    ax.set_title(
+        f"{n_day:.0f} Days Price Trend for {brand}; {name}",
+        loc="left",
+        fontproperties=font,
+    )
+    ax.set_title(
+        f"As of {as_of}",
+        loc="right",
+        fontsize=8,
+        style="italic",
+    )
+    ax.set_xlabel("Date")
+    ax.set_ylabel("Price (HKD)")
+    ax.legend()
+
+    ax.xaxis.set_major_locator(mdates.DayLocator(interval=7))
+    ax.xaxis.set_major_formatter(mdates.DateFormatter("%d %b"))
+
+    img = BytesIO()
+    fig.savefig(img, format="png")
+
+    return img.getvalue()
+
+
+def subset_font(source: Path, target: Path, text: str) -> Path:
+    from fontTools import subset
+
+    options = subset.Options()
+    options.font_number = 0  # the face matplotlib loads from a collection
+
+    font = subset.load_font(str(source), options)
+    subsetter = subset.Subsetter(options)
+    subsetter.populate(text=text + string.printable)
+    subsetter.subset(font)
+
+    subset.save_font(font, str(target), options)
+
+    return target
+
+
+def init_renderer(fname: str | None) -> None:
+    from matplotlib.font_manager import FontProperties
+
+    global FONT
+
+    FONT = FontProperties(fname=fname) if fname else None
+
+
+def render_job(sku: str, language: str, plot: dict) -> tuple[str, str, bytes]:
+    return sku, language, render_plot(**plot, font=FONT)
@@ -0,0 +1,148 @@
+import logging
+import sqlite3
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from .files import connect_sqlite
+
+
+class ProfileCache:
+    """User profiles cached in SQLite for the workers of a host, errors counting as misses."""
+    def __init__(self, path: Path, ttl: float=3600, size: int=10_000, flush: float=5) -> None:
+        self.path = path
+        self.ttl = ttl
+        self.size = size
+        self.flush = flush
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._used = {}
+        self._stats = Counter()
+        self._flushed = time.monotonic()
+
+    def _connect(self) -> sqlite3.Connection:
+        return connect_sqlite(
+            self._local,
+            self.path,
+            """
+            CREATE TABLE IF NOT EXISTS profiles (
+                user_id TEXT PRIMARY KEY
+                , language TEXT
+                , expiry REAL
+                , used REAL
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS profile_used_idx ON profiles (used)",
+            """
+            CREATE TABLE IF NOT EXISTS stats (
+                name TEXT PRIMARY KEY
+                , value INTEGER
+            )
+            """,
+            "INSERT OR IGNORE INTO stats VALUES ('hits', 0), ('misses', 0)",
+        )
+
+    def get(self, user_id: int | str) -> dict[str, str | None] | None:
+        now = time.time()
+
+        try:
+            conn = self._connect()
+            row = conn.execute(
+                "SELECT language FROM profiles WHERE user_id = ? AND expiry > ?",
+                (str(user_id), now),
+            ).fetchone()
+        except sqlite3.OperationalError:
+            logging.warning("Failed to read the profile cache:", exc_info=True)
+            return None
+
+        with self._lock:
+            if row:
+                self._used[str(user_id)] = now
+            self._stats["hits" if row else "misses"] += 1
+
+        self._flush()
+
+        return {"language": row[0]} if row else None
+
+    def put(self, user_id: int | str, language: str | None) -> None:
+        now = time.time()
+
+        try:
+            conn = self._connect()
+            conn.execute(
+                """
+                INSERT INTO profiles (user_id, language, expiry, used)
+                VALUES (?, ?, ?, ?)
+                ON CONFLICT (user_id) DO UPDATE
+                SET
+                    language = COALESCE(EXCLUDED.language, language)
+                    , expiry = EXCLUDED.expiry
+                    , used = EXCLUDED.used
+                """,
+                (str(user_id), language, now + self.ttl, now),
+            )
+            conn.execute(
+                "DELETE FROM profiles WHERE user_id IN ("
+                "SELECT user_id FROM profiles ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (self.size,),
+            )
+        except sqlite3.OperationalError:
+            logging.warning("Failed to write the profile cache:", exc_info=True)
+
+    def invalidate(self, user_id: int | str) -> None:
+        try:
+            self._connect().execute("DELETE FROM profiles WHERE user_id = ?", (str(user_id),))
+        except sqlite3.OperationalError:  # kept until it expires
+            logging.warning(f"Failed to invalidate {user_id}'s profile:", exc_info=True)
+
+        with self._lock:
+            self._used.pop(str(user_id), None)
+
+    def _flush(self, force: bool=False) -> None:
+        with self._lock:
+            if not force and time.monotonic() - self._flushed < self.flush:
+                return
+
+            used, self._used = self._used, {}
+            stats, self._stats = self._stats, Counter()
+            self._flushed = time.monotonic()
+
+        try:
+            conn = self._connect()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany(
+                    "UPDATE profiles SET used = MAX(used, ?) WHERE user_id = ?",
+                    [(stamp, user_id) for user_id, stamp in used.items()],
+                )
+                conn.executemany(
+                    "UPDATE stats SET value = value + ? WHERE name = ?",
+                    [(value, name) for name, value in stats.items()],
+                )
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+            conn.execute("COMMIT")
+        except sqlite3.OperationalError:  # kept for the next flush
+            logging.warning("Failed to flush the profile cache:", exc_info=True)
+
+            with self._lock:
+                self._used = {**used, **self._used}
+                self._stats.update(stats)
+
+    def summary(self) -> dict[str, int | float]:
+        self._flush(force=True)  # counters of the other workers may lag by `flush` seconds
+
+        conn = self._connect()
+
+        stats = dict(conn.execute("SELECT name, value FROM stats"))
+        n_request = stats["hits"] + stats["misses"]
+
+        return {
+            "entries": conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0],
+            "hits": stats["hits"],
+            "misses": stats["misses"],
+            "hit_rate": round(stats["hits"] / n_request, 4) if n_request else 0.0,
+        }
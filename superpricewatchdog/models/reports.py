@@ -0,0 +1,165 @@
+import json
+import os
+import re
+import resource
+import threading
+import time
+from datetime import datetime, timedelta, tzinfo
+from pathlib import Path
+
+
+COUNTERS = [
+    "rows_in", "rows_out", "bytes_in", "bytes_out", "http_calls", "rpc_calls",
+    "failures",
+]
+
+
+def reset_peak_rss() -> None:
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")  # reset the high water mark of this process
+    except OSError:
+        pass
+
+
+def get_peak_rss() -> int:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # peak of the whole process
+
+
+def get_size(pths: list[str | Path]) -> int:
+    size = 0
+    for pth in map(Path, pths):
+        if pth.is_file():
+            size += pth.stat().st_size
+        elif pth.is_dir():
+            size += sum(p.stat().st_size for p in pth.rglob("*") if p.is_file())
+
+    return size
+
+
+class RunReport:
+    """Timings, resource usage and counters of each task in a pipeline run."""
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._marks = {}
+        self.current = None
+        self.data = {}
+        self.path = None
+
+    def begin(self, tz: tzinfo, directory: Path, run_id: str | None=None) -> None:
+        now = datetime.now(tz)
+
+        self._marks = {"run": time.perf_counter()}
+        self.current = None
+        self.path = directory / f"{run_id or now.strftime('%Y%m%d-%H%M%S')}.json"
+        self.data = {
+            "run_id": self.path.stem,
+            "pid": os.getpid(),
+            "started_at": now.isoformat(timespec="seconds"),
+            "status": "running",
+            "wall_time": 0.0,
+            "tasks": {},
+        }
+
+        self.save()
+
+    def start(self, name: str) -> None:
+        reset_peak_rss()
+
+        self._marks[name] = time.perf_counter(), time.process_time()
+        self.current = name
+        self.data.setdefault("tasks", {})[name] = {
+            "status": "running",
+            **dict.fromkeys(COUNTERS, 0),
+        }
+
+        self.save()
+
+    def add(self, **counters: int) -> None:
+        with self._lock:  # worker threads of a task count concurrently
+            if self.current is None:
+                return
+
+            task = self.data["tasks"][self.current]
+            for key, value in counters.items():
+                task[key] += value
+
+    def finish(self, name: str, status: str, outputs: list[str]) -> None:
+        wall, cpu = self._marks.pop(name, (time.perf_counter(), time.process_time()))
+
+        self.add(bytes_out=get_size(outputs))
+        self.data["tasks"][name].update({
+            "status": status,
+            "wall_time": round(time.perf_counter() - wall, 3),
+            "cpu_time": round(time.process_time() - cpu, 3),
+            "peak_rss": get_peak_rss(),
+        })
+        self.current = None
+
+        self.save()
+
+    def save(self) -> None:
+        if self.path is None:
+            return
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        with open(f"{self.path}.tmp", "w") as f:
+            json.dump(self.data, f, indent=2)
+        os.replace(f"{self.path}.tmp", self.path)
+
+    def end(self, days: int, status: str | None=None) -> Path:
+        tasks = self.data["tasks"].values()
+
+        self.data["status"] = status or (
+            "failure" if any(task["status"] != "success" for task in tasks) else "success"
+        )
+        self.data["wall_time"] = round(time.perf_counter() - self._marks["run"], 3)
+
+        self.save()
+
+        cutoff = datetime.strptime(self.data["run_id"][:8], "%Y%m%d") \
+            - timedelta(days=days)
+        for pth in self.path.parent.glob("*.json"):
+            if pth.name[:8] < cutoff.strftime("%Y%m%d"):  # keep the history within the window
+                pth.unlink()
+
+        return self.path
+
+    @classmethod
+    def queue(cls, directory: Path, run_id: str, pid: int) -> None:
+        directory.mkdir(parents=True, exist_ok=True)
+
+        try:
+            with open(directory / f"{run_id}.json", "x") as f:  # never overwrite a started run
+                json.dump({"run_id": run_id, "pid": pid, "status": "queued", "tasks": {}}, f)
+        except FileExistsError:
+            pass
+
+    @classmethod
+    def find(cls, directory: Path, run_id: str) -> dict | None:
+        if not re.fullmatch(r"\d{8}-\d{6}(-\d+)?", run_id):
+            return None
+
+        try:
+            with open(directory / f"{run_id}.json") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    @classmethod
+    def load(cls, directory: Path, n: int) -> list[dict]:
+        reports = []
+        for pth in sorted(directory.glob("*.json"), reverse=True)[:n]:
+            with open(pth) as f:
+                reports.append(json.load(f))
+
+        return reports
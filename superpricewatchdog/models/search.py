@@ -0,0 +1,116 @@
+import heapq
+import math
+import os
+import re
+import unicodedata
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+from .files import reload_if_replaced
+
+if TYPE_CHECKING:
+    import polars as pl
+
+
+CJK = re.compile(r"[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")  # kana and ideographs
+
+TOKEN = re.compile(rf"{CJK.pattern}|[a-z0-9]+")
+
+
+def tokenize(text: str, query: bool=False) -> list[str]:
+    """Split English into words and Chinese into character bigrams.
+
+    Items are also indexed by single characters, so that a query of one
+    character matches, while longer queries only look up their bigrams.
+    """
+    terms = []
+    for run in TOKEN.findall(unicodedata.normalize("NFKC", text).lower()):  # full-width to ASCII
+        if not CJK.match(run):
+            terms.append(run)
+            continue
+
+        bigrams = [run[idx:idx+2] for idx in range(len(run)-1)]
+        if not query:
+            terms += list(run) + bigrams
+        else:
+            terms += bigrams or [run]
+
+    return terms
+
+
+class SearchIndex:
+    """Memory-mapped inverted index of item brands and names, published by the pipeline."""
+    FIELDS = ["brand_en", "name_en", "brand_zh", "name_zh"]
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+
+    @property
+    def index(self) -> "tuple[pl.DataFrame, int] | None":
+        import polars as pl  # loaded by the first search, not at startup
+
+        def load(path: Path) -> "tuple[pl.DataFrame, int]":
+            df = pl.read_ipc(path, memory_map=True)
+            return df, df["skus"].explode().n_unique()
+
+        return reload_if_replaced(self.path, load)
+
+    def publish(self, df_item: "pl.DataFrame") -> dict[str, int]:
+        import polars as pl
+
+        skus, terms = [], []
+        for sku, *fields in df_item.select("sku", *self.FIELDS).iter_rows():
+            for term in set(tokenize(" ".join(field or "" for field in fields))):
+                skus.append(sku)
+                terms.append(term)
+
+        df = (
+            pl.DataFrame({"term": terms, "sku": skus}, schema={"term": pl.String, "sku": pl.String})
+            .group_by("term")
+            .agg(pl.col("sku").sort().alias("skus"))
+            .sort("term")
+        )
+
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        df.write_ipc(f"{self.path}.tmp", compression="uncompressed")
+        os.replace(f"{self.path}.tmp", self.path)
+
+        return {"items": len(df_item), "terms": len(df), "postings": len(skus)}
+
+    def search(self, text: str, limit: int=10) -> list[str] | None:
+        index = self.index
+        if index is None:
+            return None
+
+        df, n_item = index
+        terms, postings = df["term"], df["skus"]
+
+        matches = []
+        for token in dict.fromkeys(tokenize(text, query=True)):
+            start = terms.search_sorted(token, side="left")
+            end = exact = start + (start < len(terms) and terms[start] == token)
+
+            if not CJK.match(token):  # words also match as a prefix of longer ones
+                end = terms.search_sorted(token + "\U0010ffff", side="left")
+
+            if end == start:  # e.g. a typo
+                return []
+
+            skus = set(postings[start:exact].explode().to_list())
+            matched = skus | set(postings[exact:end].explode().to_list())
+
+            matches.append((skus, matched, math.log1p(n_item / len(matched))))
+
+        if not matches:
+            return []
+
+        candidates = set.intersection(*(matched for _, matched, _ in matches))
+
+        def rank(sku: str) -> tuple[float, str]:
+            score = 0.0
+            for skus, _, idf in matches:  # prefixes of longer words weigh half
+                score += idf if sku in skus else idf/2
+
+            return -score, sku
+
+        return heapq.nsmallest(limit, candidates, key=rank)
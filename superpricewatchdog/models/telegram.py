@@ -0,0 +1,186 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter, defaultdict
+from collections.abc import Callable, Iterable
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+
+class TokenBucket:
+    """Block callers so that no more than `rate` calls pass per second."""
+    def __init__(self, rate: float, burst: int=1) -> None:
+        self.rate = rate
+        self.burst = burst
+        self._lock = threading.Lock()
+        self._tokens = float(burst)
+        self._stamp = time.monotonic()
+        self._paused = 0.0
+
+    def acquire(self) -> None:
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now-self._stamp) * self.rate)
+                self._stamp = now
+
+                if now >= self._paused and self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+
+                delay = max(self._paused - now, (1-self._tokens) / self.rate)
+
+            time.sleep(delay)
+
+    def pause(self, seconds: float) -> None:
+        with self._lock:
+            self._paused = max(self._paused, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+
+class AlertDispatcher:
+    """Send one message per chat within Telegram's global and per-chat limits."""
+    DONE = ["sent", "skipped", "rejected"]
+
+    def __init__(
+        self,
+        url: str,
+        state: Path,
+        rate: float=30,
+        chat_rate: float=1,
+        workers: int=8,
+        retries: int=3,
+        backoff: float=1.5,
+    ) -> None:
+        self.url = url
+        self.state = state
+        self.retries = retries
+        self.backoff = backoff
+        self.workers = workers
+        self._bucket = TokenBucket(rate)
+        self._chats = defaultdict(lambda: TokenBucket(chat_rate))
+        self._lock = threading.Lock()
+        self._stats = Counter()
+
+    def load(self) -> dict[str, str]:
+        outcomes = {}
+        if self.state.exists():
+            with open(self.state) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:  # a line cut short by a crash
+                        continue
+                    outcomes[record["chat_id"]] = record["status"]
+
+        return outcomes
+
+    def dispatch(
+        self,
+        chat_ids: Iterable[str],
+        render: Callable[[str], str | None],
+    ) -> dict[str, float]:
+        outcomes = self.load()
+        chat_ids = list(dict.fromkeys(map(str, chat_ids)))
+        pending = [
+            chat_id for chat_id in chat_ids
+            if outcomes.get(chat_id) not in self.DONE
+        ]
+
+        self._stats = Counter(resumed=len(chat_ids) - len(pending))
+        self.state.parent.mkdir(parents=True, exist_ok=True)
+
+        start = time.perf_counter()
+        with (
+            self._create_session() as session,
+            open(self.state, "a") as f,
+            ThreadPoolExecutor(max_workers=self.workers) as executor,
+        ):
+            for chat_id in pending:
+                executor.submit(self._deliver, session, f, chat_id, render)
+
+        elapsed = time.perf_counter() - start
+
+        return {
+            **dict.fromkeys(["sent", "skipped", "rejected", "failed", "requests", "throttled"], 0),
+            **self._stats,
+            "elapsed": elapsed,
+            "rate": self._stats["sent"] / elapsed if elapsed else 0.0,
+        }
+
+    def _create_session(self) -> requests.Session:
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.workers)  # retried by `_send`
+
+        session = requests.Session()
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+
+        return session
+
+    def _deliver(
+        self,
+        session: requests.Session,
+        f,
+        chat_id: str,
+        render: Callable[[str], str | None],
+    ) -> None:
+        code = None
+        try:
+            msg = render(chat_id)
+            status, code = self._send(session, chat_id, msg) if msg else ("skipped", None)
+        except Exception:
+            logging.error(f"Failed to alert {chat_id}:", exc_info=True)
+            status = "failed"
+
+        with self._lock:
+            self._stats[status] += 1
+            f.write(json.dumps({"chat_id": chat_id, "status": status, "code": code}) + "\n")
+            f.flush()
+
+    def _send(
+        self,
+        session: requests.Session,
+        chat_id: str,
+        msg: str,
+    ) -> tuple[str, int | None]:
+        data = {
+            "chat_id": chat_id,
+            "text": msg,
+            "parse_mode": "HTML",
+            "disable_web_page_preview": 1,
+        }
+
+        code = None
+        for attempt in range(self.retries + 1):
+            self._chats[chat_id].acquire()
+            self._bucket.acquire()
+
+            try:
+                response = session.post(self.url, data=data, timeout=30)
+            except requests.RequestException:
+                logging.warning(f"Failed to reach Telegram for {chat_id}:", exc_info=True)
+                time.sleep(self.backoff * 2**attempt)
+                continue
+            finally:
+                with self._lock:
+                    self._stats["requests"] += 1
+
+            code = response.status_code
+            if code == 200:
+                return "sent", code
+
+            if code == 429:  # flood control applies to the whole bot
+                retry_after = response.json().get("parameters", {}).get("retry_after", 1)
+                self._bucket.pause(retry_after)
+                with self._lock:
+                    self._stats["throttled"] += 1
+            elif code >= 500:
+                time.sleep(self.backoff * 2**attempt)
+            else:  # the chat is gone or has blocked the bot
+                return "rejected", code
+
+        return "failed", code
@@ -0,0 +1,274 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+from .files import connect_sqlite
+
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # alive, but owned by another user
+        pass
+
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"  # zombies have exited
+    except OSError:  # no procfs to tell
+        return True
+
+
+class UpdateQueue:
+    """Telegram updates handled at most once and in order per user by the workers of a host."""
+    def __init__(self, path: Path, handlers: int=4, lease: float=120, poll: float=0.5) -> None:
+        self.path = path
+        self.handlers = handlers
+        self.lease = lease
+        self.poll = poll
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._threads = []
+        self._callbacks = None
+        self._stopped = threading.Event()
+        self._wakeup = threading.Semaphore(0)
+
+    def _connect(self) -> sqlite3.Connection:
+        return connect_sqlite(
+            self._local,
+            self.path,
+            """
+            CREATE TABLE IF NOT EXISTS updates (
+                seq INTEGER PRIMARY KEY AUTOINCREMENT
+                , update_id INTEGER UNIQUE
+                , user_id TEXT
+                , payload TEXT
+                , state TEXT DEFAULT 'queued'
+                , enqueued REAL
+                , started REAL
+                , lease REAL
+                , owner INTEGER
+            )
+            """,
+            "CREATE INDEX IF NOT EXISTS update_user_idx ON updates (user_id, seq)",
+            """
+            CREATE TABLE IF NOT EXISTS stats (
+                name TEXT PRIMARY KEY
+                , value REAL
+            )
+            """,
+            "INSERT OR IGNORE INTO stats VALUES ('processed', 0), ('failed', 0), ('expired', 0), "
+            "('duplicates', 0), ('wait', 0), ('max_wait', 0), ('busy', 0), ('max_busy', 0)",
+        )
+
+    def _transaction(self, conn: sqlite3.Connection, statements: Callable[[], None]) -> None:
+        conn.execute("BEGIN IMMEDIATE")  # one writer at a time across the workers
+        try:
+            statements()
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+        conn.execute("COMMIT")
+
+    def put(self, update_id: int | None, user_id: int | str, update: dict) -> bool:
+        conn = self._connect()
+
+        inserted = conn.execute(
+            "INSERT OR IGNORE INTO updates (update_id, user_id, payload, enqueued) "
+            "VALUES (?, ?, ?, ?)",
+            (update_id, str(user_id), json.dumps(update), time.time()),
+        ).rowcount
+
+        if not inserted:
+            conn.execute("UPDATE stats SET value = value + 1 WHERE name = 'duplicates'")
+            return False
+
+        self._wakeup.release()
+
+        return True
+
+    def claim(self) -> tuple[tuple[int, dict, float] | None, list[dict]]:
+        conn = self._connect()
+        now = time.time()
+        claimed, expired = None, []
+
+        def statements() -> None:
+            nonlocal claimed
+
+            for seq, payload, lease, owner in conn.execute(
+                "SELECT seq, payload, lease, owner FROM updates WHERE state = 'started'"
+            ).fetchall():
+                if not _is_alive(owner):  # its worker exited midway
+                    conn.execute("DELETE FROM updates WHERE seq = ?", (seq,))
+                    expired.append(json.loads(payload))
+                elif lease < now:  # still running, so the user's next updates keep waiting
+                    logging.warning(f"Update {seq} has run past its lease in worker {owner}.")
+                    conn.execute(
+                        "UPDATE updates SET lease = ? WHERE seq = ?",
+                        (now + self.lease, seq),
+                    )
+
+            conn.execute(
+                "UPDATE stats SET value = value + ? WHERE name = 'expired'",
+                (len(expired),),
+            )
+
+            row = conn.execute(
+                """
+                SELECT seq, payload, enqueued
+                FROM updates u
+                WHERE state = 'queued'
+                    AND seq = (SELECT MIN(seq) FROM updates WHERE user_id = u.user_id)
+                ORDER BY seq
+                LIMIT 1
+                """
+            ).fetchone()
+
+            if row:
+                conn.execute(
+                    "UPDATE updates SET state = 'started', started = ?, lease = ?, owner = ? "
+                    "WHERE seq = ?",
+                    (now, now + self.lease, os.getpid(), row[0]),
+                )
+                claimed = row[0], json.loads(row[1]), now - row[2]
+
+        self._transaction(conn, statements)
+
+        return claimed, expired
+
+    def done(self, seq: int, wait: float, busy: float, failed: bool=False) -> None:
+        conn = self._connect()
+
+        def statements() -> None:
+            if not conn.execute("DELETE FROM updates WHERE seq = ?", (seq,)).rowcount:
+                return  # expired by another worker, which took this one for dead
+
+            conn.executemany(
+                "UPDATE stats SET value = value + ? WHERE name = ?",
+                [(1, "failed" if failed else "processed"), (wait, "wait"), (busy, "busy")],
+            )
+            conn.executemany(
+                "UPDATE stats SET value = MAX(value, ?) WHERE name = ?",
+                [(wait, "max_wait"), (busy, "max_busy")],
+            )
+
+        self._transaction(conn, statements)
+
+    def start(
+        self,
+        handle: Callable[[dict], None],
+        expire: Callable[[dict], None] | None=None,
+    ) -> None:
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+
+            if self._callbacks is None:  # workers forked from a preloaded application
+                os.register_at_fork(after_in_child=self._restart)
+
+            self._pid = os.getpid()
+            self._callbacks = handle, expire
+            self._stopped.clear()
+            self._threads = [
+                threading.Thread(
+                    target=self._work,
+                    args=(handle, expire),
+                    name=f"update-handler-{idx}",
+                    daemon=True,
+                )
+                for idx in range(self.handlers)
+            ]
+
+            for thread in self._threads:
+                thread.start()
+
+    def _restart(self) -> None:
+        if self._pid is None:  # stopped before the fork
+            return
+
+        self._local = threading.local()  # neither threads nor connections survive a fork
+        self._lock = threading.Lock()
+        self._wakeup = threading.Semaphore(0)
+        self._pid, self._threads = None, []
+
+        self.start(*self._callbacks)
+
+    def stop(self) -> None:
+        with self._lock:
+            self._stopped.set()
+            for _ in self._threads:
+                self._wakeup.release()
+
+            for thread in self._threads:
+                thread.join()
+
+            self._pid, self._threads = None, []
+
+    def _work(self, handle: Callable[[dict], None], expire: Callable[[dict], None] | None) -> None:
+        while not self._stopped.is_set():
+            try:
+                claimed, expired = self.claim()
+            except sqlite3.OperationalError:  # the store stayed locked
+                logging.warning("Failed to claim an update:", exc_info=True)
+                claimed, expired = None, []
+
+            for update in expired:
+                logging.warning(f"Dropped update {update.get('update_id')} of an exited worker.")
+                try:
+                    if expire:
+                        expire(update)
+                except Exception:
+                    logging.error("Failed to expire an update:", exc_info=True)
+
+            if claimed is None:  # woken by a local update or polling for other workers'
+                self._wakeup.acquire(timeout=self.poll)
+                continue
+
+            seq, update, wait = claimed
+
+            start, failed = time.perf_counter(), False
+            try:
+                handle(update)
+            except Exception:
+                logging.error(f"Failed to handle update {seq}:", exc_info=True)
+                failed = True
+
+            try:
+                self.done(seq, wait, time.perf_counter() - start, failed)
+            except sqlite3.OperationalError:
+                logging.warning(f"Failed to complete update {seq}:", exc_info=True)
+
+    def summary(self) -> dict[str, int | float]:
+        conn = self._connect()
+        now = time.time()
+
+        stats = dict(conn.execute("SELECT name, value FROM stats"))
+        queued, running, oldest = conn.execute(
+            "SELECT "
+            "COALESCE(SUM(state = 'queued'), 0), "
+            "COALESCE(SUM(state = 'started'), 0), "
+            "MIN(enqueued) FROM updates",
+        ).fetchone()
+        n_update = stats["processed"] + stats["failed"]
+
+        return {
+            "depth": queued,
+            "running": running,
+            "oldest": round(now - oldest, 4) if oldest else 0.0,
+            "processed": int(stats["processed"]),
+            "failed": int(stats["failed"]),
+            "expired": int(stats["expired"]),
+            "duplicates": int(stats["duplicates"]),
+            "mean_wait": round(stats["wait"] / n_update, 4) if n_update else 0.0,
+            "max_wait": round(stats["max_wait"], 4),
+            "mean_busy": round(stats["busy"] / n_update, 4) if n_update else 0.0,
+            "max_busy": round(stats["max_busy"], 4),
+        }
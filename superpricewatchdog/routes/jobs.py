@@ -0,0 +1,117 @@
+import fcntl
+import itertools
+import logging
+import multiprocessing
+from collections.abc import Iterator
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from flask import Blueprint, current_app, request
+
+from ..config import PTH
+from ..models.reports import RunReport
+
+
+bp = Blueprint("jobs", __name__)
+
+
+def _run_job(job_id: str) -> None:
+    from .pipeline import run_job  # only the job loads the pipeline tasks
+
+    run_job(job_id)
+
+
+def _start_job(job_id: str) -> multiprocessing.Process:
+    process = multiprocessing.get_context("spawn").Process(
+        target=_run_job,
+        args=(job_id,),
+        name=f"pipeline-{job_id}",
+    )
+    process.start()
+
+    return process
+
+
+@contextmanager
+def _lock_reports(directory: Path) -> Iterator[None]:
+    directory.mkdir(parents=True, exist_ok=True)
+
+    with open(directory / ".lock", "w") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)  # released when the file is closed
+        yield
+
+
+def _is_active(report: dict) -> bool:
+    if report["status"] not in ["queued", "running", "scheduled"]:
+        return False
+
+    try:
+        with open(f"/proc/{report['pid']}/stat") as f:
+            return f.read().rsplit(")", 1)[1].split()[0] != "Z"  # zombies have exited
+    except OSError:
+        return False
+
+
+@bp.route("/api/v1/update", methods=["GET"])
+def execute_pipeline() -> tuple[dict[str, str], int]:
+    if request.args.get("secret") == current_app.config["SECRET_PIPELINE"]:
+        directory = PTH / "logs" / "reports"
+        multiprocessing.active_children()  # reap finished jobs
+
+        with _lock_reports(directory):  # one check and start at a time across the workers
+            for report in RunReport.load(directory, 1):
+                if _is_active(report):  # including a job waiting to send its alerts
+                    return {"status": report["status"], "id": report["run_id"]}, 409
+
+            job_id = stamp = datetime.now(current_app.hkt).strftime("%Y%m%d-%H%M%S")
+            for n in itertools.count(1):  # a job that ended within the same second
+                if not (directory / f"{job_id}.json").exists():
+                    break
+                job_id = f"{stamp}-{n}"
+
+            try:
+                process = _start_job(job_id)
+            except Exception:
+                logging.error("Pipeline failed to start", exc_info=True)
+
+                return {"status": "failed"}, 500
+
+            RunReport.queue(directory, job_id, process.pid)
+    else:
+        logging.warning("Invalid pipeline access secret.")
+
+        return {"status": "invalid secret"}, 403
+
+    return {"status": "queued", "id": job_id}, 202
+
+
+@bp.route("/api/v1/update/<job_id>", methods=["GET"])
+def check_pipeline(job_id: str) -> tuple[dict, int]:
+    if request.args.get("secret") == current_app.config["SECRET_PIPELINE"]:
+        report = RunReport.find(PTH / "logs" / "reports", job_id)
+
+        if report is None:
+            return {"status": "not found"}, 404
+
+        if report["status"] in ["queued", "running", "scheduled"] \
+                and not _is_active(report):
+            report["status"] = "failure"  # the job exited without a final report
+    else:
+        logging.warning("Invalid pipeline access secret.")
+
+        return {"status": "invalid secret"}, 403
+
+    return report, 200
+
+
+@bp.route("/api/v1/report", methods=["GET"])
+def summarise_reports() -> tuple[dict, int]:
+    if request.args.get("secret") == current_app.config["SECRET_PIPELINE"]:
+        n = request.args.get("n", 7, type=int)
+
+        return {"reports": RunReport.load(PTH / "logs" / "reports", n)}, 200
+    else:
+        logging.warning("Invalid pipeline access secret.")
+
+        return {"status": "invalid secret"}, 403
@@ -1,20 +1,234 @@
+import hashlib
 import json
 import logging
+import multiprocessing
 import os
 import re
+import resource
+import sched
+import shutil
 import time
+from collections.abc import Iterable, Iterator
+from concurrent.futures import (
+    FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait,
+)
 from datetime import datetime, timedelta
+from pathlib import Path
+from tempfile import TemporaryDirectory
 
 import luigi
 import polars as pl
+import psycopg
 import requests
-from flask import Blueprint, current_app, request
+from flask import current_app
+from psycopg import sql
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ..config import CONFIG, PTH, LOGGER, Config
+from ..models.plots import init_renderer, render_job, subset_font
+from ..models.reports import RunReport, get_size
+from ..models.telegram import AlertDispatcher
+from .response import DEAL_SNAPSHOT, PLOT_CACHE, SEARCH_INDEX, slash_alert
+
+
+for config in [
+    ("worker", "keep-alive", "True"),
+    ("worker", "no_install_shutdown_handler", "True"),
+    ("scheduler", "retry_delay", CONFIG.get("SCHEDULER", "RETRY_DELAY")),
+    ("scheduler", "retry_count", CONFIG.get("SCHEDULER", "RETRY_COUNT")),
+]:
+    luigi.configuration.get_config().set(*config)
+
+FONT = PTH / "config" / "NotoSansCJK-Bold.ttc"
+
+_NAME = pl.Struct({"en": pl.String, "zh-Hant": pl.String})
+
+RAW_SCHEMA = {
+    "code": pl.String,
+    "brand": _NAME,
+    "name": _NAME,
+    "cat1Name": _NAME,
+    "cat2Name": _NAME,
+    "cat3Name": _NAME,
+    "prices": pl.List(
+        pl.Struct({"supermarketCode": pl.String, "price": pl.String})
+    ),
+    "offers": pl.List(
+        pl.Struct({
+            "supermarketCode": pl.String,
+            "en": pl.String,
+            "zh-Hant": pl.String,
+        })
+    ),
+}
+
+
+class PriceDataset:
+    """Price records of a pipeline stage partitioned by effective date."""
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    @property
+    def directory(self) -> Path:
+        return PTH / "data" / "prices" / self.name
+
+    def partition(self, date: str) -> Path:
+        return self.directory / f"effective_date={date}"
+
+    def exists(self, date: str) -> bool:
+        return self.partition(date).exists()
+
+    def dates(self) -> list[str]:
+        return sorted(
+            pth.name.split("=")[1]
+            for pth in self.directory.glob("effective_date=*")
+            if pth.suffix != ".tmp"
+        )
+
+    def scan(self, dates: list[str]) -> pl.LazyFrame:
+        return pl.scan_parquet(
+            [self.partition(date) / "part-0.parquet" for date in dates]
+        )
+
+    def count(self, dates: list[str]) -> int:
+        return self.scan(dates).select(pl.len()).collect().item() if dates else 0
+
+    def size(self, dates: list[str]) -> int:
+        return get_size([self.partition(date) for date in dates])
+
+    def sink(self, lf: pl.LazyFrame, date: str) -> None:
+        tmp = self.partition(date).with_suffix(".tmp")  # incomplete partitions are never read
+        shutil.rmtree(tmp, ignore_errors=True)
+        tmp.mkdir(parents=True)
+
+        lf.sink_parquet(tmp / "part-0.parquet", engine="streaming")
+
+        tmp.rename(self.partition(date))
+
+    def expire(self, date_expiry: list[str]) -> None:
+        cutoff = datetime.now(current_app.hkt) \
+            - timedelta(days=current_app.config["DELTA"]+1)
+
+        for date in self.dates():
+            if date in date_expiry or date < cutoff.strftime("%Y%m%d"):
+                shutil.rmtree(self.partition(date))
+
+
+RAW_PRICES = PriceDataset("raw")
+CLEANSED_PRICES = PriceDataset("cleansed")
+ANALYSED_PRICES = PriceDataset("analysed")
+
+
+class ItemCatalog:
+    """Items synced to the database with their content hashes, sorted by SKU."""
+    COLUMNS = [
+        "sku",
+        "department_en",
+        "department_zh",
+        "category_en",
+        "category_zh",
+        "subcategory_en",
+        "subcategory_zh",
+        "brand_en",
+        "brand_zh",
+        "name_en",
+        "name_zh",
+        "digest",
+    ]
+
+    @property
+    def path(self) -> Path:
+        return PTH / "data" / "catalog.arrow"
+
+    def load(self) -> pl.DataFrame:
+        if self.path.exists():
+            return pl.read_ipc(self.path, memory_map=False)
+
+        return pl.DataFrame(schema=dict.fromkeys(self.COLUMNS, pl.String))
+
+    def digest(self, cols: list[str]) -> pl.Expr:
+        return (
+            pl.struct(cols)
+            .struct.json_encode()
+            .map_batches(  # stable across Polars versions, unlike Expr.hash
+                lambda s: pl.Series([
+                    hashlib.blake2b(txt.encode(), digest_size=16).hexdigest()
+                    for txt in s
+                ]),
+                return_dtype=pl.String,
+            )
+            .alias("digest")
+        )
+
+    def delta(self, df_item: pl.DataFrame) -> pl.DataFrame:
+        return df_item.join(self.load(), on=["sku", "digest"], how="anti")
+
+    def update(self, df_item: pl.DataFrame) -> None:
+        df = df_item.select(self.COLUMNS)
+        df = pl.concat([self.load().join(df, on="sku", how="anti"), df]).sort("sku")
+
+        self.path.parent.mkdir(exist_ok=True)
+        df.write_ipc(f"{self.path}.tmp", compression="uncompressed")  # zero-copy for the bot
+        os.replace(f"{self.path}.tmp", self.path)
+
+
+ITEM_CATALOG = ItemCatalog()
+
+REPORT = RunReport()
+
+SCHEDULER = sched.scheduler(time.time, time.sleep)
+
+
+@luigi.Task.event_handler(luigi.Event.START)
+def _start_report(task: luigi.Task) -> None:
+    REPORT.start(task.task_family)
+
+
+@luigi.Task.event_handler(luigi.Event.SUCCESS)
+def _succeed_report(task: luigi.Task) -> None:
+    REPORT.finish(task.task_family, "success", _get_paths(task.output()))
+
+
+@luigi.Task.event_handler(luigi.Event.FAILURE)
+def _fail_report(task: luigi.Task, exception: Exception) -> None:
+    REPORT.finish(task.task_family, "failure", _get_paths(task.output()))
+
+
+def _get_paths(targets) -> list[str]:
+    targets = targets if isinstance(targets, list) else [targets]
+
+    return [target.path for target in targets]
+
 
-from ..config import PTH, LOGGER
-from .response import slash_alert, send_response
+def _create_session(methods: list[str]) -> requests.Session:
+    """Pool connections for the task workers and retry each request on its own.
 
+    Inserts are only retried when they cannot have reached the database, as a
+    timed out batch of `prices`, which has no key, may have been committed.
+    """
+    idempotent = "POST" not in methods
+    retry = Retry(
+        total=current_app.config["RETRIES"],
+        read=None if idempotent else 0,
+        backoff_factor=current_app.config["BACKOFF"],
+        status_forcelist=[429, 500, 502, 503, 504] if idempotent else [429, 503],
+        allowed_methods=methods,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=1,
+        pool_maxsize=current_app.config["WORKERS"],
+        max_retries=retry,
+    )
 
-bp = Blueprint("pipeline", __name__)
+    session = requests.Session()
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    session.hooks["response"].append(
+        lambda response, *args, **kwargs: REPORT.add(http_calls=1)
+    )
+
+    return session
 
 
 class OpwVersions(luigi.Task):
@@ -32,6 +246,8 @@ class OpwVersions(luigi.Task):
         with self.output().open("w") as f:
             json.dump(data, f)
 
+        REPORT.add(rows_out=len(data["version"]))
+
         LOGGER.info(
             f"\t- Outstanding date(s): {data['version'].keys()}\n"
             f"\t- Expiring date(s): {data['expiry']}"
@@ -48,6 +264,8 @@ class OpwVersions(luigi.Task):
         )
         response.raise_for_status()
 
+        REPORT.add(http_calls=1, bytes_in=len(response.content))
+
         date = response.json()
         versions = date.get("timestamps", [])
 
@@ -68,6 +286,7 @@ class OpwVersions(luigi.Task):
 
     def _get_existing_records(self) -> list[str]:
         response = current_app.supabase_client.rpc("get_dates").execute()
+        REPORT.add(rpc_calls=1)
 
         return [data["_date"] for data in response.data]
 
@@ -83,80 +302,244 @@ class OpwVersions(luigi.Task):
             else:
                 date_expiry.append(date)
 
+        date_window = sorted(
+            set(existing_dates) - set(date_expiry) | set(date_version)
+        )
+
         latest = datetime.now(current_app.hkt) - timedelta(days=2)
         if latest.strftime("%Y%m%d") not in date_version:  # ensure latest version is available
             date_version = {}
 
-        return {"version": date_version, "expiry": date_expiry}
+        return {
+            "version": date_version,
+            "expiry": date_expiry,
+            "window": date_window,
+        }
 
 
 class OpwDownloader(luigi.Task):
-    """Download OPW data and convert data to DataFrames."""
+    """Stream OPW data into cached DataFrames batch by batch."""
     def requires(self):
         return OpwVersions()
 
     def output(self):
         return [
             luigi.LocalTarget(PTH / "data" / "raw_items.parquet"),
-            luigi.LocalTarget(PTH / "data" / "raw_prices.parquet"),
+            luigi.LocalTarget(PTH / "data" / "raw_prices.json"),
         ]
 
     def run(self):
         with self.input().open("r") as f:
             date_version = json.load(f)["version"]
 
-        df_item, df_price = self._download_records(date_version)
+        dates, n_item, n_price = self._download_records(date_version)
 
-        if df_item.is_empty() or df_price.is_empty():
-            df_empty = pl.DataFrame({"empty": []})
-            df_item = df_price = df_empty
+        with self.output()[1].open("w") as f:
+            json.dump({"dates": dates}, f)
 
-        df_item.write_parquet(self.output()[0].path)
-        df_price.write_parquet(self.output()[1].path)
+        REPORT.add(
+            rows_out=n_item+n_price,
+            bytes_out=RAW_PRICES.size(dates),
+        )
 
         LOGGER.info(
-            f"\t- Total of raw items: {len(df_item):,}\n"
-            f"\t- Total of raw prices: {len(df_price):,}"
+            f"\t- Total of raw items: {n_item:,}\n"
+            f"\t- Total of raw prices: {n_price:,}"
         )
 
-    def _download_records(
+    def _flatten_records(
         self,
-        date_version,
+        data: bytes,
+        date: str,
     ) -> tuple[pl.DataFrame, pl.DataFrame]:
-        prices, items = [], []
-        for date, version in date_version.items():
-            response = requests.get(
-                current_app.config["API_FILE"].format(version),
-                timeout=20,
+        try:
+            df = pl.read_json(data.strip() or b"[]", schema=RAW_SCHEMA)  # parsed once, natively
+        except pl.exceptions.ComputeError as e:
+            raise ValueError("Incomplete OPW file received.") from e
+
+        df = (
+            df
+            .with_row_index("idx")  # identify items sharing the same code
+            .with_columns(pl.col("code").str.to_uppercase())
+        )
+
+        df_item = df.select(
+            "code",
+            *[
+                pl.col(field).struct.field(lang).alias(f"{field}.{lang}")
+                for field in ["brand", "name", "cat1Name", "cat2Name", "cat3Name"]
+                for lang in ["en", "zh-Hant"]
+            ],
+        )
+
+        # expand sub-dictionaries into a single row per supermarket
+        df_smkt_price, df_smkt_offer = (
+            df.select("idx", "code", field)
+            .explode(field)
+            .unnest(field)
+            .drop_nulls("supermarketCode")
+            .unique(["idx", "supermarketCode"], keep="last", maintain_order=True)
+            for field in ["prices", "offers"]
+        )
+
+        df_price = (
+            df_smkt_price
+            .join(
+                df_smkt_offer,
+                on=["idx", "code", "supermarketCode"],
+                how="full",
+                coalesce=True,
+            )
+            .sort("idx", maintain_order=True)
+            .select(
+                "code",
+                pl.lit(date).alias("date"),
+                "supermarketCode",
+                "price",
+                "en",
+                "zh-Hant",
             )
+        )
+
+        return df_item, df_price
+
+    def _write_batches(
+        self,
+        directory: Path,
+        data: bytes,
+        date: str,
+    ) -> None:
+        batch = current_app.config["BATCH"]
+
+        for name, df in zip(
+            ["items", "prices"],
+            self._flatten_records(data, date),
+        ):
+            for idx, df_batch in enumerate(df.iter_slices(batch)):
+                df_batch.write_parquet(directory / name / f"{date}-{idx:05d}.parquet")
+
+    def _fetch_version(
+        self,
+        session: requests.Session,
+        url: str,
+        date: str,
+        version: str,
+    ) -> None:
+        start = time.perf_counter()
+
+        directory = PTH / "data" / "cache" / f"{version}.tmp"  # incomplete versions are never served
+        shutil.rmtree(directory, ignore_errors=True)
+        (directory / "items").mkdir(parents=True)
+        (directory / "prices").mkdir()
+
+        with session.get(url.format(version), stream=True, timeout=20) as response:
             response.raise_for_status()
 
-            data = response.json()
+            data = b"".join(self._count_bytes(
+                response.iter_content(1 << 16),  # gzip is decoded incrementally
+            ))
 
-            for item in data:
-                item["code"] = str(item["code"]).upper()
-                code = item["code"]
+        self._write_batches(directory, data, date)
 
-                price = item.pop("prices", [])
-                offer = item.pop("offers", [])
+        directory.rename(directory.with_suffix(""))
 
-                # expand sub-dictionaries into a single object
-                smkt_price = {p["supermarketCode"]: p for p in price}
-                smkt_offer = {o["supermarketCode"]: o for o in offer}
+        LOGGER.info(
+            f"\t- Downloaded version {version} ({date}) "
+            f"in {time.perf_counter()-start:.2f}s"
+        )
+
+    def _count_bytes(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        for chunk in chunks:
+            REPORT.add(bytes_in=len(chunk))
 
-                price = [
-                    {
-                        "code": code, "date": date,
-                        **smkt_price.get(smkt, {}),
-                        **smkt_offer.get(smkt, {}),
-                    }
-                    for smkt in set(smkt_price) | set(smkt_offer)
-                ]
+            yield chunk
 
-                prices += price
-                items.append(item)
+    def _evict_cache(self, directory: Path) -> None:
+        cutoff = datetime.now(current_app.hkt) \
+            - timedelta(days=current_app.config["DELTA"])
+
+        for version in directory.iterdir():
+            if version.suffix == ".tmp" \
+                    or version.name[:8] < cutoff.strftime("%Y%m%d"):
+                shutil.rmtree(version)
+
+    def _merge_batches(self, directories: list[Path], file_pth: str) -> int:
+        files = [
+            file
+            for directory in directories
+            for file in sorted(directory.glob("*.parquet"))  # ordered by batch
+        ]
 
-        return pl.json_normalize(items), pl.from_records(prices)
+        if files:
+            pl.scan_parquet(files).sink_parquet(file_pth)
+        else:
+            pl.DataFrame({"empty": []}).write_parquet(file_pth)
+
+        return pl.scan_parquet(file_pth).select(pl.len()).collect().item()
+
+    def _partition_prices(self, directory: Path, date: str) -> bool:
+        files = sorted((directory / "prices").glob("*.parquet"))  # ordered by batch
+
+        if files and not RAW_PRICES.exists(date):
+            RAW_PRICES.sink(pl.scan_parquet(files), date)
+
+        return RAW_PRICES.exists(date)
+
+    def _download_records(self, date_version) -> tuple[list[str], int, int]:
+        url = current_app.config["API_FILE"]
+        workers = current_app.config["WORKERS"]
+        app = current_app._get_current_object()
+
+        start = time.perf_counter()
+
+        directory = PTH / "data" / "cache"
+        directory.mkdir(parents=True, exist_ok=True)
+
+        self._evict_cache(directory)
+
+        versions = [version for _, version in sorted(date_version.items())]
+        pending = {
+            date: version
+            for date, version in sorted(date_version.items())
+            if not (directory / version).exists()
+        }
+
+        def fetch(record: tuple[str, str]) -> None:
+            with app.app_context():  # worker threads need their own context
+                self._fetch_version(session, url, *record)
+
+        with (
+            _create_session(["GET"]) as session,
+            ThreadPoolExecutor(max_workers=workers) as executor,
+        ):
+            list(executor.map(fetch, pending.items()))
+
+        n_item = self._merge_batches(
+            [directory / version / "items" for version in versions],
+            self.output()[0].path,
+        )
+        dates = [
+            date
+            for date, version in sorted(date_version.items())
+            if self._partition_prices(directory / version, date)  # only missing partitions are written
+        ]
+
+        if not n_item or not dates:
+            pl.DataFrame({"empty": []}).write_parquet(self.output()[0].path)
+
+            dates, n_item = [], 0
+
+        n_price = RAW_PRICES.scan(dates).select(pl.len()).collect().item() \
+            if dates else 0
+
+        LOGGER.info(
+            f"\t- Cached version(s): {len(versions)-len(pending)} hit(s), "
+            f"{len(pending)} miss(es)\n"
+            f"\t- Downloaded {len(pending)} version(s) with {workers} "
+            f"worker(s) in {time.perf_counter()-start:.2f}s"
+        )
+
+        return dates, n_item, n_price
 
 
 class OpwCleanser(luigi.Task):
@@ -167,93 +550,137 @@ class OpwCleanser(luigi.Task):
     def output(self):
         return [
             luigi.LocalTarget(PTH / "data" / "cleansed_items.parquet"),
-            luigi.LocalTarget(PTH / "data" / "cleansed_prices.parquet"),
+            luigi.LocalTarget(PTH / "data" / "cleansed_prices.json"),
         ]
 
     def run(self) -> None:
         df_item = pl.read_parquet(self.input()[0].path)
-        df_price = pl.read_parquet(self.input()[1].path)
+        REPORT.add(rows_in=len(df_item))
 
         df_item = self._cleanse_item_data(df_item)
-        df_price = self._cleanse_price_data(df_price)
-
         df_item.write_parquet(self.output()[0].path)
-        df_price.write_parquet(self.output()[1].path)
+
+        with self.input()[1].open("r") as f:
+            dates = json.load(f)["dates"]
+
+        n_partition = 0
+        if not current_app.config["FUSED"]:  # prices are cleansed within OpwAnalyser
+            for date in dates:
+                if not CLEANSED_PRICES.exists(date):
+                    CLEANSED_PRICES.sink(
+                        self._cleanse_price_plan(RAW_PRICES.scan([date])),
+                        date,
+                    )
+                    n_partition += 1
+
+        with self.output()[1].open("w") as f:
+            json.dump({"dates": dates}, f)
+
+        REPORT.add(
+            rows_in=RAW_PRICES.count(dates),
+            rows_out=len(df_item)+CLEANSED_PRICES.count(dates),
+            bytes_out=CLEANSED_PRICES.size(dates),
+        )
 
         LOGGER.info(
-            f"\t- Total of new items: {len(df_item):,}\n"
-            f"\t- Total of new prices: {len(df_price):,}"
+            f"\t- Total of new or changed items: {len(df_item):,}\n"
+            f"\t- Total of new price partitions: {n_partition:,}"
         )
 
     def _cleanse_item_data(self, df_item: pl.DataFrame) -> pl.DataFrame:
-        if not df_item.is_empty():
-            response = current_app.supabase_client.rpc("get_skus").execute()
-            sku_list = [data["_sku"] for data in response.data]
-
-            cols = {
-                "code": "sku",
-                "cat1Name.en": "department_en",
-                "cat1Name.zh-Hant": "department_zh",
-                "cat2Name.en": "category_en",
-                "cat2Name.zh-Hant": "category_zh",
-                "cat3Name.en": "subcategory_en",
-                "cat3Name.zh-Hant": "subcategory_zh",
-                "brand.en": "brand_en",
-                "brand.zh-Hant": "brand_zh",
-                "name.en": "name_en",
-                "name.zh-Hant": "name_zh",
-            }
-
-            df_item = (
-                df_item
-                .unique(subset="code")  # keep unique SKUs
-                .filter(~pl.col("code").is_in(sku_list))  # filter out existing SKUs
-                .select(cols)
-                .rename(cols)
-            )
-
-        return df_item
+        cols = {
+            "code": "sku",
+            "cat1Name.en": "department_en",
+            "cat1Name.zh-Hant": "department_zh",
+            "cat2Name.en": "category_en",
+            "cat2Name.zh-Hant": "category_zh",
+            "cat3Name.en": "subcategory_en",
+            "cat3Name.zh-Hant": "subcategory_zh",
+            "brand.en": "brand_en",
+            "brand.zh-Hant": "brand_zh",
+            "name.en": "name_en",
+            "name.zh-Hant": "name_zh",
+        }
 
-    def _cleanse_price_data(self, df_price: pl.DataFrame) -> pl.DataFrame:
-        if not df_price.is_empty():
-            cols = {
-                "code": "sku",
-                "date": "effective_date",
-                "supermarketCode": "supermarket",
-                "en": "promotion_en",
-                "zh-Hant": "promotion_zh",
-                "price": "original_price",
-            }
+        if df_item.is_empty():
+            return pl.DataFrame(
+                schema=dict.fromkeys([*cols.values(), "digest"], pl.String)
+            )
 
-            df_price = (
-                df_price
-                .with_columns(
-                    pl.col(["en", "zh-Hant"]).fill_null("No Promotion"),  # default no promotion
-                    pl.col("price").str.extract(r"([\d\.]+)")
-                        .cast(pl.Float32)
-                        .fill_null(0),  # ensure a valid price for each record
-                )
-                .select(cols)
-                .rename(cols)
+        df_item = (
+            df_item
+            .unique(subset="code", keep="last", maintain_order=True)  # keep the latest content
+            .select(list(cols))
+            .rename(cols)
+            .with_columns(ITEM_CATALOG.digest(list(cols.values())[1:]))
+        )
+
+        df_delta = ITEM_CATALOG.delta(df_item)  # only new or changed items
+        n_changed = df_delta["sku"].is_in(ITEM_CATALOG.load()["sku"].implode()).sum()
+
+        LOGGER.info(
+            f"\t- Item catalog: {len(df_item)-len(df_delta):,} unchanged, "
+            f"{n_changed:,} changed, {len(df_delta)-n_changed:,} new"
+        )
+
+        return df_delta
+
+    def _cleanse_price_plan(self, lf_price: pl.LazyFrame) -> pl.LazyFrame:
+        cols = {
+            "code": "sku",
+            "date": "effective_date",
+            "supermarketCode": "supermarket",
+            "en": "promotion_en",
+            "zh-Hant": "promotion_zh",
+            "price": "original_price",
+        }
+
+        return (
+            lf_price
+            .with_columns(
+                pl.col(["en", "zh-Hant"]).fill_null("No Promotion"),  # default no promotion
+                pl.col("price").str.extract(r"([\d\.]+)")
+                    .cast(pl.Float32)
+                    .fill_null(0),  # ensure a valid price for each record
             )
+            .select(list(cols))
+            .rename(cols)
+        )
+
+    def _cleanse_price_data(self, df_price: pl.DataFrame) -> pl.DataFrame:
+        if not df_price.is_empty():
+            df_price = self._cleanse_price_plan(df_price.lazy()).collect()
 
         return df_price
 
 
 class OpwAnalyser(luigi.Task):
-    """Categorise promotions and calculate unit prices."""
+    """Categorise promotions with a persisted dictionary and calculate unit prices."""
+    PARSER_VERSION = 1  # bump when `_parse_promotions` or `_categorise_pattern` change
+
     def requires(self):
         return OpwCleanser()
 
     def output(self):
-        return luigi.LocalTarget(PTH / "data" / "analysed_prices.parquet")
+        return luigi.LocalTarget(PTH / "data" / "analysed_prices.json")
 
     def run(self) -> None:
-        df_price = pl.read_parquet(self.input()[1].path)
+        with self.input()[1].open("r") as f:
+            dates = json.load(f)["dates"]
 
-        df_price, cnt = self._calculate_promotion_prices(df_price)
+        cnt = 0
+        for date in dates:
+            if not ANALYSED_PRICES.exists(date):
+                cnt += self._calculate_partition_prices(date)
 
-        df_price.write_parquet(self.output().path)
+        with self.output().open("w") as f:
+            json.dump({"dates": dates}, f)
+
+        REPORT.add(
+            rows_in=(RAW_PRICES if current_app.config["FUSED"] else CLEANSED_PRICES).count(dates),
+            rows_out=ANALYSED_PRICES.count(dates),
+            bytes_out=ANALYSED_PRICES.size(dates),
+        )
 
         LOGGER.info(f"\t- Total of discount prices: {cnt:,}")
 
@@ -342,11 +769,321 @@ class OpwAnalyser(luigi.Task):
         return discount if price * current_app.config["THRESHOLD"] < discount \
             else price
 
+    def _categorise_pattern(self) -> pl.Expr:
+        return (
+            pl.when(  # NA
+                pl.col("pattern").str.contains(r"<AMT>.*<AMT>")
+                    & (pl.col("amt") == 2)
+                    & (pl.col("cnt") == 0)
+                    & (pl.col("pct") == 0)
+            ).then(1)
+            .when(  # <$> for <n>
+                pl.col("pattern").str.contains(r"<AMT>.*<CNT>")
+                    & (pl.col("amt") == 1)
+                    & (pl.col("cnt") == 1)
+                    & (pl.col("pct") == 0)
+            ).then(2)
+            .when(  # NA
+                pl.col("pattern").str.contains(r"<AMT>.*<PCT>")
+                    & (pl.col("amt") == 1)
+                    & (pl.col("cnt") == 0)
+                    & (pl.col("pct") == 1)
+            ).then(3)
+            .when(  # buy <n> at/save <$>
+                pl.col("pattern").str.contains(r"<CNT>.*<AMT>")
+                    & (pl.col("amt") == 1)
+                    & (pl.col("cnt") == 1)
+                    & (pl.col("pct") == 0)
+            ).then(4)
+            .when(  # buy <n> get <n> free
+                pl.col("pattern").str.contains(r"<CNT>.*<CNT>")
+                    & (pl.col("amt") == 0)
+                    & (pl.col("cnt") == 2)
+                    & (pl.col("pct") == 0)
+            ).then(5)
+            .when(  # buy <n> at <%>
+                pl.col("pattern").str.contains(r"<CNT>.*<PCT>")
+                    & (pl.col("amt") == 0)
+                    & (pl.col("cnt") == 1)
+                    & (pl.col("pct") == 1)
+            ).then(6)
+            .when(  # NA
+                pl.col("pattern").str.contains(r"<PCT>.*<AMT>")
+                    & (pl.col("amt") == 1)
+                    & (pl.col("cnt") == 0)
+                    & (pl.col("pct") == 1)
+            ).then(7)
+            .when(  # <%> for <n>
+                pl.col("pattern").str.contains(r"<PCT>.*<CNT>")
+                    & (pl.col("amt") == 0)
+                    & (pl.col("cnt") == 1)
+                    & (pl.col("pct") == 1)
+            ).then(8)
+            .when(  # NA
+                pl.col("pattern").str.contains(r"<PCT>.*<PCT>")
+                    & (pl.col("amt") == 0)
+                    & (pl.col("cnt") == 0)
+                    & (pl.col("pct") == 2)
+            ).then(9)
+            .otherwise(0)
+        )
+
+    def _calculate_discount_price_expr(self) -> pl.Expr:
+        price = pl.col("original_price").cast(pl.Float64)
+        pattern = pl.col("pattern")
+        n = pl.col("value").list.len()
+        v0 = pl.col("value").list.get(0, null_on_oob=True)
+        v1 = pl.col("value").list.get(1, null_on_oob=True)
+
+        # promotions that do not apply to any of the rules fall back to the
+        # last value assigned before the rule failed, as in the reference
+        discount = (
+            pl.when(pl.col("category") == 2).then(
+                pl.when(pattern == "+<AMT> for <CNT>nd item").then(
+                    pl.when((n >= 2) & (v1 != 0)).then((price + v0) / v1)
+                    .when(n >= 1).then(price + v0)
+                    .otherwise(price)
+                )
+                .when(pattern == "<AMT> for <CNT>").then(
+                    pl.when((n >= 2) & (v1 != 0)).then(v0 / v1)
+                    .otherwise(price)
+                )
+                .otherwise(price)
+            )
+            .when(pl.col("category") == 4).then(
+                pl.when(pattern.str.contains(r"<CNT>\s.*save")).then(
+                    pl.when((n >= 2) & (v0 != 0)).then((price * v0 - v1) / v0)
+                    .when(n >= 2).then(price * v0 - v1)
+                    .otherwise(price)
+                )
+                .when(pattern.str.contains(r"<CNT>\s")).then(
+                    pl.when((n >= 2) & (v0 != 0)).then(v1 / v0)
+                    .otherwise(price)
+                )
+                .otherwise(price)
+            )
+            .when(pl.col("category") == 5).then(
+                pl.when(pattern.str.contains("free the most expensive one")).then(
+                    pl.when((n >= 1) & (v0 != 0)).then(price * (v0 - 1) / v0)
+                    .when(n >= 1).then(price * (v0 - 1))
+                    .otherwise(price)
+                )
+                .when(pattern.str.contains("get <CNT> free")).then(
+                    pl.when((n >= 2) & (v0 + v1 != 0)).then(price * v0 / (v0 + v1))
+                    .when(n >= 1).then(price * v0)
+                    .otherwise(price)
+                )
+                .otherwise(price)
+            )
+            .when(pl.col("category") == 6).then(
+                pl.when(pattern.str.contains(r"<CNT>\w")).then(
+                    pl.when((n >= 2) & (v0 != 0)).then(
+                        (price * (v0 - 1) + price * (1 - v1 / 100)) / v0
+                    )
+                    .when(n >= 2).then(price * (v0 - 1) + price * (1 - v1 / 100))
+                    .otherwise(price)
+                )
+                .otherwise(
+                    pl.when((n >= 2) & (v0 != 0)).then(price * v0 * (1 - v1 / 100) / v0)
+                    .when(n >= 2).then(price * v0 * (1 - v1 / 100))
+                    .otherwise(price)
+                )
+            )
+            .when(pl.col("category") == 8).then(
+                pl.when(pattern.str.contains(r"<CNT>\w")).then(
+                    pl.when((n >= 2) & (v1 != 0)).then(
+                        (price * (1 - v0 / 100) + price * (v1 - 1)) / v1
+                    )
+                    .when(n >= 2).then(price * (1 - v0 / 100) + price * (v1 - 1))
+                    .otherwise(price)
+                )
+                .otherwise(
+                    pl.when(n >= 1).then(price * (1 - v0 / 100))
+                    .otherwise(price)
+                )
+            )
+            .otherwise(price)
+        )
+
+        return (
+            pl.when(price * current_app.config["THRESHOLD"] < discount)
+            .then(discount)
+            .otherwise(price)
+        )
+
+    def _parse_promotions(self, df_text: pl.DataFrame) -> pl.DataFrame:
+        return (
+            df_text
+            .with_columns(
+                pl.col("promotion_en")
+                    .str.to_lowercase()
+                    .str.strip_chars()
+                    .str.replace_all(r"\s?wk\d+\s?", "")
+                    .str.replace_all(r"; |/|[a-z]\.[a-z]", "<sep>")
+                    .str.replace_all("half price", "50%", literal=True)
+                    .str.replace_all("second", "2nd", literal=True)
+                    .str.split("<sep>")
+                    .list.eval(pl.element().str.strip_chars())
+                    .alias("promotion"),  # split description with multiple promotions
+            )
+            .explode("promotion")  # expand row per promotion
+            .with_columns(
+                pl.col("promotion")
+                    .str.to_lowercase()
+                    .str.strip_chars()
+                    .str.replace_all(r"\$\d+(\.\d+)?", "<AMT>")
+                    .str.replace_all(r"\d+(\.\d+)?%", "<PCT>")
+                    .str.replace_all(r"\d+", "<CNT>")
+                    .alias("pattern"),  # get <AMT>, <CNT> and <PCT> as pattern
+            )
+            .with_columns(
+                pl.col("pattern").str.count_matches("<AMT>").alias("amt"),
+                pl.col("pattern").str.count_matches("<CNT>").alias("cnt"),
+                pl.col("pattern").str.count_matches("<PCT>").alias("pct"),
+            )
+            .with_columns(
+                self._categorise_pattern()
+                    .alias("category"),  # categorise promotion into 9 groups
+            )
+            .with_columns(
+                pl.when(pl.col("category") != 0)
+                    .then(
+                        pl.col("promotion")
+                            .str.extract_all(r"\d+\.?\d{0,2}")
+                            .list.eval(
+                                pl.element()
+                                    .str.strip_chars_end(".")
+                                    .cast(pl.Float64)
+                            )
+                    )
+                    .otherwise(pl.lit([], dtype=pl.List(pl.Float64)))
+                    .alias("value"),  # get numeric values according to pattern
+            )
+            .select("promotion_en", "promotion", "pattern", "category", "value")
+        )
+
+    def _lookup_promotions(self, df_text: pl.DataFrame) -> pl.DataFrame:
+        file_pth = PTH / "data" / "promotions.parquet"
+        parser = self.PARSER_VERSION
+
+        today = datetime.now(current_app.hkt)
+        date_expiry = (today - timedelta(days=current_app.config["DELTA"])).strftime("%Y%m%d")
+        today = today.strftime("%Y%m%d")
+
+        df_dict = self._parse_promotions(df_text.clear()) \
+            .with_columns(parser=pl.lit(parser, dtype=pl.Int64), seen=pl.lit(today))
+        n_stale = 0
+
+        if file_pth.exists():
+            df_file = pl.read_parquet(file_pth)
+
+            if df_file.schema.get("parser") == pl.Int64 and "seen" in df_file.columns:
+                df_dict = df_file.filter(  # parsed by other rules or out of the window
+                    (pl.col("parser") == parser) & (pl.col("seen") >= date_expiry)
+                )
+            n_stale = df_file["promotion_en"].n_unique() - df_dict["promotion_en"].n_unique()
+
+        df_miss = df_text.join(df_dict, on="promotion_en", how="anti")
+
+        is_seen = pl.col("promotion_en").is_in(df_text["promotion_en"].implode())
+        n_touch = df_dict.filter(is_seen & (pl.col("seen") != today)).height
+
+        if not df_miss.is_empty() or n_touch or n_stale:  # only parse unseen promotion texts
+            df_dict = pl.concat([
+                df_dict.with_columns(
+                    pl.when(is_seen).then(pl.lit(today)).otherwise("seen").alias("seen"),
+                ),
+                self._parse_promotions(df_miss)
+                    .with_columns(parser=pl.lit(parser, dtype=pl.Int64), seen=pl.lit(today)),
+            ])
+
+            file_pth.parent.mkdir(exist_ok=True)
+            df_dict.write_parquet(f"{file_pth}.tmp")
+            os.replace(f"{file_pth}.tmp", file_pth)
+
+        LOGGER.info(
+            f"\t- Promotion dictionary: {len(df_text)-len(df_miss):,} hit(s), "
+            f"{len(df_miss):,} miss(es), {n_stale:,} dropped"
+        )
+
+        return df_dict.drop("parser", "seen")
+
+    def _calculate_promotion_plan(
+        self,
+        lf_price: pl.LazyFrame,
+        df_dict: pl.DataFrame,
+    ) -> pl.LazyFrame:
+        return (
+            lf_price
+            .join(  # expand row per parsed promotion
+                df_dict.lazy(),
+                on="promotion_en",
+                how="inner",
+            )
+            .with_columns(
+                self._calculate_discount_price_expr()
+                    .alias("unit_price"),  # calculate price based on defined rules
+            )
+            .sort(["sku", "effective_date", "supermarket", "unit_price"])
+            .unique(
+                subset=["sku", "effective_date", "supermarket"],
+                keep="first",
+            )
+            .drop(["promotion", "pattern", "category", "value"])
+        )
+
     def _calculate_promotion_prices(
         self,
         df_price: pl.DataFrame,
         cnt: int=0,
     ) -> pl.DataFrame:
+        if not df_price.is_empty():
+            df_dict = self._lookup_promotions(
+                df_price.select("promotion_en").unique()
+            )
+
+            df_price = self._calculate_promotion_plan(
+                df_price.lazy(),
+                df_dict,
+            ).collect()
+
+            cnt += (
+                df_price
+                .filter(pl.col("original_price")!=pl.col("unit_price"))
+                .shape[0]
+            )
+
+        return df_price, cnt
+
+    def _calculate_partition_prices(self, date: str) -> int:
+        if current_app.config["FUSED"]:  # cleanse and analyse in a single plan
+            lf_price = OpwCleanser()._cleanse_price_plan(RAW_PRICES.scan([date]))
+        else:
+            lf_price = CLEANSED_PRICES.scan([date])
+
+        df_dict = self._lookup_promotions(
+            lf_price.select("promotion_en").unique().collect()
+        )
+
+        ANALYSED_PRICES.sink(
+            self._calculate_promotion_plan(lf_price, df_dict),
+            date,
+        )
+
+        return (
+            ANALYSED_PRICES.scan([date])
+            .filter(pl.col("original_price")!=pl.col("unit_price"))
+            .select(pl.len())
+            .collect()
+            .item()
+        )
+
+    def _calculate_promotion_prices_reference(
+        self,
+        df_price: pl.DataFrame,
+        cnt: int=0,
+    ) -> pl.DataFrame:
+        """Row-wise reference of the promotion engine for equivalence tests."""
         if not df_price.is_empty():
             df_price = (
                 df_price
@@ -370,62 +1107,8 @@ class OpwAnalyser(luigi.Task):
                     pl.col("pattern").str.count_matches("<PCT>").alias("pct"),
                 )
                 .with_columns(
-                    pl.when(  # NA
-                        pl.col("pattern").str.contains(r"<AMT>.*<AMT>")
-                            & (pl.col("amt") == 2)
-                            & (pl.col("cnt") == 0)
-                            & (pl.col("pct") == 0)
-                    ).then(1)
-                    .when(  # <$> for <n>
-                        pl.col("pattern").str.contains(r"<AMT>.*<CNT>")
-                            & (pl.col("amt") == 1)
-                            & (pl.col("cnt") == 1)
-                            & (pl.col("pct") == 0)
-                    ).then(2)
-                    .when(  # NA
-                        pl.col("pattern").str.contains(r"<AMT>.*<PCT>")
-                            & (pl.col("amt") == 1)
-                            & (pl.col("cnt") == 0)
-                            & (pl.col("pct") == 1)
-                    ).then(3)
-                    .when(  # buy <n> at/save <$>
-                        pl.col("pattern").str.contains(r"<CNT>.*<AMT>")
-                            & (pl.col("amt") == 1)
-                            & (pl.col("cnt") == 1)
-                            & (pl.col("pct") == 0)
-                    ).then(4)
-                    .when(  # buy <n> get <n> free
-                        pl.col("pattern").str.contains(r"<CNT>.*<CNT>")
-                            & (pl.col("amt") == 0)
-                            & (pl.col("cnt") == 2)
-                            & (pl.col("pct") == 0)
-                    ).then(5)
-                    .when(  # buy <n> at <%>
-                        pl.col("pattern").str.contains(r"<CNT>.*<PCT>")
-                            & (pl.col("amt") == 0)
-                            & (pl.col("cnt") == 1)
-                            & (pl.col("pct") == 1)
-                    ).then(6)
-                    .when(  # NA
-                        pl.col("pattern").str.contains(r"<PCT>.*<AMT>")
-                            & (pl.col("amt") == 1)
-                            & (pl.col("cnt") == 0)
-                            & (pl.col("pct") == 1)
-                    ).then(7)
-                    .when(  # <%> for <n>
-                        pl.col("pattern").str.contains(r"<PCT>.*<CNT>")
-                            & (pl.col("amt") == 0)
-                            & (pl.col("cnt") == 1)
-                            & (pl.col("pct") == 1)
-                    ).then(8)
-                    .when(  # NA
-                        pl.col("pattern").str.contains(r"<PCT>.*<PCT>")
-                            & (pl.col("amt") == 0)
-                            & (pl.col("cnt") == 0)
-                            & (pl.col("pct") == 2)
-                    ).then(9)
-                    .otherwise(0)
-                    .alias("category"),  # categorise promotion into 9 groups
+                    self._categorise_pattern()
+                        .alias("category"),  # categorise promotion into 9 groups
                 )
                 .with_columns(
                     pl.struct("promotion", "pattern", "category")
@@ -460,6 +1143,110 @@ class OpwAnalyser(luigi.Task):
         return df_price, cnt
 
 
+class OpwAppraiser(luigi.Task):
+    """Appraise the latest prices against the price history for deals."""
+    def requires(self):
+        return [
+            OpwVersions(),
+            OpwAnalyser(),
+        ]
+
+    def output(self):
+        return luigi.LocalTarget(PTH / "data" / "deals.parquet")
+
+    def run(self) -> None:
+        with self.input()[0].open("r") as f:
+            dates = json.load(f).get("window", [])
+
+        missing = backfill_prices(dates) if current_app.config["DEALS"] == "local" else []
+
+        if current_app.config["DEALS"] != "local" or not dates or missing:
+            df_deal = pl.DataFrame()  # deals are calculated in the database instead
+
+            LOGGER.info(
+                f"\t- Delegated deals to the database with "
+                f"{len(missing):,} missing price partition(s)"
+            )
+        else:
+            df_deal = self._calculate_deals(
+                ANALYSED_PRICES.scan(dates),
+                self._get_preferences(),
+            ).collect()
+
+            REPORT.add(rows_in=ANALYSED_PRICES.count(dates), rows_out=len(df_deal))
+
+            LOGGER.info(
+                f"\t- Total of deals: {df_deal['is_deal'].eq('y').sum():,} "
+                f"out of {len(df_deal):,} SKU(s)"
+            )
+
+        df_deal.write_parquet(self.output().path)
+
+    def _get_preferences(self) -> pl.DataFrame:
+        response = current_app.supabase_client.table("supermarkets") \
+            .select("supermarket, preference") \
+            .execute()
+        REPORT.add(rpc_calls=1)
+
+        return pl.DataFrame(
+            response.data,
+            schema={"supermarket": pl.String, "preference": pl.Float64},
+        )
+
+    def _calculate_deals(
+        self,
+        lf_price: pl.LazyFrame,
+        df_preference: pl.DataFrame,
+    ) -> pl.LazyFrame:
+        unit_price = pl.col("unit_price").cast(pl.Float64)
+
+        lf_summary = (
+            lf_price
+            .group_by("sku")
+            .agg(
+                pl.col("effective_date").n_unique().alias("frequency"),
+                unit_price.mean().alias("average_price"),
+                unit_price.std().alias("std_price"),
+                unit_price.min().alias("q0_price"),
+                unit_price.quantile(0.25, "linear").alias("q1_price"),
+                unit_price.median().alias("q2_price"),
+                unit_price.quantile(0.75, "linear").alias("q3_price"),
+                unit_price.max().alias("q4_price"),
+            )
+        )
+
+        lf_latest = (
+            lf_price
+            .filter(pl.col("effective_date") == pl.col("effective_date").max())
+            .join(df_preference.lazy(), on="supermarket", how="left")
+            .sort("sku", "unit_price", "preference", nulls_last=True)
+            .unique(subset="sku", keep="first", maintain_order=True)  # preferred supermarket
+            .select(
+                "sku", "supermarket", "promotion_en", "promotion_zh",
+                "original_price", "unit_price",
+            )
+        )
+
+        bid = pl.col("average_price") - (pl.col("std_price") + 0.0001)
+
+        return (
+            lf_latest
+            .join(lf_summary, on="sku", how="inner")
+            .with_columns(
+                pl.when(bid < pl.col("q0_price"))
+                    .then(pl.col("q0_price"))
+                    .otherwise(bid)
+                    .alias("bid_price")
+            )
+            .with_columns(
+                pl.when(pl.col("unit_price") <= pl.col("bid_price"))
+                    .then(pl.lit("y"))
+                    .otherwise(pl.lit("n"))
+                    .alias("is_deal")
+            )
+        )
+
+
 class DatabaseRecords(luigi.Task):
     """Insert data into the database and execute necessary updates."""
     def requires(self):
@@ -467,6 +1254,7 @@ class DatabaseRecords(luigi.Task):
             OpwVersions(),
             OpwCleanser(),
             OpwAnalyser(),
+            OpwAppraiser(),
         ]
 
     def output(self):
@@ -476,13 +1264,21 @@ class DatabaseRecords(luigi.Task):
         with self.input()[0].open("r") as f:
             data = json.load(f)
 
+        with self.input()[2].open("r") as f:
+            dates = json.load(f)["dates"]
+
         df_item = pl.read_parquet(self.input()[1][0].path)
-        df_price = pl.read_parquet(self.input()[2].path)
 
         if data["version"]:
             self._update_items(df_item)
-            self._update_prices(df_price, data["expiry"])
-            self._update_deals()
+            self._update_prices(dates, data["expiry"])
+            self._update_deals(
+                pl.read_parquet(self.input()[3].path),
+                dates,
+                data["expiry"],
+            )
+
+            PLOT_CACHE.invalidate(max(data["version"]))  # plots show the new prices
         else:
             self._log_omission()
 
@@ -495,30 +1291,417 @@ class DatabaseRecords(luigi.Task):
         self,
         table: str,
         df: pl.DataFrame,
-        batch: int=10_000,
+        on_conflict: str | None=None,
     ) -> None:
-        data = json.loads(df.write_json())
+        if df.is_empty():
+            return
 
-        for i in range(0, len(data), batch):
-            current_app.supabase_client.table(table) \
-                .insert(data[i:i+batch]) \
-                .execute()
+        start = time.perf_counter()
+
+        if current_app.config["LOADER"] == "copy":
+            n_byte = self._copy_record(table, df, on_conflict)
+        else:
+            n_byte = self._post_record(table, df, on_conflict)
+
+        duration = time.perf_counter() - start
+
+        REPORT.add(rows_out=len(df), bytes_out=n_byte)
+
+        LOGGER.info(
+            f"\t- Loaded {len(df):,} {table} record(s) ({n_byte/1e6:.1f} MB) via "
+            f"{current_app.config['LOADER']} in {duration:.2f}s: "
+            f"{len(df)/duration:,.0f} rows/s, {n_byte/1e6/duration:.2f} MB/s"
+        )
+
+    def _copy_record(
+        self,
+        table: str,
+        df: pl.DataFrame,
+        on_conflict: str | None=None,
+    ) -> int:
+        """Stream record batches as CSV into the table with Postgres COPY."""
+        target = sql.Identifier(current_app.config["SUPABASE_SCHEMA"], table)
+        cols = sql.SQL(", ").join(map(sql.Identifier, df.columns))
+
+        n_byte = 0
+        with psycopg.connect(current_app.config["DATABASE_URL"]) as conn:
+            if on_conflict:  # stage the records, then merge them into the table
+                staging = sql.Identifier(f"_{table}")
+                conn.execute(
+                    sql.SQL(
+                        "CREATE TEMP TABLE {} (LIKE {} INCLUDING DEFAULTS) ON COMMIT DROP"
+                    ).format(staging, target)
+                )
+                target, merge = staging, sql.SQL(
+                    "INSERT INTO {} ({}) SELECT {} FROM {} "
+                    "ON CONFLICT ({}) DO UPDATE SET {}"
+                ).format(
+                    sql.Identifier(current_app.config["SUPABASE_SCHEMA"], table),
+                    cols, cols, staging, sql.Identifier(on_conflict),
+                    sql.SQL(", ").join(
+                        sql.SQL("{} = EXCLUDED.{}").format(col, col)
+                        for col in map(sql.Identifier, df.columns)
+                    ),
+                )
+
+            query = sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(target, cols)
+            REPORT.add(rpc_calls=1)
+
+            with conn.cursor().copy(query) as copy:
+                for df_batch in df.iter_slices(current_app.config["BATCH"]):
+                    data = df_batch.write_csv(include_header=False).encode()
+                    copy.write(data)
+                    n_byte += len(data)
+
+            if on_conflict:
+                conn.execute(merge)
+
+        return n_byte
+
+    def _post_record(
+        self,
+        table: str,
+        df: pl.DataFrame,
+        on_conflict: str | None=None,
+    ) -> int:
+        """POST payload-sized JSON batches to PostgREST from a bounded pool."""
+        url = f"{current_app.config['SUPABASE_URL']}/rest/v1/{table}"
+        key = current_app.config["SUPABASE_KEY"]
+        headers = {
+            "apikey": key,
+            "Authorization": f"Bearer {key}",
+            "Content-Type": "application/json",
+            "Content-Profile": current_app.config["SUPABASE_SCHEMA"],
+            "Prefer": "return=minimal",
+        }
+        if on_conflict:
+            url += f"?on_conflict={on_conflict}"
+            headers["Prefer"] += ",resolution=merge-duplicates"
+        workers = current_app.config["WORKERS"]
+
+        def post(data: bytes) -> None:
+            response = session.post(url, data=data, headers=headers, timeout=60)
+            response.raise_for_status()
+
+        n_byte, futures = 0, set()
+        with (
+            _create_session(["POST"]) as session,  # batches are retried individually
+            ThreadPoolExecutor(max_workers=workers) as executor,
+        ):
+            for data in self._iter_payloads(df):
+                if len(futures) == 2 * workers:  # bound the payloads held in memory
+                    done, futures = wait(futures, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        future.result()
+
+                futures.add(executor.submit(post, data))
+                n_byte += len(data)
+
+            for future in futures:
+                future.result()
+
+        return n_byte
+
+    def _iter_payloads(self, df: pl.DataFrame) -> Iterator[bytes]:
+        """Split records into JSON arrays of about `PAYLOAD` bytes each."""
+        size = df.select(
+            pl.struct(pl.all()).struct.json_encode().str.len_bytes() + 1
+        ).to_series()
+        offset = size.cum_sum() - size  # start of each row in the serialized table
+
+        for df_batch in (
+            df
+            .with_columns((offset // current_app.config["PAYLOAD"]).alias("_batch"))
+            .partition_by("_batch", maintain_order=True, include_key=False)
+        ):
+            yield df_batch.write_json().encode()
 
     def _update_items(self, df_item) -> None:
-        self._insert_record("items", df_item)
+        self._insert_record("items", df_item.drop("digest"), on_conflict="sku")
+
+        ITEM_CATALOG.update(df_item)  # only after the database accepted the rows
 
-    def _update_prices(self, df_price, date_expiry) -> None:
+    def _update_prices(self, dates, date_expiry) -> None:
         current_app.supabase_client.table("prices") \
-            .delete().in_("effective_date", date_expiry) \
-            .execute()
+            .delete().in_("effective_date", date_expiry + dates) \
+            .execute()  # rows of a failed attempt are replaced rather than duplicated
+        REPORT.add(rpc_calls=1)
+
+        for dataset in [RAW_PRICES, CLEANSED_PRICES, ANALYSED_PRICES]:
+            dataset.expire(date_expiry)
+
+        for date in dates:  # one partition in memory at a time
+            self._insert_record("prices", ANALYSED_PRICES.scan([date]).collect())
+
+    def _update_deals(self, df_deal, date_added, date_expiry) -> None:
+        if df_deal.is_empty():  # deals are calculated in the database
+            current_app.supabase_client.rpc(
+                "update_moments",
+                {"added": date_added, "expired": date_expiry},
+            ).execute()  # roll the per-SKU statistics by the changed dates only
+            current_app.supabase_client.rpc("update_deals").execute()
+            REPORT.add(rpc_calls=2)
+        else:
+            current_app.supabase_client.table("daily_moments") \
+                .delete().neq("sku", "") \
+                .execute()  # stale once skipped, so rebuilt from the prices on a fallback
+            REPORT.add(rpc_calls=1)
+
+            timestamp = datetime.now(current_app.hkt).isoformat()
 
-        self._insert_record("prices", df_price)
+            self._insert_record(
+                "deals",
+                df_deal.with_columns(pl.lit(timestamp).alias("created_at")),
+                on_conflict="sku",
+            )
 
-    def _update_deals(self) -> None:
-        current_app.supabase_client.rpc("update_deals").execute()
+            current_app.supabase_client.table("deals") \
+                .delete().lt("created_at", timestamp) \
+                .execute()  # SKUs no longer listed on the latest date
+            REPORT.add(rpc_calls=1)
 
     def _log_omission(self) -> None:
         current_app.supabase_client.rpc("log_omission").execute()
+        REPORT.add(rpc_calls=1)
+
+
+def fetch_rows(name: str, page: int=1000) -> list[dict]:
+    rows = []
+    while True:  # PostgREST caps the rows of each response
+        response = current_app.supabase_client.rpc(name) \
+            .range(len(rows), len(rows)+page-1) \
+            .execute()
+        REPORT.add(rpc_calls=1)
+
+        rows += response.data
+        if len(response.data) < page:
+            break
+
+    return rows
+
+
+def backfill_prices(dates: list[str], page: int=1000) -> list[str]:
+    schema = {
+        "sku": pl.String,
+        "effective_date": pl.String,
+        "supermarket": pl.String,
+        "promotion_en": pl.String,
+        "promotion_zh": pl.String,
+        "original_price": pl.Float32,
+        "unit_price": pl.Float32,
+    }
+
+    n_partition = 0
+    for date in dates:
+        if ANALYSED_PRICES.exists(date):
+            continue
+
+        rows = []
+        while True:  # PostgREST caps the rows of each response
+            response = current_app.supabase_client.table("prices") \
+                .select(", ".join(schema)) \
+                .eq("effective_date", date) \
+                .order("sku").order("supermarket") \
+                .range(len(rows), len(rows)+page-1) \
+                .execute()
+            REPORT.add(rpc_calls=1)
+
+            rows += response.data
+            if len(response.data) < page:
+                break
+
+        if rows:  # loaded before partitions were kept, e.g. by an earlier deployment
+            ANALYSED_PRICES.sink(pl.LazyFrame(rows, schema=schema), date)
+            n_partition += 1
+
+    if n_partition:
+        LOGGER.info(f"\t- Backfilled {n_partition:,} price partition(s) from the database")
+
+    return [date for date in dates if not ANALYSED_PRICES.exists(date)]
+
+
+class DealPublisher(luigi.Task):
+    """Publish the deals of the day for the bot to draw /lucky from."""
+    def requires(self):
+        return [
+            OpwVersions(),
+            DatabaseRecords(),
+        ]
+
+    def output(self):
+        return luigi.LocalTarget(PTH / "logs" / "task_deal.txt")
+
+    def run(self):
+        with self.input()[0].open("r") as f:
+            data = json.load(f)
+
+        msg = "Kept the published deals."
+        if data["version"]:
+            deals = fetch_rows("get_deals")
+            stats = DEAL_SNAPSHOT.publish(max(data["version"]), deals)
+
+            REPORT.add(rows_in=len(deals), rows_out=len(deals))
+            msg = (
+                f"Published {stats['deals']:,} deals from {stats['supermarkets']} "
+                f"supermarkets ({stats['mean_discount']:.1%} off on average)."
+            )
+
+        with self.output().open("w") as f:
+            f.write(msg)
+
+        LOGGER.info(f"\t- {msg}")
+
+
+class SearchIndexer(luigi.Task):
+    """Index the brands and names of every item for the bot to /search."""
+    def requires(self):
+        return [
+            OpwVersions(),
+            DatabaseRecords(),
+        ]
+
+    def output(self):
+        return luigi.LocalTarget(PTH / "logs" / "task_search.txt")
+
+    def run(self):
+        with self.input()[0].open("r") as f:
+            data = json.load(f)
+
+        msg = "Kept the search index."
+        if data["version"]:
+            start = time.perf_counter()
+            stats = SEARCH_INDEX.publish(ITEM_CATALOG.load())
+            duration = time.perf_counter() - start
+
+            REPORT.add(rows_in=stats["items"], rows_out=stats["terms"])
+            msg = (
+                f"Indexed {stats['items']:,} items by {stats['terms']:,} terms "
+                f"({stats['postings']:,} postings) in {duration:.2f}s."
+            )
+
+        with self.output().open("w") as f:
+            f.write(msg)
+
+        LOGGER.info(f"\t- {msg}")
+
+
+class PlotRenderer(luigi.Task):
+    """Pre-render price plots of watched items for the bot to serve."""
+    def requires(self):
+        return [
+            OpwVersions(),
+            DatabaseRecords(),
+        ]
+
+    def output(self):
+        return luigi.LocalTarget(PTH / "logs" / "task_plot.txt")
+
+    def run(self):
+        with self.input()[0].open("r") as f:
+            data = json.load(f)
+
+        dates = data.get("window", [])
+
+        msg = "No plot is due."
+        if data["version"] and dates and PLOT_CACHE.generation:
+            missing = backfill_prices(dates)
+
+            if missing:
+                msg = f"Left plots to render on request with {len(missing):,} missing price partition(s)."
+                LOGGER.warning(f"\t- {msg}")
+            else:
+                msg = f"Completed rendering {self._render_plots(dates)} plots."
+
+        with self.output().open("w") as f:
+            f.write(msg)
+
+    def _get_watched_items(self, page: int=1000) -> pl.DataFrame:
+        return pl.DataFrame(
+            fetch_rows("get_watched_items", page),
+            schema={
+                "_sku": pl.String,
+                "_frequency": pl.Int32,
+                "_bid": pl.Float64,
+                "_brand_en": pl.String,
+                "_brand_zh": pl.String,
+                "_name_en": pl.String,
+                "_name_zh": pl.String,
+            },
+        )
+
+    def _get_plots(self, dates: list[str]) -> list[tuple[str, str, dict]]:
+        df_item = self._get_watched_items()
+
+        df_price = (
+            ANALYSED_PRICES.scan(dates)
+            .filter(pl.col("sku").is_in(df_item["_sku"].implode()))
+            .group_by("sku", "effective_date")
+            .agg(pl.col("unit_price").cast(pl.Float64).min())  # same series as get_prices
+            .sort("sku", "effective_date")
+            .group_by("sku", maintain_order=True)
+            .agg("effective_date", "unit_price")
+            .collect()
+        )
+
+        as_of = datetime.now(current_app.hkt).strftime("%Y-%m-%d %H:%M:%S")
+
+        plots = []
+        for item in df_item.join(df_price, left_on="_sku", right_on="sku").iter_rows(named=True):
+            for language in ["en", "zh"]:
+                plots.append((item["_sku"], language, {
+                    "dates": item["effective_date"],
+                    "prices": item["unit_price"],
+                    "bid": item["_bid"],
+                    "n_day": item["_frequency"],
+                    "brand": item[f"_brand_{language}"],
+                    "name": item[f"_name_{language}"],
+                    "as_of": as_of,
+                }))
+
+        REPORT.add(rows_in=len(df_item))
+
+        return plots
+
+    def _render_plots(self, dates: list[str]) -> int:
+        plots = self._get_plots(dates)
+        workers = current_app.config["RENDERERS"]
+        start = time.perf_counter()
+
+        if not plots:
+            return 0
+
+        n_plot, n_byte = 0, 0
+        with TemporaryDirectory() as tmp:
+            fname = None
+            if FONT.exists():  # workers load a few glyphs instead of the whole collection
+                text = "".join(plot["brand"] + plot["name"] for _, _, plot in plots)
+                fname = str(subset_font(FONT, Path(tmp) / "font.otf", text))
+
+            with ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=init_renderer,
+                initargs=(fname,),
+            ) as executor:
+                for sku, language, img in executor.map(
+                    render_job,
+                    *zip(*plots),
+                    chunksize=16,
+                ):
+                    PLOT_CACHE.put(sku, language, img)
+                    n_plot += 1
+                    n_byte += len(img)
+
+        duration = time.perf_counter() - start
+
+        REPORT.add(rows_out=n_plot, bytes_out=n_byte)
+
+        LOGGER.info(
+            f"\t- Rendered {n_plot:,} plot(s) ({n_byte/1e6:.1f} MB) with "
+            f"{workers} process(es) in {duration:.2f}s: {n_plot/duration:,.1f} plots/s"
+        )
+
+        return n_plot
 
 
 class DailyPriceAlert(luigi.Task):
@@ -526,7 +1709,9 @@ class DailyPriceAlert(luigi.Task):
     def requires(self):
         return [
             OpwVersions(),
-            DatabaseRecords(),
+            DealPublisher(),
+            PlotRenderer(),
+            SearchIndexer(),
         ]
 
     def output(self):
@@ -536,7 +1721,7 @@ class DailyPriceAlert(luigi.Task):
         with self.input()[0].open("r") as f:
             data = json.load(f)
 
-        n_users = 0
+        msg = "No price alert is due."
         if data["version"]:
             _now = datetime.now(current_app.hkt)
             _target = _now.replace(
@@ -546,22 +1731,66 @@ class DailyPriceAlert(luigi.Task):
             )
 
             if _now.isocalendar().weekday not in [5, 6]:  # skip the first 2 days of promotion week
-                time.sleep(max(0, (_target-_now).total_seconds()))  # only send alerts at a specific time
-                n_users += self._blast_alerts()
+                SCHEDULER.enterabs(_target.timestamp(), 1, self._dispatch_alerts)  # only send alerts at a specific time
+                msg = f"Scheduled price alert at {_target:%H:%M}."
 
         with self.output().open("w") as f:
-            f.write("Completed blasting price alert to users.")
+            f.write(msg)
+
+        LOGGER.info(f"\t- {msg}")
+
+    def _dispatch_alerts(self) -> None:
+        REPORT.start("AlertDispatch")
+
+        try:
+            n_users = self._blast_alerts()
+        except Exception:
+            REPORT.finish("AlertDispatch", "failure", [])
+            raise
+
+        REPORT.finish("AlertDispatch", "success", [])
 
         LOGGER.info(f"\t- Blasted price alert to {n_users} users.")
 
     def _blast_alerts(self) -> int:
         response = current_app.supabase_client.rpc("get_users").execute()
+        app = current_app._get_current_object()
+
+        def render(usr_id: str) -> str | None:
+            with app.app_context():  # rendered by the sender threads
+                return slash_alert(usr_id)
+
+        tdy = datetime.now(current_app.hkt).strftime("%Y%m%d")
+        directory = PTH / "data" / "alerts"
+        for pth in directory.glob("*.jsonl"):
+            if pth.stem != tdy:  # delivery state only resumes today's alert
+                pth.unlink()
+
+        dispatcher = AlertDispatcher(
+            current_app.config["API_MSG"],
+            directory / f"{tdy}.jsonl",
+            rate=current_app.config["RATE"],
+            chat_rate=current_app.config["CHAT_RATE"],
+            workers=current_app.config["SENDERS"],
+            retries=current_app.config["RETRIES"],
+            backoff=current_app.config["BACKOFF"],
+        )
+        stats = dispatcher.dispatch([data["_id"] for data in response.data], render)
 
-        for data in response.data:
-            msg = slash_alert(data["_id"])
-            send_response(data["_id"], msg, None)
+        REPORT.add(
+            rpc_calls=1 + len(response.data) - stats["resumed"],
+            http_calls=stats["requests"],
+            rows_out=stats["sent"],
+            failures=stats["rejected"] + stats["failed"],
+        )
+        LOGGER.info(
+            f"\t- Sent {stats['sent']} alerts at {stats['rate']:.1f} msg/s "
+            f"({stats['resumed']} resumed, {stats['skipped']} empty, "
+            f"{stats['rejected']} rejected, {stats['failed']} failed, "
+            f"{stats['throttled']} throttled)."
+        )
 
-        return len(response.data)
+        return stats["sent"]
 
 
 class EntryPoint(luigi.Task):
@@ -608,18 +1837,31 @@ class EntryPoint(luigi.Task):
                 os.remove(file_pth)
 
 
-@bp.route("/api/v1/update", methods=["GET"])
-def execute_pipeline() -> tuple[dict[str, str], int]:
-    if request.args.get("secret") == current_app.config["SECRET_PIPELINE"]:
+def run_job(job_id: str) -> None:
+    """Run the pipeline and its scheduled alerts in a memory-limited process."""
+    if Config.MEMORY:
+        limit = Config.MEMORY << 20
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+    from .. import create_app  # the job builds its own application
+
+    app = create_app()
+
+    with app.app_context():
+        REPORT.begin(app.hkt, PTH / "logs" / "reports", job_id)
+
+        status = None
         try:
             luigi.build([EntryPoint()], local_scheduler=True, workers=1)
-        except Exception:
-            logging.error("Pipeline failed", exc_info=True)
 
-            return {"status": "failed"}, 500
-    else:
-        logging.warning("Invalid pipeline access secret.")
+            if not SCHEDULER.empty():
+                REPORT.data["status"] = "scheduled"
+                REPORT.save()
 
-        return {"status": "invalid secret"}, 403
+                SCHEDULER.run()
+        except Exception:
+            logging.error("Pipeline failed", exc_info=True)
 
-    return {"status": "completed"}, 200
+            status = "failure"
+        finally:
+            REPORT.end(app.config["DELTA"], status)
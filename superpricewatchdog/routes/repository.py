@@ -3,7 +3,6 @@ import hmac
 import logging
 import os
 
-import git
 from flask import Blueprint, current_app, request
 
 
@@ -24,6 +23,8 @@ def pull_from_github() -> tuple[str, int]:
     signature = request.headers.get("X-Hub-Signature")
 
     if signature and validate_signature(signature, request.data):
+        import git  # probes the git executable when imported
+
         try:
             repo = git.Repo(os.path.dirname(__file__).split(os.sep)[-3])
             origin = repo.remotes.origin
@@ -1,20 +1,53 @@
 import logging
 import re
 from datetime import datetime, timedelta
-from io import BytesIO
+from functools import partial
 
-import matplotlib
-import matplotlib.dates as mdates
-import matplotlib.pyplot as plt
 import requests
-from flask import Blueprint, current_app, request
+from flask import Blueprint, Flask, current_app, request
 
+from ..config import PTH, Config
+from ..models.catalog import ItemLookup
+from ..models.deals import DealSnapshot
 from ..models.messages import BotMessages
+from ..models.plots import PlotCache, render_plot
+from ..models.profiles import ProfileCache
+from ..models.search import SearchIndex
+from ..models.updates import UpdateQueue
 
 
 bp = Blueprint("response", __name__)
 
-matplotlib.use("agg")
+DEAL_SNAPSHOT = DealSnapshot(PTH / "data" / "deal_snapshot.json")
+
+ITEM_LOOKUP = ItemLookup(PTH / "data" / "catalog.arrow")
+
+PLOT_CACHE = PlotCache(PTH / "data" / "plots", Config.PLOTS)
+
+PROFILE_CACHE = ProfileCache(
+    PTH / "data" / "profiles.sqlite3",
+    Config.PROFILE_TTL,
+    Config.PROFILES,
+)
+
+SEARCH_INDEX = SearchIndex(PTH / "data" / "search.arrow")
+
+UPDATE_QUEUE = UpdateQueue(PTH / "data" / "updates.sqlite3", Config.HANDLERS, Config.LEASE)
+
+
+def get_language(usr_id: int) -> str:
+    profile = PROFILE_CACHE.get(usr_id)
+
+    if profile is None or profile["language"] is None:
+        response = current_app.supabase_client.rpc(
+            "get_language",
+            {"usr_id": usr_id},
+        ).execute()
+
+        profile = {"language": response.data[0].get("_language")}
+        PROFILE_CACHE.put(usr_id, **profile)
+
+    return profile["language"]
 
 
 def slash_start(usr_id: int, user_name: str, usr_lang: str) -> str:
@@ -23,6 +56,8 @@ def slash_start(usr_id: int, user_name: str, usr_lang: str) -> str:
         {"usr_id": usr_id, "usr_lang": usr_lang},
     ).execute()
 
+    PROFILE_CACHE.invalidate(usr_id)
+
     return BotMessages.start(
         user_name,
         response.data[0].get("_language"),
@@ -32,37 +67,71 @@ def slash_start(usr_id: int, user_name: str, usr_lang: str) -> str:
 
 
 def slash_help(usr_id: int) -> str:
-    response = current_app.supabase_client.rpc(
-        "get_language",
-        {"usr_id": usr_id},
-    ).execute()
-
     return BotMessages.help(
-        response.data[0].get("_language"),
+        get_language(usr_id),
         slash_unk("na"),
     )
 
 
 def slash_list(usr_id: int) -> str:
     response = current_app.supabase_client.rpc(
-        "get_watchlist",
+        "get_watchlist_skus",
         {"usr_id": usr_id},
     ).execute()
 
+    skus = [data["_sku"] for data in response.data]
+    names = ITEM_LOOKUP.get(skus, get_language(usr_id)) if skus else {}
+
+    if names is None:  # some items are not in the local catalog
+        watchlist = current_app.supabase_client.rpc(
+            "get_watchlist",
+            {"usr_id": usr_id},
+        ).execute().data
+    else:
+        watchlist = sorted(
+            ({"_sku": sku, **names[sku]} for sku in skus),
+            key=lambda data: (data["_order"], data["_sku"]),
+        )
+
     items = [
         f"/{data['_sku']} | {data['_brand']} - {data['_name']}"
-        for data in response.data
+        for data in watchlist
     ]
 
     return "🛒 🛒 🛒 🛒 🛒\n\n" + "\n".join(items) if items else slash_unk("na")
 
 
+def slash_search(usr_id: int, text: str) -> str:
+    language = get_language(usr_id)
+
+    if not text:
+        return BotMessages.search(language, "usage", slash_unk("na"))
+
+    skus = SEARCH_INDEX.search(text)
+    if skus is None:  # nothing indexed since the deployment
+        return slash_unk("na")
+
+    if not skus:
+        return BotMessages.search(language, "empty", slash_unk("na"))
+
+    names = ITEM_LOOKUP.get(skus, language) or {}
+
+    items = [
+        f"/{sku} | {names[sku]['_brand']} - {names[sku]['_name']}" if sku in names else f"/{sku}"
+        for sku in skus
+    ]
+
+    return "🔍 🔍 🔍 🔍 🔍\n\n" + "\n".join(items)
+
+
 def slash_sub(usr_id: int) -> str:
     response = current_app.supabase_client.rpc(
         "change_subscription",
         {"usr_id": usr_id},
     ).execute()
 
+    PROFILE_CACHE.put(usr_id, language=response.data[0].get("_language"))
+
     return BotMessages.sub(
         response.data[0].get("_language"),
         response.data[0].get("_status"),
@@ -74,13 +143,19 @@ def slash_lucky(usr_id: int) -> str:
     year, week, weekday = datetime.now(current_app.hkt).isocalendar()
 
     if weekday not in [5, 6]:
-        response = current_app.supabase_client.rpc(
-            "draw_deals",
-            {"usr_id": usr_id},
-        ).execute()
+        deals = DEAL_SNAPSHOT.draw(
+            get_language(usr_id),
+            weighted=current_app.config["LUCKY"] == "weighted",
+        )
+
+        if deals is None:  # nothing published since the deployment
+            deals = current_app.supabase_client.rpc(
+                "draw_deals",
+                {"usr_id": usr_id},
+            ).execute().data
 
         items = []
-        for data in response.data:
+        for data in deals:
             price = f"${data['_price']:.1f}\n" if abs(data["_fix"] - data["_price"]) <= 0.1 else f"<s>${data['_fix']:.1f}</s> → ${data['_price']:.1f} ({data['_promotion']})\n"
             items.append(
                 f"<a href='https://online-price-watch.consumer.org.hk/opw/product/{data['_sku']}'>{data['_sku']}</a> {data['_brand']} - {data['_name']}\n"
@@ -91,13 +166,8 @@ def slash_lucky(usr_id: int) -> str:
         msg = f"🍀 {year} WK{week} Day {(weekday + 1) % 7} 🍀\n\n" \
             + "\n\n".join(items) if items else slash_unk("na")
     else:
-        response = current_app.supabase_client.rpc(
-            "get_language",
-            {"usr_id": usr_id},
-        ).execute()
-
         msg = BotMessages.lucky(
-            response.data[0].get("_language"),
+            get_language(usr_id),
             slash_unk("na"),
         )
 
@@ -110,6 +180,8 @@ def slash_lang(usr_id: int) -> str:
         {"usr_id": usr_id},
     ).execute()
 
+    PROFILE_CACHE.put(usr_id, language=response.data[0].get("_language"))
+
     return BotMessages.lang(
         response.data[0].get("_language"),
         slash_unk("na"),
@@ -118,12 +190,23 @@ def slash_lang(usr_id: int) -> str:
 
 def slash_alert(usr_id: int) -> str | None:
     response = current_app.supabase_client.rpc(
-        "get_alert",
+        "get_alert_prices",
         {"usr_id": usr_id},
     ).execute()
 
+    skus = [data["_sku"] for data in response.data]
+    names = ITEM_LOOKUP.get(skus, response.data[0]["_language"]) if skus else {}
+
+    if names is None:  # some items are not in the local catalog
+        alerts = current_app.supabase_client.rpc(
+            "get_alert",
+            {"usr_id": usr_id},
+        ).execute().data
+    else:
+        alerts = [{**data, **names[data["_sku"]]} for data in response.data]
+
     items = []
-    for data in response.data:
+    for data in alerts:
         price = f"${data['_price']:.1f}\n" if abs(data["_fix"]-data["_price"]) <= 0.1 else f"<s>${data['_fix']:.1f}</s> → ${data['_price']:.1f} ({data['_promotion']})\n"
         items.append(
             f"/{data['_sku']} | {data['_brand']} - {data['_name']}\n"
@@ -176,53 +259,49 @@ def slash_error(status: str) -> str:
 
 
 def slash_plot(usr_id: int, code: str) -> bytes:
+    language = get_language(usr_id)
+
+    img = PLOT_CACHE.get(code, language)  # prices only change with the pipeline
+    if img is not None:
+        return img
+
     response = current_app.supabase_client.rpc(
         "get_prices",
         {"code": code},
     ).execute()
 
-    x = mdates.datestr2num([data["_date"] for data in response.data])
-    y = [data["_price"] for data in response.data]
+    dates = [data["_date"] for data in response.data]
+    prices = [data["_price"] for data in response.data]
 
-    response = current_app.supabase_client.rpc(
-        "get_item",
-        {"usr_id": usr_id, "code": code},
-    ).execute()
+    names = ITEM_LOOKUP.get([code], language)
 
-    ref = response.data[0]["_bid"]
-    n_day = response.data[0]["_frequency"]
-    brand = response.data[0]["_brand"]
-    prod = response.data[0]["_name"]
-
-    plt.figure(figsize=(11, 4))
-    plt.plot(x, y, label="Price")
-    plt.axhline(y=ref, color="r", linestyle="--", label="Target")
+    if names is None:  # the item is not in the local catalog
+        item = current_app.supabase_client.rpc(
+            "get_item",
+            {"usr_id": usr_id, "code": code},
+        ).execute().data[0]
+    else:
+        response = current_app.supabase_client.rpc(
+            "get_bid",
+            {"code": code},
+        ).execute()
 
-    plt.title(
-        f"{n_day:.0f} Days Price Trend for {brand}; {prod}",
-        loc="left",
-        fontproperties=current_app.font,
-    )
-    plt.title(
-        f"As of {datetime.now(current_app.hkt).strftime('%Y-%m-%d %H:%M:%S')}",
-        loc="right",
-        fontsize=8,
-        style="italic",
+        item = {**response.data[0], **names[code]}
+
+    img = render_plot(
+        dates,
+        prices,
+        item["_bid"],
+        item["_frequency"],
+        item["_brand"],
+        item["_name"],
+        datetime.now(current_app.hkt).strftime("%Y-%m-%d %H:%M:%S"),
+        current_app.font,
     )
-    plt.xlabel("Date")
-    plt.ylabel("Price (HKD)")
-    plt.legend()
-
-    ax = plt.gca()
-    ax.xaxis.set_major_locator(mdates.DayLocator(interval=7))
-    ax.xaxis.set_major_formatter(mdates.DateFormatter("%d %b"))
 
-    img = BytesIO()
-    plt.savefig(img, format="png")
-    plt.close()
-    img.seek(0)
+    PLOT_CACHE.put(code, language, img)
 
-    return img.getvalue()
+    return img
 
 
 def slash_bye(usr_id: int) -> str:
@@ -231,6 +310,8 @@ def slash_bye(usr_id: int) -> str:
         {"usr_id": usr_id},
     ).execute()
 
+    PROFILE_CACHE.invalidate(usr_id)
+
     return BotMessages.bye(
         response.data[0].get("_language"),
         slash_unk("na"),
@@ -248,8 +329,8 @@ def get_command(usr_msg: str) -> tuple[str, str]:
         code = usr_input[0]
         slash = "/edit"
     else:
-        code = ""
-        slash = usr_msg.split()[0]
+        slash, *words = usr_msg.split()
+        code = " ".join(words)  # arguments of the command
 
     if re.search(r"/P?\d+", slash):
         code = slash[1:]
@@ -286,12 +367,22 @@ def send_response(usr_id: str, msg: str, img: bytes | None) -> None:
         logging.error(f"Failed to reply {usr_id}'s message:", exc_info=True)
 
 
-@bp.route("/api/v1/reply", methods=["POST"])
-def handle_message() -> str:
+def reply_inline(usr_id: str, msg: str) -> dict[str, str | bool]:
+    return {
+        "method": "sendMessage",
+        "chat_id": usr_id,
+        "text": msg,
+        "parse_mode": "HTML",
+        "disable_web_page_preview": True,
+    }
+
+
+def run_command(message: dict) -> tuple[str | None, bytes | None]:
     """
     /start  greet the user and register them
     /help   provide a help message with instructions for the user
     /list   retrieve and list all items the user is currently tracking
+    /search find items by brand or name
     /sub    update the user's subscription status for daily alerts
     /lucky  get a list of randomly selected best deals for the day
     /lang   change the user's preferred language for responses
@@ -301,59 +392,138 @@ def handle_message() -> str:
     /error  generate an error message based on the provided status
     /bye    unregister the user and provide a farewell message
     """
-    data = request.get_json()
-
-    if "message" in data:
-        usr_id = data["message"]["from"]["id"]
-        usr_msg = data["message"]["text"]
-
-        msg, img = "", None
-        try:
-            code, slash = get_command(usr_msg)
-
-            match slash:
-                # external slashs
-                case "/start":
-                    usr_name = data["message"]["from"]["first_name"]
-                    usr_lang = data["message"]["from"]["language_code"]
-                    msg = slash_start(usr_id, usr_name, usr_lang)
-                case "/help":
-                    msg = slash_help(usr_id)
-                case "/list":
-                    msg = slash_list(usr_id)
-                case "/sub":
-                    msg = slash_sub(usr_id)
-                case "/lucky":
-                    msg = slash_lucky(usr_id)
-                case "/lang":
-                    msg = slash_lang(usr_id)
-                # internal slashs
-                case "/alert":
-                    msg = slash_alert(usr_id)
-                case "/edit":
-                    msg = slash_edit(usr_id, code)
-                case "/error":
-                    msg = slash_error("pipeline")
-                case "/plot":
-                    img = slash_plot(usr_id, code)
-                # hidden slashs
-                case "/bye":
-                    msg = slash_bye(usr_id)
-                # default reply
-                case _:
-                    msg = slash_unk("unk")
-        except:
-            msg = slash_error("user")
-            slash = "/error"
-
-            logging.error(f"Failed to parse {usr_id} command:", exc_info=True)
-        finally:
-            send_response(usr_id, msg, img)
-
-            logging.info(f"Message ({usr_id}): {usr_msg}")
-    else:
+    usr_id = message["from"]["id"]
+    usr_msg = message["text"]
+
+    msg, img = "", None
+    try:
+        code, slash = get_command(usr_msg)
+
+        match slash:
+            # external slashs
+            case "/start":
+                usr_name = message["from"]["first_name"]
+                usr_lang = message["from"]["language_code"]
+                msg = slash_start(usr_id, usr_name, usr_lang)
+            case "/help":
+                msg = slash_help(usr_id)
+            case "/list":
+                msg = slash_list(usr_id)
+            case "/search":
+                msg = slash_search(usr_id, code)
+            case "/sub":
+                msg = slash_sub(usr_id)
+            case "/lucky":
+                msg = slash_lucky(usr_id)
+            case "/lang":
+                msg = slash_lang(usr_id)
+            # internal slashs
+            case "/alert":
+                msg = slash_alert(usr_id)
+            case "/edit":
+                msg = slash_edit(usr_id, code)
+            case "/error":
+                msg = slash_error("pipeline")
+            case "/plot":
+                img = slash_plot(usr_id, code)
+            # hidden slashs
+            case "/bye":
+                msg = slash_bye(usr_id)
+            # default reply
+            case _:
+                msg = slash_unk("unk")
+    except:
+        msg = slash_error("user")
+        slash = "/error"
+
+        logging.error(f"Failed to parse {usr_id} command:", exc_info=True)
+    finally:
+        logging.info(f"Message ({usr_id}): {usr_msg}")
+
+    return msg, img
+
+
+def process_update(app: Flask, update: dict) -> None:
+    with app.app_context():  # run by the handler threads, outside any request
+        message = update["message"]
+        msg, img = run_command(message)
+
+        if msg or img:
+            send_response(message["from"]["id"], msg, img)
+
+
+def expire_update(app: Flask, update: dict) -> None:
+    with app.app_context():  # never run twice, as commands such as /sub toggle
+        send_response(update["message"]["from"]["id"], slash_error("timeout"), None)
+
+
+def start_handlers(app: Flask) -> None:
+    if app.config["HANDLERS"]:
+        UPDATE_QUEUE.start(partial(process_update, app), partial(expire_update, app))
+
+
+@bp.route("/api/v1/reply", methods=["POST"])
+def handle_message() -> tuple[dict[str, str | bool] | str, int]:
+    data = request.get_json(silent=True) or {}
+    message = data.get("message", {})
+
+    if "id" not in message.get("from", {}) or not isinstance(message.get("text"), str):
         logging.warning("No message found in the request.")
 
         return "", 400
 
+    usr_id = message["from"]["id"]
+
+    if current_app.config["HANDLERS"]:  # answered by the handler threads
+        UPDATE_QUEUE.put(data.get("update_id"), usr_id, data)
+
+        return "", 200
+
+    msg, img = run_command(message)
+
+    if img or not current_app.config["INLINE"]:  # photos are uploaded separately
+        send_response(usr_id, msg, img)
+    elif msg:
+        return reply_inline(usr_id, msg), 200  # answered within the webhook response
+
     return "", 200
+
+
+@bp.route("/api/v1/deals", methods=["GET"])
+def report_deal_snapshot() -> tuple[dict, int]:
+    if request.args.get("secret") == current_app.config["SECRET_PIPELINE"]:
+        return DEAL_SNAPSHOT.summary(), 200
+    else:
+        logging.warning("Invalid deal snapshot access secret.")
+
+        return {"status": "invalid secret"}, 403
+
+
+@bp.route("/api/v1/plot", methods=["GET"])
+def report_plot_cache() -> tuple[dict, int]:
+    if request.args.get("secret") == current_app.config["SECRET_PIPELINE"]:
+        return PLOT_CACHE.summary(), 200
+    else:
+        logging.warning("Invalid plot cache access secret.")
+
+        return {"status": "invalid secret"}, 403
+
+
+@bp.route("/api/v1/profile", methods=["GET"])
+def report_profile_cache() -> tuple[dict, int]:
+    if request.args.get("secret") == current_app.config["SECRET_PIPELINE"]:
+        return PROFILE_CACHE.summary(), 200
+    else:
+        logging.warning("Invalid profile cache access secret.")
+
+        return {"status": "invalid secret"}, 403
+
+
+@bp.route("/api/v1/queue", methods=["GET"])
+def report_update_queue() -> tuple[dict, int]:
+    if request.args.get("secret") == current_app.config["SECRET_PIPELINE"]:
+        return UPDATE_QUEUE.summary(), 200
+    else:
+        logging.warning("Invalid update queue access secret.")
+
+        return {"status": "invalid secret"}, 403
@@ -0,0 +1,884 @@
+import gzip
+import json
+import os
+import random
+import shutil
+import subprocess
+import threading
+import time
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import parse_qs, urlparse
+
+import luigi
+import matplotlib
+import polars as pl
+import psycopg
+import pytest
+import pytz
+import requests
+from flask import Flask
+
+from superpricewatchdog.config import PTH, Config
+from superpricewatchdog.models.catalog import ItemLookup
+from superpricewatchdog.models.plots import PlotCache
+from superpricewatchdog.models.telegram import TokenBucket
+from superpricewatchdog.routes import jobs, pipeline, response
+from superpricewatchdog.routes.pipeline import (
+    DailyPriceAlert, DatabaseRecords, OpwAnalyser, OpwAppraiser, OpwCleanser,
+    OpwDownloader, PlotRenderer,
+)
+
+
+RECORDS = {
+    "20250102-0930": [
+        {
+            "code": "p000000001",
+            "brand": {"en": "COCA-COLA", "zh-Hant": "可口可樂"},
+            "name": {"en": "Coke 330ml", "zh-Hant": "可樂 330毫升"},
+            "cat1Name": {"en": "Beverages", "zh-Hant": "飲品"},
+            "cat2Name": {"en": "Soft Drinks", "zh-Hant": "汽水"},
+            "cat3Name": {"en": "Cola", "zh-Hant": "可樂"},
+            "prices": [
+                {"supermarketCode": "WELLCOME", "price": "$5.5"},
+                {"supermarketCode": "PARKNSHOP", "price": "$5.9"},
+            ],
+            "offers": [
+                {
+                    "supermarketCode": "WELLCOME",
+                    "en": "Buy 2 Save $2",
+                    "zh-Hant": "買2件慳$2",
+                },
+            ],
+        },
+    ],
+    "20250103-0930": [
+        {
+            "code": "P000000002",
+            "brand": {"en": "SPRITE", "zh-Hant": "雪碧"},
+            "name": {"en": "Sprite 330ml", "zh-Hant": "雪碧 330毫升"},
+            "cat1Name": {"en": "Beverages", "zh-Hant": "飲品"},
+            "cat2Name": {"en": "Soft Drinks", "zh-Hant": "汽水"},
+            "cat3Name": {"en": "Lemon", "zh-Hant": "檸檬"},
+            "prices": [{"supermarketCode": "AEON", "price": "$4.8"}],
+            "offers": [],
+        },
+    ],
+}
+
+
+class OpwHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    requested = []
+
+    def do_GET(self):
+        version = parse_qs(urlparse(self.path).query)["time"][0]
+        self.requested.append(version)
+        body = gzip.compress(json.dumps(RECORDS[version]).encode())
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def opw_server():
+    OpwHandler.requested = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), OpwHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield f"http://127.0.0.1:{server.server_port}/get-file?time={{}}"
+
+    server.shutdown()
+
+
+class PostgrestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    received = []
+    failures, status = 0, 503
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+
+        if PostgrestHandler.failures:  # reject batches until the failures are used up
+            PostgrestHandler.failures -= 1
+            self.send_response(PostgrestHandler.status)
+        else:
+            self.received.append((self.path, dict(self.headers), body))
+            self.send_response(201)
+
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def postgrest_server():
+    PostgrestHandler.received, PostgrestHandler.failures, PostgrestHandler.status = [], 0, 503
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PostgrestHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield f"http://127.0.0.1:{server.server_port}"
+
+    server.shutdown()
+
+
+class TelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    received = []
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers["Content-Length"]))
+        chat_id = parse_qs(body.decode())["chat_id"][0]
+        n_sent = sum(chat == chat_id for chat, _ in self.received)
+        self.received.append((chat_id, time.monotonic()))
+
+        if chat_id == "3" and not n_sent:  # flood control on the first attempt
+            code, data = 429, {"ok": False, "parameters": {"retry_after": 1}}
+        elif chat_id == "4":  # the user has blocked the bot
+            code, data = 403, {"ok": False}
+        else:
+            code, data = 200, {"ok": True}
+
+        body = json.dumps(data).encode()
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def telegram_server():
+    TelegramHandler.received = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TelegramHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield f"http://127.0.0.1:{server.server_port}/sendMessage"
+
+    server.shutdown()
+
+
+@pytest.fixture
+def database():
+    """Seed the watchdog schema on a disposable Postgres from `TEST_DATABASE_URL`."""
+    url = os.getenv("TEST_DATABASE_URL")
+    if not url:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    with psycopg.connect(url, autocommit=True) as conn:
+        conn.execute("DROP SCHEMA IF EXISTS watchdog CASCADE")
+        conn.execute("CREATE SCHEMA watchdog")
+        conn.execute((PTH / "database" / "setup.sql").read_text())
+        conn.execute("SELECT watchdog.create_tables()")
+        conn.execute((PTH / "database" / "pipeline_functions.sql").read_text())
+
+    yield url
+
+    with psycopg.connect(url, autocommit=True) as conn:
+        conn.execute("DROP SCHEMA watchdog CASCADE")
+
+
+@pytest.fixture
+def app(opw_server, tmp_path, monkeypatch):
+    monkeypatch.setattr(pipeline, "PTH", tmp_path)
+    monkeypatch.setattr(jobs, "PTH", tmp_path)
+
+    app = Flask(__name__)
+    app.config.from_object(Config)
+    app.config["API_FILE"] = opw_server
+    app.config["BATCH"] = 1
+    app.hkt = pytz.timezone(app.config["TIMEZONE"])
+
+    with app.app_context():
+        yield app
+
+
+def test_flatten_records_incomplete_file():
+    data = json.dumps(RECORDS["20250102-0930"] * 3, ensure_ascii=False).encode()
+
+    df_item, _ = OpwDownloader()._flatten_records(data, "20250101")
+
+    assert len(df_item) == 3
+    assert OpwDownloader()._flatten_records(b"", "20250101")[0].is_empty()
+
+    with pytest.raises(ValueError):
+        OpwDownloader()._flatten_records(data[:-10], "20250101")
+
+
+def test_download_records(app, tmp_path):
+    date_version = {
+        "20250102": "20250103-0930",
+        "20250101": "20250102-0930",
+    }
+
+    dates, n_item, n_price = OpwDownloader()._download_records(date_version)
+
+    df_item = pl.read_parquet(tmp_path / "data" / "raw_items.parquet")
+    df_price = pipeline.RAW_PRICES.scan(dates).collect()
+
+    assert dates == ["20250101", "20250102"]
+    assert (n_item, n_price) == (2, 3)
+    assert df_item["code"].to_list() == ["P000000001", "P000000002"]
+    assert df_price.sort("date", "supermarketCode").rows() == [
+        ("P000000001", "20250101", "PARKNSHOP", "$5.9", None, None),
+        ("P000000001", "20250101", "WELLCOME", "$5.5", "Buy 2 Save $2", "買2件慳$2"),
+        ("P000000002", "20250102", "AEON", "$4.8", None, None),
+    ]
+
+
+def test_download_records_from_cache(app, tmp_path):
+    app.config["DELTA"] = 5_000  # keep the fixture versions inside the window
+    date_version = {"20250101": "20250102-0930"}
+
+    OpwDownloader()._download_records(date_version)
+    (tmp_path / "data" / "cache" / "20000101-0930").mkdir()  # expired version
+
+    dates, n_item, n_price = OpwDownloader()._download_records(date_version)
+
+    assert OpwHandler.requested == ["20250102-0930"]
+    assert (dates, n_item, n_price) == (["20250101"], 1, 2)
+    assert sorted(
+        path.name for path in (tmp_path / "data" / "cache").iterdir()
+    ) == ["20250102-0930"]
+
+
+def test_flatten_records_edge_cases():
+    data = [
+        {"code": 123, "prices": [], "offers": [{"supermarketCode": "AEON", "en": "2 for $9"}]},
+        {"code": "p1", "prices": [{"supermarketCode": "AEON", "price": "$1"}]},
+        {"code": "p1", "prices": [{"supermarketCode": "AEON", "price": "$2"}]},
+    ]
+
+    df_item, df_price = OpwDownloader()._flatten_records(json.dumps(data).encode(), "20250101")
+
+    assert df_item["code"].to_list() == ["123", "P1", "P1"]
+    assert df_price.rows() == [
+        ("123", "20250101", "AEON", None, "2 for $9", None),
+        ("P1", "20250101", "AEON", "$1", None, None),
+        ("P1", "20250101", "AEON", "$2", None, None),
+    ]
+
+
+def test_promotion_engine_matches_reference(app, tmp_path, monkeypatch):
+    rng = random.Random(0)
+    templates = [
+        "Buy {n} Save ${a}", "{n}nd item half price", "${a} for {n}",
+        "+${a} for {n}nd item", "Buy {n} get {m} free", "Second item {p}% off",
+        "Buy {n} free the most expensive one", "Buy {n} at {p}% off",
+        "{p}% off for {n}", "{p}% off {n}nd item", "Buy {n} @ ${a}",
+        "WK{n} Buy {n} Save ${a}; {n}nd item half price", "Save ${a}",
+        "{p}% off", "${a} off ${a}", "e.g. ${a}/{n}", "No Promotion", "",
+    ]
+    numbers = [0, 1, 2, 3, 5.5, 10, 12.345, 50]
+
+    df_price = pl.DataFrame({
+        "sku": [f"P{idx:09d}" for idx in range(2_000)],
+        "effective_date": "20250101",
+        "supermarket": "WELLCOME",
+        "promotion_en": [
+            rng.choice(templates).format(
+                n=rng.choice(numbers), m=rng.choice(numbers),
+                a=rng.choice(numbers), p=rng.choice(numbers),
+            )
+            for _ in range(2_000)
+        ],
+        "promotion_zh": "",
+        "original_price": [rng.choice([0, 4.9, 12.5, 30]) for _ in range(2_000)],
+    }, schema_overrides={"original_price": pl.Float32})
+
+    analyser = OpwAnalyser()
+    df_reference, cnt_reference = analyser._calculate_promotion_prices_reference(df_price)
+
+    for _ in range(2):  # parse on the first run, then serve from the dictionary
+        df_native, cnt_native = analyser._calculate_promotion_prices(df_price)
+
+        assert cnt_native == cnt_reference
+        assert df_native.sort("sku").equals(df_reference.sort("sku"))
+
+    file_pth = tmp_path / "data" / "promotions.parquet"
+    texts = df_price["promotion_en"].unique().sort().to_list()
+
+    monkeypatch.setattr(OpwAnalyser, "PARSER_VERSION", 2)  # the rules changed
+    analyser._lookup_promotions(pl.DataFrame({"promotion_en": texts[:3]}))
+    df_dict = pl.read_parquet(file_pth)
+
+    assert sorted(df_dict["promotion_en"].unique()) == texts[:3]  # parsed again, the rest dropped
+    assert df_dict["parser"].unique().to_list() == [2]
+
+    df_dict.with_columns(  # last seen out of the window
+        pl.when(pl.col("promotion_en") == texts[0]).then(pl.lit("20000101")).otherwise("seen").alias("seen"),
+    ).write_parquet(file_pth)
+    analyser._lookup_promotions(pl.DataFrame({"promotion_en": texts[1:2]}))
+
+    assert sorted(pl.read_parquet(file_pth)["promotion_en"].unique()) == texts[1:3]
+
+
+def test_fused_prices_match_eager(app):
+    date_version = {
+        "20250102": "20250103-0930",
+        "20250101": "20250102-0930",
+    }
+    dates, *_ = OpwDownloader()._download_records(date_version)
+
+    for date in dates:
+        pipeline.CLEANSED_PRICES.sink(
+            OpwCleanser()._cleanse_price_plan(pipeline.RAW_PRICES.scan([date])),
+            date,
+        )
+
+    results = []
+    for fused in [False, True]:
+        app.config["FUSED"] = fused
+        shutil.rmtree(pipeline.ANALYSED_PRICES.directory, ignore_errors=True)
+
+        cnt = sum(
+            OpwAnalyser()._calculate_partition_prices(date) for date in dates
+        )
+        df_price = pipeline.ANALYSED_PRICES.scan(dates).collect()
+
+        results.append((df_price.sort(pl.all()), cnt))
+
+    assert results[0][0].equals(results[1][0])
+    assert results[0][1] == results[1][1] == 1
+
+
+def test_expire_price_partitions(app):
+    recent = (datetime.now(app.hkt) - timedelta(days=3)).strftime("%Y%m%d")
+    dataset = pipeline.PriceDataset("raw")
+
+    for date in ["20000101", "20250101", recent]:
+        dataset.sink(pl.LazyFrame({"sku": ["P1"]}), date)
+
+    dataset.expire(["20250101"])
+
+    assert dataset.dates() == [recent]
+
+
+def test_copy_records(app, database):
+    app.config.update(DATABASE_URL=database, SUPABASE_SCHEMA="watchdog", LOADER="copy")
+    df_item = pl.DataFrame({
+        "sku": ["P1", "P2"],
+        "brand_en": ['Brand "A", Ltd', None],
+        "name_zh": ["可樂 330毫升", ""],
+    })
+    df_price = pl.DataFrame({
+        "sku": ["P1", "P1", "P2"],
+        "effective_date": ["20250101", "20250102", "20250101"],
+        "supermarket": ["WELLCOME", "AEON", "AEON"],
+        "promotion_en": ["Buy 2 Save $2", "No Promotion", "No Promotion"],
+        "original_price": [5.5, 5.9, 4.8],
+        "unit_price": [4.5, 5.9, 4.8],
+    }, schema_overrides={"original_price": pl.Float32, "unit_price": pl.Float32})
+
+    DatabaseRecords()._insert_record("items", df_item)
+    DatabaseRecords()._insert_record("prices", df_price)
+
+    with psycopg.connect(database) as conn:
+        items = conn.execute(
+            "SELECT sku, brand_en, name_zh FROM watchdog.items ORDER BY sku"
+        ).fetchall()
+        prices = conn.execute(
+            "SELECT sku, effective_date, supermarket, promotion_en, "
+            "original_price::FLOAT, unit_price::FLOAT "
+            "FROM watchdog.prices ORDER BY sku, effective_date"
+        ).fetchall()
+
+    assert items == df_item.rows()
+    assert prices == [
+        ("P1", "20250101", "WELLCOME", "Buy 2 Save $2", 5.5, 4.5),
+        ("P1", "20250102", "AEON", "No Promotion", 5.9, 5.9),
+        ("P2", "20250101", "AEON", "No Promotion", 4.8, 4.8),
+    ]
+
+
+def test_post_records(app, postgrest_server):
+    app.config.update(
+        SUPABASE_URL=postgrest_server, SUPABASE_KEY="key", SUPABASE_SCHEMA="watchdog",
+        LOADER="postgrest", PAYLOAD=1_000, BACKOFF=0, WORKERS=4,
+    )
+    PostgrestHandler.failures = 2
+    df_item = pl.DataFrame({
+        "sku": [f"P{idx:09d}" for idx in range(200)],
+        "name_zh": ["可口可樂 330毫升" * (idx % 5) for idx in range(200)],
+    })
+
+    DatabaseRecords()._insert_record("items", df_item)
+
+    rows = [
+        row
+        for path, headers, body in PostgrestHandler.received
+        for row in json.loads(body)
+    ]
+
+    assert len(PostgrestHandler.received) > 1
+    assert all(
+        path == "/rest/v1/items"
+        and headers["Content-Profile"] == "watchdog"
+        and len(body) < 2 * 1_000
+        for path, headers, body in PostgrestHandler.received
+    )
+    assert sorted(rows, key=lambda row: row["sku"]) == df_item.to_dicts()
+
+    n_request = len(PostgrestHandler.received)
+    PostgrestHandler.failures, PostgrestHandler.status = 1, 504  # the batch may have been committed
+
+    with pytest.raises(requests.HTTPError):
+        DatabaseRecords()._insert_record("items", df_item.head(1))
+
+    assert len(PostgrestHandler.received) == n_request  # not sent twice
+
+
+def test_update_prices_replaces_loaded_dates(app, postgrest_server):
+    app.config.update(
+        SUPABASE_URL=postgrest_server, SUPABASE_KEY="key", SUPABASE_SCHEMA="watchdog",
+        LOADER="postgrest", WORKERS=1,
+    )
+    deleted = []
+    app.supabase_client = SimpleNamespace(table=lambda name: SimpleNamespace(
+        delete=lambda: SimpleNamespace(in_=lambda col, values: SimpleNamespace(
+            execute=lambda: deleted.append((name, col, values)),
+        )),
+    ))
+    dates = [
+        (datetime.now(app.hkt) - timedelta(days=day)).strftime("%Y%m%d")
+        for day in [3, 2]
+    ]
+    for date in dates:
+        pipeline.ANALYSED_PRICES.sink(pl.LazyFrame({"sku": ["P1"], "effective_date": [date]}), date)
+
+    for _ in range(2):  # a retried task
+        DatabaseRecords()._update_prices(dates, ["20250101"])
+
+    assert deleted == [("prices", "effective_date", ["20250101", *dates])] * 2
+    assert [json.loads(body) for _, _, body in PostgrestHandler.received] \
+        == [[{"sku": "P1", "effective_date": date}] for date in dates] * 2
+
+
+def test_update_moments_matches_full_recompute(database):
+    rng = random.Random(0)
+    skus = [f"P{idx:09d}" for idx in range(30)]
+    dates = [f"202501{day:02d}" for day in range(1, 13)]
+
+    def seed_prices(conn, date):
+        with conn.cursor() as cur:
+            cur.executemany(
+                "INSERT INTO watchdog.prices (sku, effective_date, supermarket, unit_price) "
+                "VALUES (%s, %s, %s, %s)",
+                [
+                    (sku, date, smkt, rng.choice([None, round(rng.uniform(1, 50), 1)]))
+                    for sku in skus[:rng.randint(20, 30)] + skus[-1:]  # the last SKU is always listed
+                    for smkt in rng.sample(["WELLCOME", "AEON", "PARKNSHOP"], rng.randint(1, 3))
+                ],
+            )
+
+    query_moments = """
+        SELECT sku, frequency, ROUND(average_price, 6), ROUND(std_price, 6), q0_price, q4_price
+        FROM watchdog.deals
+        ORDER BY sku
+    """
+    query_recompute = """
+        SELECT sku, COUNT(DISTINCT effective_date), ROUND(AVG(unit_price), 6),
+            ROUND(STDDEV(unit_price), 6), MIN(unit_price), MAX(unit_price)
+        FROM watchdog.prices
+        WHERE sku IN (SELECT sku FROM watchdog.deals)
+        GROUP BY sku
+        ORDER BY sku
+    """
+
+    with psycopg.connect(database, autocommit=True) as conn:
+        conn.cursor().executemany(
+            "INSERT INTO watchdog.items (sku) VALUES (%s)", [(sku,) for sku in skus],
+        )
+        for date in dates[:10]:
+            seed_prices(conn, date)
+
+        conn.execute("SELECT watchdog.update_moments(%s, %s)", ([], []))  # bootstrap
+        conn.execute("SELECT watchdog.update_deals()")
+
+        assert conn.execute(query_moments).fetchall() \
+            == conn.execute(query_recompute).fetchall()
+
+        for expired, added in [(dates[:1], dates[10:11]), (dates[1:2], dates[11:12])]:
+            conn.execute("DELETE FROM watchdog.prices WHERE effective_date = ANY(%s)", (expired,))
+            seed_prices(conn, added[0])
+
+            for _ in range(2):  # reruns are idempotent
+                conn.execute("SELECT watchdog.update_moments(%s, %s)", (added, expired))
+            conn.execute("SELECT watchdog.update_deals()")
+
+            assert conn.execute(query_moments).fetchall() \
+                == conn.execute(query_recompute).fetchall()
+
+
+def test_calculate_deals():
+    df_price = pl.DataFrame({
+        "sku": ["P1"] * 5 + ["P2"],
+        "effective_date": ["20250101", "20250102", "20250103", "20250104", "20250104", "20250104"],
+        "supermarket": ["AEON", "AEON", "AEON", "AEON", "WELLCOME", "AEON"],
+        "promotion_en": "No Promotion",
+        "promotion_zh": "No Promotion",
+        "original_price": [10.0, 8.0, 6.0, 4.0, 4.0, 3.0],
+        "unit_price": [10.0, 8.0, 6.0, 4.0, 4.0, 3.0],
+    }, schema_overrides={"original_price": pl.Float32, "unit_price": pl.Float32})
+    df_preference = pl.DataFrame({"supermarket": ["WELLCOME", "AEON"], "preference": [1.0, 6.0]})
+
+    df_deal = OpwAppraiser()._calculate_deals(df_price.lazy(), df_preference).collect()
+
+    assert df_deal.select(
+        "sku", "supermarket", "frequency", "q0_price", "q1_price", "q2_price",
+        "q3_price", "q4_price", "is_deal",
+    ).sort("sku").rows() == [
+        ("P1", "WELLCOME", 4, 4.0, 4.0, 6.0, 8.0, 10.0, "y"),  # tie broken by preference
+        ("P2", "AEON", 1, 3.0, 3.0, 3.0, 3.0, 3.0, "n"),  # no spread without history
+    ]
+
+
+def test_local_deals_match_database(app, database):
+    app.config.update(DATABASE_URL=database, SUPABASE_SCHEMA="watchdog", LOADER="copy")
+    rng = random.Random(0)
+    skus = [f"P{idx:09d}" for idx in range(20)]
+    df_price = pl.DataFrame(
+        [
+            (sku, f"202501{day:02d}", smkt, "No Promotion", "No Promotion", price, price)
+            for day in range(1, 8)
+            for sku in skus
+            for smkt in rng.sample(["WELLCOME", "AEON", "PARKNSHOP"], rng.randint(1, 2))
+            for price in [round(rng.uniform(1, 20), 1)]
+        ],
+        schema={
+            "sku": pl.String, "effective_date": pl.String, "supermarket": pl.String,
+            "promotion_en": pl.String, "promotion_zh": pl.String,
+            "original_price": pl.Float32, "unit_price": pl.Float32,
+        },
+        orient="row",
+    )
+    for (date,), df in df_price.partition_by("effective_date", as_dict=True).items():
+        pipeline.ANALYSED_PRICES.sink(df.lazy(), date)
+
+    cols = "sku, supermarket, unit_price::FLOAT, frequency, average_price::FLOAT, " \
+        "std_price::FLOAT, q0_price::FLOAT, bid_price::FLOAT, q4_price::FLOAT, is_deal"
+
+    with psycopg.connect(database, autocommit=True) as conn:
+        conn.cursor().executemany(
+            "INSERT INTO watchdog.items (sku) VALUES (%s)", [(sku,) for sku in skus],
+        )
+        DatabaseRecords()._insert_record("prices", df_price)
+
+        conn.execute("SELECT watchdog.update_moments(%s, %s)", ([], []))
+        conn.execute("SELECT watchdog.update_deals()")
+
+        deals_database = conn.execute(f"SELECT {cols} FROM watchdog.deals ORDER BY sku").fetchall()
+        df_preference = pl.DataFrame(
+            conn.execute("SELECT supermarket, preference FROM watchdog.supermarkets").fetchall(),
+            schema={"supermarket": pl.String, "preference": pl.Float64},
+            orient="row",
+        )
+
+        df_deal = OpwAppraiser()._calculate_deals(
+            pipeline.ANALYSED_PRICES.scan(df_price["effective_date"].unique().to_list()),
+            df_preference,
+        ).collect()
+        DatabaseRecords()._insert_record("deals", df_deal, on_conflict="sku")
+
+        deals_local = conn.execute(f"SELECT {cols} FROM watchdog.deals ORDER BY sku").fetchall()
+        n_quantile = conn.execute(
+            "SELECT COUNT(q2_price) FROM watchdog.deals"
+        ).fetchone()[0]
+        published = conn.execute("SELECT _sku FROM watchdog.get_deals()").fetchall()
+
+    def rounded(rows):
+        return [
+            tuple(round(value, 4) if isinstance(value, float) else value for value in row)
+            for row in rows
+        ]
+
+    assert rounded(deals_local) == rounded(deals_database)
+    assert n_quantile == len(skus)
+    assert [sku for sku, *_, is_deal in deals_local if is_deal == "y"] \
+        == [sku for sku, in published]
+
+
+def test_backfill_prices(app):
+    rows = [
+        {
+            "sku": f"P00000000{idx}", "effective_date": "20250101", "supermarket": "AEON",
+            "promotion_en": "No Promotion", "promotion_zh": "No Promotion",
+            "original_price": 5.5, "unit_price": 4.5,
+        }
+        for idx in range(3)
+    ]
+    calls = []
+
+    class Query:
+        def select(self, cols):
+            return self
+
+        def eq(self, col, value):
+            self.date = value
+            return self
+
+        def order(self, col):
+            return self
+
+        def range(self, start, end):
+            self.start, self.end = start, end
+            return self
+
+        def execute(self):
+            calls.append(self.date)
+            data = [row for row in rows if row["effective_date"] == self.date]
+            return SimpleNamespace(data=data[self.start:self.end+1])
+
+    app.supabase_client = SimpleNamespace(table=lambda name: Query())
+    pipeline.ANALYSED_PRICES.sink(pl.LazyFrame({"sku": ["P1"]}), "20250102")  # kept already
+
+    assert pipeline.backfill_prices(["20250101", "20250102", "20250103"], page=2) \
+        == ["20250103"]  # not in the database either
+    assert calls == ["20250101", "20250101", "20250103"]
+
+    df_price = pipeline.ANALYSED_PRICES.scan(["20250101"]).collect()
+
+    assert df_price.schema["unit_price"] == pl.Float32
+    assert df_price.to_dicts() == rows
+
+
+def test_item_catalog_delta(app):
+    records = RECORDS["20250102-0930"] + RECORDS["20250103-0930"]
+    df_raw, _ = OpwDownloader()._flatten_records(json.dumps(records).encode(), "20250101")
+
+    df_item = OpwCleanser()._cleanse_item_data(df_raw)
+    pipeline.ITEM_CATALOG.update(df_item)
+
+    records = [
+        {**records[0], "name": {"en": "Coke Zero 330ml", "zh-Hant": "零系可樂 330毫升"}},
+        records[1],
+        {**records[1], "code": "P000000003"},
+    ]
+    df_raw, _ = OpwDownloader()._flatten_records(json.dumps(records).encode(), "20250102")
+
+    df_delta = OpwCleanser()._cleanse_item_data(df_raw)
+
+    assert df_item["sku"].to_list() == ["P000000001", "P000000002"]
+    assert df_delta.select("sku", "name_en").rows() == [
+        ("P000000001", "Coke Zero 330ml"),  # changed
+        ("P000000003", "Sprite 330ml"),  # new
+    ]
+
+
+def test_run_report(app, tmp_path):
+    app.config["SECRET_PIPELINE"] = "secret"
+    app.register_blueprint(jobs.bp)
+
+    (tmp_path / "data").mkdir()
+    with open(tmp_path / "data" / "opw_version.json", "w") as f:  # OpwVersions is complete
+        json.dump({"version": {"20250101": "20250102-0930"}, "expiry": []}, f)
+
+    pipeline.REPORT.begin(app.hkt, tmp_path / "logs" / "reports")
+    luigi.build([OpwDownloader()], local_scheduler=True, workers=1)
+    pipeline.REPORT.end(app.config["DELTA"])
+
+    with app.test_client() as client:
+        assert client.get("/api/v1/report").status_code == 403
+
+        response = client.get("/api/v1/report?secret=secret&n=5")
+
+    (report,) = response.get_json()["reports"]
+    task = report["tasks"]["OpwDownloader"]
+
+    assert report["status"] == "success"
+    assert task["status"] == "success"
+    assert (task["rows_out"], task["http_calls"]) == (3, 1)
+    assert task["bytes_in"] > 0 and task["bytes_out"] > 0
+    assert task["wall_time"] > 0 and task["cpu_time"] > 0
+    assert task["peak_rss"] > 0
+
+
+def test_pipeline_job(app, monkeypatch):
+    app.config["SECRET_PIPELINE"] = "secret"
+    app.register_blueprint(jobs.bp)
+
+    processes = []
+
+    def start_job(job_id):  # stands in for the pipeline process
+        time.sleep(0.2)  # widens the window between the check and the report
+        processes.append(subprocess.Popen(["sleep", "30"]))
+        return processes[-1]
+
+    monkeypatch.setattr(jobs, "_start_job", start_job)
+
+    responses = []
+
+    def request_job():
+        with app.test_client() as client:
+            response = client.get("/api/v1/update?secret=secret")
+            responses.append((response.status_code, response.get_json()))
+
+    threads = [threading.Thread(target=request_job) for _ in range(2)]  # two gunicorn workers
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    (_, body), = [(code, body) for code, body in responses if code == 202]
+    job_id = body["id"]
+
+    assert sorted(code for code, _ in responses) == [202, 409]
+    assert len(processes) == 1
+
+    with app.test_client() as client:
+        assert client.get("/api/v1/update?secret=secret").get_json() \
+            == {"status": "queued", "id": job_id}  # one job at a time
+        assert client.get(f"/api/v1/update/{job_id}?secret=secret") \
+            .get_json()["status"] == "queued"
+
+        report_pth = jobs.PTH / "logs" / "reports" / f"{job_id}.json"
+        report = json.loads(report_pth.read_text())
+        report_pth.write_text(json.dumps({**report, "status": "scheduled"}))  # waiting for the alert hour
+
+        assert client.get("/api/v1/update?secret=secret").get_json() \
+            == {"status": "scheduled", "id": job_id}
+
+        processes[0].kill()
+        processes[0].wait()
+
+        assert client.get(f"/api/v1/update/{job_id}?secret=secret") \
+            .get_json()["status"] == "failure"
+        assert client.get("/api/v1/update/../x?secret=secret").status_code == 404
+
+        report_pth.write_text(json.dumps({**report, "status": "failure"}))
+        monkeypatch.setattr(jobs, "datetime", SimpleNamespace(  # within the same second
+            now=lambda tz: datetime.strptime(job_id, "%Y%m%d-%H%M%S"),
+        ))
+
+        response = client.get("/api/v1/update?secret=secret")
+
+        assert response.status_code == 202
+        assert response.get_json()["id"] == f"{job_id}-1"
+        assert client.get(f"/api/v1/update/{job_id}-1?secret=secret") \
+            .get_json()["status"] == "queued"
+
+    for process in processes:
+        process.kill()
+        process.wait()
+
+
+def test_blast_alerts(app, tmp_path, telegram_server, monkeypatch):
+    class Client:
+        def rpc(self, name, params=None):
+            if name == "get_users":
+                data = [{"_id": str(idx)} for idx in range(1, 6)]
+            elif params["usr_id"] == "5":  # nothing on the watchlist is a deal
+                data = []
+            else:
+                data = [{
+                    "_sku": "P000000001", "_supermarket": "WELLCOME", "_fix": 5.5,
+                    "_price": 4.5, "_promotion": "Buy 2 Save $2", "_language": "en",
+                }]
+            return SimpleNamespace(execute=lambda: SimpleNamespace(data=data))
+
+    pipeline.ITEM_CATALOG.update(pl.DataFrame(
+        [{"sku": "P000000001", "brand_en": "COCA-COLA", "name_en": "Coke"}],
+        schema=dict.fromkeys(pipeline.ItemCatalog.COLUMNS, pl.String),
+    ))
+    monkeypatch.setattr(response, "ITEM_LOOKUP", ItemLookup(pipeline.ITEM_CATALOG.path))
+
+    grants, acquire = [], TokenBucket.acquire
+
+    def timed_acquire(bucket):  # when the dispatcher lets a message go
+        acquire(bucket)
+        if bucket.rate == 10:
+            grants.append(time.monotonic())
+
+    monkeypatch.setattr(TokenBucket, "acquire", timed_acquire)
+
+    app.supabase_client = Client()
+    app.config.update(API_MSG=telegram_server, RATE=10, BACKOFF=0.1)
+
+    assert "/P000000001 | COCA-COLA - Coke" in response.slash_alert("1")  # names from the catalog
+
+    tdy = datetime.now(app.hkt).strftime("%Y%m%d")
+    (tmp_path / "data" / "alerts").mkdir(parents=True)
+    with open(tmp_path / "data" / "alerts" / f"{tdy}.jsonl", "w") as f:  # resume a crashed blast
+        f.write(json.dumps({"chat_id": "1", "status": "sent", "code": 200}) + "\n")
+        f.write(json.dumps({"chat_id": "2", "status": "failed", "code": 502}) + "\n")
+        f.write('{"chat_id": "3", "sta')
+    (tmp_path / "data" / "alerts" / "20250101.jsonl").touch()
+
+    assert DailyPriceAlert()._blast_alerts() == 2
+
+    chats = [chat for chat, _ in TelegramHandler.received]
+    stamps = sorted(stamp for _, stamp in TelegramHandler.received)
+
+    assert sorted(chats) == ["2", "3", "3", "4"]
+    assert min(b - a for a, b in zip(grants, grants[1:])) >= 0.09  # 10 msg/s
+    assert stamps[-1] - stamps[0] >= 1  # waited out retry_after
+    assert os.listdir(tmp_path / "data" / "alerts") == [f"{tdy}.jsonl"]
+
+    TelegramHandler.received = []
+
+    assert DailyPriceAlert()._blast_alerts() == 0
+    assert TelegramHandler.received == []
+
+
+def test_plot_renderer(app, tmp_path, monkeypatch):
+    dates = ["20250101", "20250102", "20250103"]
+    for day, date in enumerate(dates):
+        pipeline.ANALYSED_PRICES.sink(pl.LazyFrame({
+            "sku": ["P000000001", "P000000001", "P000000002", "P000000003"],
+            "effective_date": date,
+            "supermarket": ["WELLCOME", "AEON", "AEON", "AEON"],
+            "unit_price": pl.Series([5.5 + day, 4.5, 3.0, 9.9], dtype=pl.Float32),
+        }), date)
+
+    items = [
+        {
+            "_sku": f"P00000000{idx}", "_frequency": 3, "_bid": 4.0,
+            "_brand_en": "COCA-COLA", "_brand_zh": "可口可樂",
+            "_name_en": "Coke", "_name_zh": "可樂",
+        }
+        for idx in [1, 2]
+    ]
+    app.supabase_client = SimpleNamespace(rpc=lambda name: SimpleNamespace(
+        range=lambda start, end: SimpleNamespace(
+            execute=lambda: SimpleNamespace(data=items[start:end+1]),
+        ),
+    ))
+    app.config["RENDERERS"] = 2
+
+    monkeypatch.setattr(pipeline, "PLOT_CACHE", PlotCache(tmp_path / "plots"))
+    monkeypatch.setattr(  # stands in for the CJK collection
+        pipeline, "FONT", Path(matplotlib.get_data_path()) / "fonts" / "ttf" / "DejaVuSans.ttf",
+    )
+    pipeline.PLOT_CACHE.invalidate(dates[-1])
+
+    assert len(PlotRenderer()._get_watched_items(page=1)) == 2
+
+    (_, _, plot), *_ = PlotRenderer()._get_plots(dates)
+
+    assert plot["dates"] == dates
+    assert plot["prices"] == [4.5, 4.5, 4.5]  # the cheapest supermarket of each day
+
+    assert PlotRenderer()._render_plots(dates) == 4
+
+    cache = PlotCache(tmp_path / "plots")  # as seen by the bot
+    for sku in ["P000000001", "P000000002"]:
+        for language in ["en", "zh"]:
+            assert cache.get(sku, language).startswith(b"\x89PNG")
+    assert cache.get("P000000003", "en") is None
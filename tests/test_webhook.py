@@ -1,4 +1,98 @@
+import random
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+from collections import Counter
+from collections.abc import Callable
+from datetime import datetime
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
+
+import polars as pl
+import pytest
+import pytz
+from flask import Flask
+from matplotlib.font_manager import FontProperties
+
 from superpricewatchdog import create_app
+from superpricewatchdog.config import Config
+from superpricewatchdog.models.catalog import ItemLookup
+from superpricewatchdog.models.deals import DealSnapshot
+from superpricewatchdog.models.plots import PlotCache
+from superpricewatchdog.models.profiles import ProfileCache
+from superpricewatchdog.models.search import SearchIndex
+from superpricewatchdog.models.updates import UpdateQueue
+from superpricewatchdog.routes import response
+from superpricewatchdog.routes.response import bp as bp_response
+
+
+class TelegramHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    latency, received = 0.2, []
+
+    def do_POST(self):
+        self.received.append(self.rfile.read(int(self.headers["Content-Length"])))
+        time.sleep(self.latency)
+
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def telegram_server():
+    TelegramHandler.received = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TelegramHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield f"http://127.0.0.1:{server.server_port}/sendMessage"
+
+    server.shutdown()
+
+
+@pytest.fixture
+def bot_app():
+    def create(rpc, **config) -> Flask:
+        app = Flask(__name__)
+        app.config.from_object(Config)
+        app.config.update({"HANDLERS": 0, "INLINE": True, "SECRET_PIPELINE": "secret", **config})
+        app.font = FontProperties()
+        app.hkt = pytz.timezone(app.config["TIMEZONE"])
+        app.supabase_client = SimpleNamespace(rpc=rpc)
+        app.register_blueprint(bp_response)
+
+        return app
+
+    return create
+
+
+@pytest.fixture
+def fake_rpc():
+    def create(data: dict[str, list[dict]]) -> tuple[Callable, list[str]]:
+        calls = []
+
+        def rpc(name, params):
+            calls.append(name)
+            return SimpleNamespace(execute=lambda: SimpleNamespace(data=data[name]))
+
+        return rpc, calls
+
+    return create
+
+
+@pytest.fixture(autouse=True)
+def profile_cache(tmp_path, monkeypatch):
+    cache = ProfileCache(tmp_path / "profiles.sqlite3", ttl=60, size=2)
+    monkeypatch.setattr(response, "PROFILE_CACHE", cache)
+
+    return cache
 
 
 def test_index_page():
@@ -8,3 +102,384 @@ def test_index_page():
         response = test_client.get("/")
 
         assert response.status_code == 200
+
+
+def test_startup():
+    code = (
+        "import sys\n"
+        "from superpricewatchdog import create_app\n"
+        "create_app()\n"
+        "print(*sorted(sys.modules))\n"
+    )
+    env = {"FORWARDING_URL": "http://127.0.0.1:9", "TELEGRAM_TOKEN": "x"}  # unreachable
+
+    modules = subprocess.run(
+        [sys.executable, "-c", code],
+        capture_output=True, check=True, text=True, timeout=60, env=env,
+    ).stdout
+
+    assert not {"fontTools", "git", "luigi", "matplotlib", "polars", "psycopg", "supabase"} \
+        & set(modules.split())
+
+
+def test_inline_reply(bot_app, fake_rpc, telegram_server):
+    rpc, _ = fake_rpc({"get_language": [{"_language": "en"}]})
+    app = bot_app(rpc, API_MSG=telegram_server)
+
+    update = {"message": {"from": {"id": 42}, "text": "/help"}}
+
+    with app.test_client() as test_client:
+        for inline in [True, False]:
+            app.config["INLINE"] = inline
+
+            response = test_client.post("/api/v1/reply", json=update)
+
+            assert response.status_code == 200
+
+            if inline:
+                reply = response.get_json()
+
+                assert reply["method"] == "sendMessage"
+                assert reply["chat_id"] == 42
+                assert reply["text"].startswith("🔰")
+                assert TelegramHandler.received == []
+            else:
+                assert response.data == b""
+                assert len(TelegramHandler.received) == 1
+
+
+def test_update_queue(bot_app, telegram_server, tmp_path, monkeypatch):
+    calls, lock = [], threading.Lock()
+
+    def rpc(name, params):
+        if name == "get_language" and params["usr_id"] == 42:
+            time.sleep(0.5)  # a slow command, e.g. rendering a plot
+        with lock:
+            calls.append((params["usr_id"], name))
+        return SimpleNamespace(execute=lambda: SimpleNamespace(data=[{"_language": "en"}]))
+
+    queue = UpdateQueue(tmp_path / "updates.sqlite3", handlers=2, poll=0.05)
+    monkeypatch.setattr(response, "UPDATE_QUEUE", queue)
+
+    app = bot_app(rpc, API_MSG=telegram_server, HANDLERS=2)
+
+    response.start_handlers(app)
+    other = UpdateQueue(tmp_path / "updates.sqlite3", handlers=2, poll=0.05)  # another worker
+    other.start(partial(response.process_update, app))
+
+    updates = [(1, 42, "/help"), (2, 42, "/lang"), (3, 7, "/help"), (4, 42, "/bye"), (1, 42, "/help")]
+
+    with app.test_client() as test_client:
+        assert test_client.post("/api/v1/reply", json={"update_id": 5}).status_code == 400
+
+        for update_id, usr_id, text in updates:
+            update = {"update_id": update_id, "message": {"from": {"id": usr_id}, "text": text}}
+
+            assert test_client.post("/api/v1/reply", json=update).status_code == 200
+
+        deadline = time.monotonic() + 10
+        while queue.summary()["processed"] < 4 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        assert test_client.get("/api/v1/queue").status_code == 403
+
+        stats = test_client.get("/api/v1/queue?secret=secret").get_json()
+
+        queue.stop()
+        other.stop()
+
+        live = UpdateQueue(tmp_path / "updates.sqlite3", lease=0)  # a worker still running a command
+        live.put(8, 9, {"update_id": 8, "message": {"from": {"id": 9}, "text": "/sub"}})
+        live.claim()
+
+        code = (
+            "import sys; from pathlib import Path; "
+            "from superpricewatchdog.models.updates import UpdateQueue; "
+            "dead = UpdateQueue(Path(sys.argv[1])); "
+            "dead.put(6, 42, {'update_id': 6, 'message': {'from': {'id': 42}, 'text': '/sub'}}); "
+            "dead.claim()"
+        )
+        subprocess.run(  # a worker that died mid-command
+            [sys.executable, "-c", code, str(tmp_path / "updates.sqlite3")],
+            check=True, timeout=60,
+        )
+
+        test_client.post("/api/v1/reply", json={"update_id": 7, "message": {"from": {"id": 42}, "text": "/help"}})
+
+        response.start_handlers(app)  # as a restarted worker, without new traffic
+
+        deadline = time.monotonic() + 10
+        while queue.summary()["processed"] < 5 and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+        queue.stop()
+
+    assert [name for usr_id, name in calls if usr_id == 42] \
+        == ["get_language", "change_language", "remove_user", "get_language"]  # /sub never reran
+    assert calls.index((7, "get_language")) < calls.index((42, "get_language"))
+    assert len(TelegramHandler.received) == 6
+    assert b"Timeout" in TelegramHandler.received[4]
+
+    assert (stats["processed"], stats["failed"], stats["duplicates"]) == (4, 0, 1)
+    assert (stats["depth"], stats["running"]) == (0, 0)
+    assert stats["max_wait"] >= 0.5  # /lang waited for /help
+    assert stats["max_busy"] >= 0.5
+    assert (queue.summary()["expired"], queue.summary()["running"]) == (1, 1)  # only /sub of 42
+
+
+def test_plot_cache(bot_app, fake_rpc, telegram_server, tmp_path, monkeypatch):
+    rpc, calls = fake_rpc({
+        "get_language": [{"_language": "en"}],
+        "get_prices": [{"_date": "2025-01-01", "_price": 5.5}],
+        "get_item": [{"_bid": 5.0, "_frequency": 90, "_brand": "SPRITE", "_name": "Sprite"}],
+    })
+
+    renders, render_plot = [], response.render_plot
+
+    def render(*args, **kwargs):
+        renders.append(args)
+        return render_plot(*args, **kwargs)
+
+    monkeypatch.setattr(response, "render_plot", render)
+    monkeypatch.setattr(response, "PLOT_CACHE", PlotCache(tmp_path / "plots", size=2, flush=0))
+
+    app = bot_app(rpc, API_IMG=telegram_server)
+
+    update = {"message": {"from": {"id": 42}, "text": "/P000000002"}}
+
+    with app.test_client() as test_client:
+        test_client.post("/api/v1/reply", json=update)  # nothing to cache before the pipeline runs
+        response.PLOT_CACHE.invalidate("20250101")
+        test_client.post("/api/v1/reply", json=update)
+
+        calls.clear()
+        test_client.post("/api/v1/reply", json=update)
+
+        assert calls == [] and len(renders) == 2
+        assert len(TelegramHandler.received) == 3
+
+        monkeypatch.setattr(response, "PLOT_CACHE", PlotCache(tmp_path / "plots", flush=0))  # another worker
+        test_client.post("/api/v1/reply", json=update)
+
+        assert calls == [] and len(renders) == 2
+
+        response.PLOT_CACHE.invalidate("20250102")
+        test_client.post("/api/v1/reply", json=update)
+
+        assert calls == ["get_prices", "get_item"] and len(renders) == 3
+
+        assert test_client.get("/api/v1/plot").status_code == 403
+
+        stats = test_client.get("/api/v1/plot?secret=secret").get_json()
+
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 3)  # of both
+    assert (stats["entries"], stats["hit_rate"]) == (1, 0.4)
+    assert [pth.name for pth in (tmp_path / "plots").iterdir() if pth.is_dir()] \
+        == [stats["generation"]]
+
+
+def test_profile_cache(bot_app, fake_rpc, profile_cache, tmp_path, monkeypatch):
+    rpc, calls = fake_rpc({
+        "get_language": [{"_language": "en"}],
+        "change_language": [{"_language": "zh"}],
+        "remove_user": [{"_language": "zh"}],
+    })
+
+    app = bot_app(rpc)
+
+    def send(usr_id, text):
+        update = {"message": {"from": {"id": usr_id}, "text": text}}
+        return test_client.post("/api/v1/reply", json=update).get_json()["text"]
+
+    with app.test_client() as test_client:
+        assert send(1, "/help").startswith("🔰 Helping")
+        assert send(1, "/help").startswith("🔰 Helping")
+        assert calls == ["get_language"]  # served from the cache the second time
+
+        send(1, "/lang")
+        calls.clear()
+
+        writer = sqlite3.connect(tmp_path / "profiles.sqlite3", isolation_level=None)
+        writer.execute("BEGIN IMMEDIATE")  # reads do not wait for the store's writers
+
+        start = time.perf_counter()
+        assert send(1, "/help").startswith("🔰 幫緊你")
+        assert calls == [] and time.perf_counter() - start < 4  # well within the busy timeout of 5s
+
+        writer.execute("ROLLBACK")
+
+        worker = ProfileCache(tmp_path / "profiles.sqlite3", flush=0)  # another worker
+        assert worker.get(1) == {"language": "zh"}
+
+        send(1, "/bye")
+        send(1, "/help")
+        send(2, "/help")
+        send(3, "/help")  # evicts the least recently used user
+        calls.clear()
+
+        send(3, "/help")
+        send(1, "/help")
+        assert calls == ["get_language"]
+
+        monkeypatch.setattr(profile_cache, "ttl", 0)
+        send(3, "/lang")
+        calls.clear()
+
+        send(3, "/help")  # expired
+        assert calls == ["get_language"]
+
+        stats = test_client.get("/api/v1/profile?secret=secret").get_json()
+
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (4, 6, 2)
+    assert stats["hit_rate"] == 0.4
+
+
+def test_deal_snapshot(bot_app, fake_rpc, tmp_path, monkeypatch):
+    rpc, calls = fake_rpc({"get_language": [{"_language": "zh"}], "draw_deals": []})
+
+    class Monday(datetime):
+        @classmethod
+        def now(cls, tz=None):
+            return datetime(2025, 1, 6, 12, tzinfo=tz)
+
+    monkeypatch.setattr(response, "datetime", Monday)
+    monkeypatch.setattr(response, "DEAL_SNAPSHOT", DealSnapshot(tmp_path / "deals.json"))
+
+    app = bot_app(rpc)
+
+    deals = [
+        {
+            "_sku": f"P00000000{idx}", "_supermarket": "AEON",
+            "_promotion_en": "Buy 2 Save $2", "_promotion_zh": "買2件慳$2",
+            "_fix": 10.0, "_price": price, "_frequency": 90, "_average": 10.0, "_std": 1.0,
+            "_q0": price, "_q4": 12.0, "_brand_en": "COCA-COLA", "_brand_zh": "可口可樂",
+            "_name_en": "Coke", "_name_zh": "可樂",
+        }
+        for idx, price in enumerate([9.0, 5.0, 9.9, 9.9, 9.9, 9.9], 1)
+    ]
+    update = {"message": {"from": {"id": 1}, "text": "/lucky"}}
+
+    with app.test_client() as test_client:
+        test_client.post("/api/v1/reply", json=update)  # nothing published yet
+        assert calls == ["get_language", "draw_deals"]
+
+        response.DEAL_SNAPSHOT.publish("20250106", deals[:2])
+        calls.clear()
+
+        text = test_client.post("/api/v1/reply", json=update).get_json()["text"]
+        assert calls == [] and text.count("可口可樂 - 可樂") == 2
+
+        worker = DealSnapshot(tmp_path / "deals.json")  # another worker
+        response.DEAL_SNAPSHOT.publish("20250107", deals)
+
+        rng = random.Random(0)
+        draws = Counter(
+            deal["_sku"] for _ in range(2000)
+            for deal in worker.draw("en", n=1, rng=rng)
+        )
+        assert draws["P000000002"] > 0.6 * 2000  # 50% off outweighs 10% and 1% off
+        assert len(worker.draw("en", weighted=False)) == 5
+
+        stats = test_client.get("/api/v1/deals?secret=secret").get_json()
+
+    assert (stats["version"], stats["deals"], stats["supermarkets"]) == ("20250107", 6, 1)
+    assert stats["max_discount"] == 0.5
+
+
+def test_item_lookup(bot_app, fake_rpc, tmp_path, monkeypatch):
+    rpc, calls = fake_rpc({
+        "get_language": [{"_language": "zh"}],
+        "get_watchlist_skus": [{"_sku": "P000000001"}, {"_sku": "P000000002"}],
+        "get_watchlist": [],
+    })
+
+    def export(items):  # as ItemCatalog.update writes it
+        pl.DataFrame(
+            items,
+            schema=["sku", "department_en", "brand_zh", "name_zh"],
+            orient="row",
+        ).with_columns(
+            category_en=pl.lit(None, pl.String),
+            subcategory_en=pl.lit(None, pl.String),
+        ).write_ipc(tmp_path / "catalog.arrow", compression="uncompressed")
+
+    monkeypatch.setattr(response, "ITEM_LOOKUP", ItemLookup(tmp_path / "catalog.arrow"))
+
+    app = bot_app(rpc)
+
+    update = {"message": {"from": {"id": 1}, "text": "/list"}}
+
+    with app.test_client() as test_client:
+        test_client.post("/api/v1/reply", json=update)  # nothing exported yet
+        assert calls == ["get_watchlist_skus", "get_language", "get_watchlist"]
+
+        export([
+            ("P000000001", "Snacks", "卡樂B", "薯片"),
+            ("P000000003", "Beverages", "可口可樂", "可樂"),
+        ])
+        calls.clear()
+
+        test_client.post("/api/v1/reply", json=update)  # P000000002 is missing
+        assert calls == ["get_watchlist_skus", "get_watchlist"]
+
+        export([
+            ("P000000001", "Snacks", "卡樂B", "薯片"),
+            ("P000000002", "Beverages", "屈臣氏", "蒸餾水"),
+            ("P000000003", "Beverages", "可口可樂", "可樂"),
+        ])
+        calls.clear()
+
+        text = test_client.post("/api/v1/reply", json=update).get_json()["text"]
+
+    assert calls == ["get_watchlist_skus"]
+    assert text.splitlines()[2:] == [  # ordered by department as get_watchlist does
+        "/P000000002 | 屈臣氏 - 蒸餾水",
+        "/P000000001 | 卡樂B - 薯片",
+    ]
+
+
+def test_search(bot_app, fake_rpc, tmp_path, monkeypatch):
+    rpc, _ = fake_rpc({"get_language": [{"_language": "en"}]})
+
+    df_item = pl.DataFrame({
+        "sku": ["P000000001", "P000000002", "P000000003"],
+        "department_en": "Beverages",
+        "category_en": "Soft Drinks",
+        "subcategory_en": None,
+        "brand_en": ["COCA-COLA", "COCA-COLA", "SPRITE"],
+        "brand_zh": ["可口可樂", "可口可樂", "雪碧"],
+        "name_en": ["Coke 330ml", "Coke Zero 330ml", "Sprite Lemon 330ml"],
+        "name_zh": ["可樂 330毫升", "零系可樂 330毫升", "雪碧檸檬 330毫升"],
+    }, schema_overrides={"subcategory_en": pl.String})
+    df_item.write_ipc(tmp_path / "catalog.arrow", compression="uncompressed")
+
+    monkeypatch.setattr(response, "ITEM_LOOKUP", ItemLookup(tmp_path / "catalog.arrow"))
+    monkeypatch.setattr(response, "SEARCH_INDEX", SearchIndex(tmp_path / "search.arrow"))
+
+    app = bot_app(rpc)
+
+    def send(text):
+        update = {"message": {"from": {"id": 1}, "text": text}}
+        return test_client.post("/api/v1/reply", json=update).get_json()["text"]
+
+    with app.test_client() as test_client:
+        assert send("/search coke") == response.slash_unk("na")  # nothing indexed yet
+
+        response.SEARCH_INDEX.publish(df_item)
+
+        assert send("/search").startswith("🔍 Tell me")
+        assert send("/search ＣＯＫＥ zero").splitlines()[2:] == [
+            "/P000000002 | COCA-COLA - Coke Zero 330ml",  # matches both words
+        ]
+        assert send("/search 可樂").splitlines()[2:4] == [
+            "/P000000001 | COCA-COLA - Coke 330ml",
+            "/P000000002 | COCA-COLA - Coke Zero 330ml",
+        ]
+        assert send("/search spr lem").splitlines()[2:] == [
+            "/P000000003 | SPRITE - Sprite Lemon 330ml",  # by prefix
+        ]
+        assert send("/search 檸").splitlines()[2:] == [
+            "/P000000003 | SPRITE - Sprite Lemon 330ml",
+        ]
+        assert send("/search pepsi").startswith("🔍 Sniffed")
+        assert send("/search sprite xyzzy").startswith("🔍 Sniffed")  # no item has every word